@@ -1,150 +1,427 @@
+import calendar
 import time
 import os
-import requests
-import json
-from lighthive.client import Client
-from lighthive.datastructures import Operation
+import re
 from app.config import config
-from app.db import db
+from app import control, metrics
+from app.db import ProcessedOpsCache, db
 from app.cashback import CashbackCalculator
-from app.logging_utils import setup_logger
-from app.snap_utils import get_latest_peaksnaps_post, user_has_valid_snap
+from app.logging_utils import PER_BLOCK, PER_OP, setup_logger
+from app.node_pool import NodePool
+from app.notifier import discord
+from app.broadcaster import Broadcaster
+from app.history_sync import HistorySync
+from app.user_cache import UserStateCache
+from app.pipeline import BlockPipeline
+from app.posting import comment_operations
+from app.pending import PendingPayment, PendingPayments
+from app.rollups import reason_key
+from app.snap_utils import (
+    SnapBeneficiaryCache,
+    beneficiaries_from_comment_options,
+    get_latest_peaksnaps_post,
+    user_has_valid_snap,
+)
 
 logger = setup_logger("paynsnapbot")
 
+# Store invoice memos, e.g. kcs-hpos-1234
+MEMO_PATTERN = re.compile(r"^kcs-hpos-[a-zA-Z0-9-]+$")
+
 
 class HiveBot:
     LAST_BLOCK_FILE = "last_block.txt"
+    SNAP_TIMEOUT = 120  # seconds a payment waits for its snap
 
     def __init__(self):
-        self.nodes = [
-            "https://api.hive.blog",  # @blocktrades
-            "https://api.openhive.network",  # @gtg
-            "https://anyx.io",  # @anyx
-            "https://rpc.ausbit.dev",  # @ausbitbank
-            "https://rpc.mahdiyari.info",  # @mahdiyari
-            "https://api.hive.blue",  # @guiltyparties
-            "https://techcoderx.com",  # @techcoderx
-            "https://hive.roelandp.nl",  # @roelandp
-            "https://hived.emre.sh",  # @emrebeyler
-            "https://api.deathwing.me",  # @deathwing
-            "https://api.c0ff33a.uk",  # @c0ff33a
-            "https://hive-api.arcange.eu",  # @arcange
-            "https://hive-api.3speak.tv",  # @threespeak
-            "https://hiveapi.actifit.io",  # @actifit
-        ]
+        self.pool = NodePool()
         self.stores = config.get("stores", [])
+        self.store_set = set(self.stores)
+        self.processed_ops = ProcessedOpsCache(db)
+        self.user_state = UserStateCache(db)
         self.calculator = CashbackCalculator()
         self.username = os.getenv("HIVE_USERNAME")
         self.posting_key = os.getenv("HIVE_POSTING_KEY")
         self.active_key = os.getenv("HIVE_ACTIVE_KEY")
-        self.discord_webhook_url = os.getenv("DISCORD_WEBHOOK_URL")
+        catchup = config.get("catchup", {})
+        self.catchup_threshold = catchup.get("threshold", 50)
+        self.catchup_batch_size = catchup.get("batch_size", 50)
+        history_sync = config.get("history_sync", {})
+        self.history_sync_enabled = history_sync.get("enabled", True)
+        self.history_sync_threshold = history_sync.get("threshold", 1200)
+        self.history_sync_margin = history_sync.get("resume_margin", 20)
+        self.history_sync_retry_after = history_sync.get("retry_after", 600)
+        self.history_sync_retry_at = 0.0
+        self.history_sync = HistorySync(self)
+        checkpoint = config.get("checkpoint", {})
+        self.commit_interval = checkpoint.get("commit_interval", 1)
+        self.catchup_commit_interval = checkpoint.get("catchup_commit_interval", 50)
+        self.uncommitted_blocks = 0
+        self.catching_up = False
+        self.head_block = None
+        self.catchup_started = None
+        self.catchup_blocks = 0
+        self.status_interval = config.get("worker", {}).get("status_interval", 2)
+        self.next_status = 0.0
+        self.pipeline = BlockPipeline(
+            self.fetch_range, config.get("pipeline", {}).get("window", 4)
+        )
+        # None until poll_blocks resolves it from the chain head (no checkpoint yet)
         self.last_block = self.read_last_block()
-        self.pending_payments = (
-            []
-        )  # List of dicts: {sender, to, amount, memo, block_num, timestamp, snap_author, snap_permlink}
-
-    def send_discord_notification(
-        self, title, description, color=0x00FF00, fields=None
-    ):
-        """Send a notification to Discord via webhook"""
-        if not self.discord_webhook_url:
-            logger.debug("Discord webhook URL not configured, skipping notification")
-            return
+        retention = config.get("database", {}).get("processed_ops_retention_blocks")
+        if retention and self.last_block is not None:
+            pruned = db.prune_processed_ops(self.last_block - retention)
+            if pruned:
+                logger.info(
+                    f"Pruned {pruned} processed_ops rows older than {retention} blocks"
+                )
+        self.block_time = None
+        self.broadcaster = Broadcaster(self)
+        self.snap_cache = SnapBeneficiaryCache(
+            ttl=config.get("snap_cache", {}).get("ttl", 600)
+        )
+        self.pending_payments = PendingPayments()
+        self.load_pending_payments()
+        metrics.track_bot(self)
+
+    def load_pending_payments(self):
+        """Restore payments that were still waiting for a snap at shutdown"""
+        for row in db.load_pending_payments():
+            (
+                sender,
+                to,
+                amount,
+                memo,
+                block_num,
+                op_id,
+                block_time,
+                deadline,
+                snap_author,
+                snap_permlink,
+            ) = row
+            self.pending_payments.add(
+                PendingPayment(
+                    sender=sender,
+                    to=to,
+                    amount=amount,
+                    memo=memo,
+                    block_num=block_num,
+                    op_id=op_id,
+                    timestamp=block_time,
+                    deadline=deadline,
+                    snap_author=snap_author,
+                    snap_permlink=snap_permlink,
+                )
+            )
+        if self.pending_payments:
+            logger.info(
+                f"Restored {len(self.pending_payments)} pending payments from database"
+            )
 
+    @staticmethod
+    def op_block_time(op):
+        """Block time of an op as a unix timestamp (falls back to wall clock)"""
         try:
-            embed = {
-                "title": title,
-                "description": description,
-                "color": color,
-                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
-            }
-
-            if fields:
-                embed["fields"] = fields
-
-            payload = {"username": "PaySnap Bot", "embeds": [embed]}
-
-            response = requests.post(
-                self.discord_webhook_url,
-                data=json.dumps(payload),
-                headers={"Content-Type": "application/json"},
-                timeout=10,
+            return float(
+                calendar.timegm(time.strptime(op["timestamp"], "%Y-%m-%dT%H:%M:%S"))
             )
+        except Exception:
+            return time.time()
 
-            if response.status_code == 204:
-                logger.info("Discord notification sent successfully")
-            else:
-                logger.error(
-                    f"Failed to send Discord notification: {response.status_code} - {response.text}"
-                )
-
-        except Exception as e:
-            logger.error(f"Error sending Discord notification: {e}")
+    def send_discord_notification(
+        self, title, description, color=0x00FF00, fields=None
+    ):
+        """Queue a Discord notification; delivery happens off the block loop"""
+        discord.notify(title, description, color, fields)
 
     def read_last_block(self):
-        try:
-            with open(self.LAST_BLOCK_FILE, "r") as f:
-                return int(f.read().strip())
-        except Exception:
-            client = Client(nodes=self.nodes)
-            props = client.get_dynamic_global_properties()
+        """The checkpointed block, or None on a fresh database. Never touches
+        the network, so constructing the bot does not wait on slow nodes."""
+        if db.import_checkpoint_file(self.LAST_BLOCK_FILE):
+            logger.info(f"Imported checkpoint from {self.LAST_BLOCK_FILE}")
+        return db.get_checkpoint()
+
+    def resolve_start_block(self):
+        """Start from the chain head when there is no checkpoint, retrying
+        until a node answers. Admin commands and status keep being served."""
+        while self.last_block is None:
+            try:
+                self.service_control()
+                props = self.pool.get_dynamic_global_properties()
+                logger.debug("get_dynamic_global_properties returned: %s", props)
+                if not isinstance(props, dict) or "head_block_number" not in props:
+                    raise Exception(f"no head_block_number in props: {props}")
+            except Exception as e:
+                logger.error(f"Could not determine starting block: {e}")
+                time.sleep(5)
+                continue
+            self.last_block = props["head_block_number"]
             logger.info(
-                f"DEBUG: get_dynamic_global_properties returned: {props} (type: {type(props)})"
+                f"No checkpoint found, starting at head block {self.last_block}"
             )
-            if isinstance(props, dict) and "head_block_number" in props:
-                return props["head_block_number"]
-            logger.error(f"Could not determine starting block from props: {props}")
-            raise Exception("Could not determine starting block.")
 
     def write_last_block(self, block_num):
-        try:
-            with open(self.LAST_BLOCK_FILE, "w") as f:
-                f.write(str(block_num))
-        except Exception as e:
-            logger.error(f"Failed to write last block: {e}")
+        """Checkpoint block_num; the block's writes are committed with it every
+        commit_interval blocks (catchup_commit_interval while catching up)"""
+        db.set_checkpoint(block_num)
+        self.uncommitted_blocks += 1
+        interval = (
+            self.catchup_commit_interval if self.catching_up else self.commit_interval
+        )
+        if self.uncommitted_blocks >= interval:
+            self.commit_blocks()
+
+    def commit_blocks(self):
+        if self.uncommitted_blocks:
+            with metrics.SQLITE_COMMIT_SECONDS.time():
+                db.conn.commit()
+            self.uncommitted_blocks = 0
+
+    def rollback_blocks(self):
+        """Discard uncommitted block state and rewind to the committed checkpoint"""
+        db.conn.rollback()
+        self.uncommitted_blocks = 0
+        self.last_block = db.get_checkpoint() or self.last_block
+        self.processed_ops = ProcessedOpsCache(db)
+        self.user_state.invalidate()
+        self.pending_payments = PendingPayments()
+        self.load_pending_payments()
+
+    def complete_block(self, block_num):
+        """Run pending-payment checks for a processed block and checkpoint it"""
+        self.check_pending_payments()
+        self.write_last_block(block_num)
+        self.last_block = block_num
+        metrics.BLOCKS_PROCESSED.inc()
+        metrics.LAST_BLOCK.set(block_num)
 
     def poll_blocks(self):
         logger.info("Starting live block polling...")
-        client = Client(nodes=self.nodes)
+        self.broadcaster.start()
+        self.resolve_start_block()
         while True:
             try:
-                props = client.get_dynamic_global_properties()
+                self.service_control()
+                props = self.pool.get_dynamic_global_properties()
                 if not isinstance(props, dict) or "head_block_number" not in props:
                     logger.error(f"Could not get head_block_number from props: {props}")
                     time.sleep(5)
                     continue
                 head_block = props["head_block_number"]
-                # Start from last processed block + 1
-                next_block = self.last_block + 1
-                if next_block > head_block:
+                self.head_block = head_block
+                metrics.HEAD_BLOCK.set(head_block)
+                lag = head_block - self.last_block
+                if lag > self.catchup_threshold and not self.catching_up:
+                    self.catching_up = True
+                    self.catchup_started = time.time()
+                    self.catchup_blocks = 0
+                    logger.info(
+                        f"Entering catch-up mode: {lag} blocks behind head {head_block}"
+                    )
+                elif lag <= self.catchup_threshold and self.catching_up:
+                    self.catching_up = False
+                    logger.info(
+                        f"Caught up at block {self.last_block} (head {head_block}), resuming live polling"
+                    )
+                if (
+                    self.history_sync_enabled
+                    and lag > self.history_sync_threshold
+                    and time.time() >= self.history_sync_retry_at
+                    and self.sync_from_history(head_block)
+                ):
+                    continue
+                if lag <= 0:
+                    self.commit_blocks()
                     time.sleep(3)
                     continue
-                self.process_block(next_block)
-                self.write_last_block(next_block)
-                self.last_block = next_block
+                self.process_available_blocks(head_block)
+                self.commit_blocks()
             except Exception as e:
+                self.pipeline.reset()
                 logger.error(f"Error processing block {self.last_block + 1}: {e}")
+                self.rollback_blocks()
                 time.sleep(5)
-            self.check_pending_payments()
 
-    def process_block(self, block_num):
-        logger.info(f"Processing block {block_num}...")
-        for node in self.nodes:
+    def service_control(self):
+        """Run admin commands queued by the dashboard and publish live status.
+
+        Called from the polling loop between blocks, after the last block's
+        writes are committed, at most once per status_interval seconds.
+        """
+        now = time.time()
+        if now < self.next_status:
+            return
+        self.next_status = now + self.status_interval
+        self.commit_blocks()
+        control.run_commands(db.conn, {"reset_user": db.reset_user})
+        control.write_status(db.conn, self.status())
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "last_block": self.last_block,
+            "head_block": self.head_block,
+            "lag": (
+                self.head_block - self.last_block
+                if self.head_block and self.last_block is not None
+                else None
+            ),
+            "catching_up": self.catching_up,
+            "block_time": self.block_time,
+            "pending_payments": len(self.pending_payments),
+            "notifications": discord.stats(),
+        }
+
+    def sync_from_history(self, head_block):
+        """Skip a long gap using store account histories, then resume near head.
+        Returns False if the sync failed and blocks should be streamed instead."""
+        from_block = self.last_block + 1
+        to_block = head_block - self.history_sync_margin
+        logger.info(
+            f"{head_block - self.last_block} blocks behind head, syncing blocks {from_block}-{to_block} from account history"
+        )
+        self.pipeline.reset()
+        try:
+            self.history_sync.run(from_block, to_block)
+        except Exception as e:
+            # Stream blocks instead of retrying history every loop
+            logger.error(
+                f"History sync failed, streaming blocks for {self.history_sync_retry_after}s: {e}"
+            )
+            self.rollback_blocks()
+            self.history_sync_retry_at = time.time() + self.history_sync_retry_after
+            return False
+        self.commit_blocks()
+        return True
+
+    def process_available_blocks(self, head_block):
+        """Process every block up to head_block, prefetching ahead through the pipeline.
+
+        last_block only advances once a block's ops have all been processed.
+        """
+        batch_size = self.catchup_batch_size if self.catching_up else 1
+        self.pipeline.fill(self.last_block + 1, head_block, batch_size)
+        while len(self.pipeline):
+            start_block, blocks = self.pipeline.take()
+            for offset, ops in enumerate(blocks):
+                block_num = start_block + offset
+                started = time.perf_counter()
+                self.process_block(block_num, ops)
+                self.complete_block(block_num)
+                metrics.BLOCK_SECONDS.observe(time.perf_counter() - started)
+            if self.catching_up:
+                self.catchup_blocks += len(blocks)
+                elapsed = max(time.time() - self.catchup_started, 1e-6)
+                logger.info(
+                    "Catch-up: at block %s, %.1f blocks/sec, %s blocks behind head",
+                    self.last_block,
+                    self.catchup_blocks / elapsed,
+                    head_block - self.last_block,
+                    extra=PER_BLOCK,
+                )
+            self.pipeline.fill(self.last_block + 1, head_block, batch_size)
+
+    def fetch_range(self, start_block, count):
+        if count == 1:
+            return [self.fetch_block(start_block)]
+        return self.fetch_blocks_batch(start_block, count)
+
+    def fetch_blocks_batch(self, start_block, count):
+        """Fetch ops for consecutive blocks in a single JSON-RPC batch request.
+
+        Returns a list of op lists starting at start_block. The list may be
+        shorter than count if the node has not produced the later blocks yet.
+        """
+        calls = [
+            ("condenser_api.get_ops_in_block", [start_block + i, False])
+            for i in range(count)
+        ]
+        for node in self.pool.ranked():
+            started = time.time()
+            try:
+                blocks = []
+                for ops in self.pool.transport.batch(node.url, calls):
+                    # Every real block has at least a producer_reward op, so an
+                    # empty or failed result means the node cannot serve it.
+                    if isinstance(ops, Exception) or not ops:
+                        break
+                    blocks.append(ops)
+                if blocks:
+                    self.pool.record_success(
+                        node, time.time() - started, start_block + len(blocks) - 1
+                    )
+                    node.metrics.blocks.inc(len(blocks))
+                    return blocks
+                logger.info(
+                    f"Node {node.url} returned no ops for blocks {start_block}-{start_block + count - 1}."
+                )
+                self.pool.record_failure(node, "no ops returned")
+            except Exception as e:
+                logger.error(
+                    f"Batch fetch of blocks {start_block}-{start_block + count - 1} on node {node.url} failed: {e}"
+                )
+                self.pool.record_failure(node, e)
+        raise Exception(
+            f"Failed to fetch blocks {start_block}-{start_block + count - 1} on all nodes."
+        )
+
+    def fetch_block(self, block_num):
+        for node in self.pool.ranked():
+            started = time.time()
             try:
-                client = Client(nodes=[node])
-                ops = client.get_ops_in_block(block_num, False)
-                logger.debug(f"Node {node} ops for block {block_num}: {ops}")
+                ops = self.pool.transport.call(
+                    node.url, "condenser_api.get_ops_in_block", [block_num, False]
+                )
+                logger.debug("Node %s ops for block %s: %s", node.url, block_num, ops)
                 if ops:
-                    logger.info(f"Block {block_num} ops count: {len(ops)}")
-                    for op in ops:
-                        self.process_op(block_num, op)
-                    return
+                    self.pool.record_success(node, time.time() - started, block_num)
+                    node.metrics.blocks.inc()
+                    return ops
                 else:
-                    logger.info(f"Node {node} returned no ops for block {block_num}.")
+                    logger.info(
+                        f"Node {node.url} returned no ops for block {block_num}."
+                    )
+                    self.pool.record_failure(node, f"no ops for block {block_num}")
             except Exception as e:
-                logger.error(f"Block {block_num} node {node} error: {e}")
-        logger.error(f"Failed to process block {block_num} on all nodes.")
+                logger.error(f"Block {block_num} node {node.url} error: {e}")
+                self.pool.record_failure(node, e)
+        raise Exception(f"Failed to fetch block {block_num} on all nodes.")
+
+    def process_block(self, block_num, ops=None):
+        logger.info("Processing block %s...", block_num, extra=PER_BLOCK)
+        if ops is None:
+            ops = self.fetch_block(block_num)
+        logger.info("Block %s ops count: %s", block_num, len(ops), extra=PER_BLOCK)
+        if ops:
+            self.block_time = self.op_block_time(ops[0])
+        relevant = self.prefilter_ops(ops)
+        metrics.OPS_SEEN.inc(len(ops))
+        metrics.OPS_RELEVANT.inc(len(relevant))
+        for op in relevant:
+            self.process_op(block_num, op)
+
+    def prefilter_ops(self, ops):
+        """Keep only ops process_op can act on: transfers to stores, snaps
+        on peak.snaps and comment_options for those snaps or pending senders"""
+        relevant = []
+        snaps = set()
+        for op in ops:
+            op_type, op_data = op.get("op", [None, {}])
+            if op_type == "transfer":
+                if op_data.get("to") in self.store_set:
+                    relevant.append(op)
+            elif op_type == "comment":
+                if op_data.get("parent_author") == "peak.snaps":
+                    snaps.add((op_data.get("author"), op_data.get("permlink")))
+                    relevant.append(op)
+            elif op_type == "comment_options":
+                author = op_data.get("author")
+                if (
+                    author,
+                    op_data.get("permlink"),
+                ) in snaps or self.pending_payments.has_sender(author):
+                    relevant.append(op)
+        return relevant
 
     def process_op(self, block_num, op):
         op_id = op.get("trx_id", "")
@@ -153,13 +430,12 @@ class HiveBot:
 
         # Skip ops already handled (paid or terminally denied)
         try:
-            exists = db.conn.execute(
-                "SELECT 1 FROM processed_ops WHERE block_num=? AND op_id=?",
-                (block_num, op_id),
-            ).fetchone()
-            if exists:
+            if self.processed_ops.contains(block_num, op_id):
                 logger.debug(
-                    f"Skipping already processed op {op_id} in block {block_num}"
+                    "Skipping already processed op %s in block %s",
+                    op_id,
+                    block_num,
+                    extra=PER_OP,
                 )
                 return
         except Exception as e:
@@ -173,9 +449,42 @@ class HiveBot:
             from_account = op_data.get("from", "")
             if to in self.stores and self.valid_memo(memo):
                 logger.info(
-                    f"QUALIFYING TRANSFER: block={block_num} from={from_account} to={to} amount={amount} memo={memo} trx_id={op_id}"
+                    "QUALIFYING TRANSFER: block=%s from=%s to=%s amount=%s memo=%s trx_id=%s",
+                    block_num,
+                    from_account,
+                    to,
+                    amount,
+                    memo,
+                    op_id,
                 )
 
+                block_time = self.op_block_time(op)
+                payment = PendingPayment(
+                    sender=from_account,
+                    to=to,
+                    amount=float(amount.split()[0]),
+                    memo=memo,
+                    block_num=block_num,
+                    op_id=op_id,
+                    timestamp=block_time,
+                    deadline=block_time + self.SNAP_TIMEOUT,
+                )
+                if not db.add_pending_payment(
+                    block_num,
+                    op_id,
+                    payment.sender,
+                    payment.to,
+                    payment.amount,
+                    payment.memo,
+                    payment.timestamp,
+                    payment.deadline,
+                ):
+                    logger.info(
+                        f"Payment {op_id} in block {block_num} is already pending"
+                    )
+                    return
+                self.pending_payments.add(payment)
+
                 # Send Discord notification for new payment received
                 self.send_discord_notification(
                     title="💳 New Payment Received",
@@ -194,20 +503,6 @@ class HiveBot:
                         },
                     ],
                 )
-
-                self.pending_payments.append(
-                    {
-                        "sender": from_account,
-                        "to": to,
-                        "amount": float(amount.split()[0]),
-                        "memo": memo,
-                        "block_num": block_num,
-                        "op_id": op_id,
-                        "timestamp": time.time(),
-                        "snap_author": None,
-                        "snap_permlink": None,
-                    }
-                )
         # Only log qualifying snap (custom_json or comment, as per your logic)
         if op_type == "custom_json":
             # Example: check for snap logic here
@@ -217,47 +512,80 @@ class HiveBot:
             author = op_data.get("author", "")
             parent_author = op_data.get("parent_author", "")
             permlink = op_data.get("permlink", "")
-            # Find pending payments for this author and update with snap info
-            for payment in self.pending_payments:
-                if (
-                    payment["sender"] == author
-                    and parent_author == "peak.snaps"
-                    and payment["snap_author"] is None
-                ):
+            # Attach the snap to this author's pending payments
+            if parent_author == "peak.snaps":
+                matched = self.pending_payments.attach_snap(author, permlink)
+                if matched:
                     logger.info(
-                        f"SNAP DETECTED: block={block_num} author={author} parent_author={parent_author} trx_id={op_id} permlink={permlink}"
+                        "SNAP DETECTED: block=%s author=%s parent_author=%s trx_id=%s permlink=%s",
+                        block_num,
+                        author,
+                        parent_author,
+                        op_id,
+                        permlink,
                     )
-                    payment["snap_author"] = author
-                    payment["snap_permlink"] = permlink
+                    db.attach_pending_snap(author, author, permlink)
+        if op_type == "comment_options":
+            author = op_data.get("author", "")
+            # Only snaps from customers with a pending payment matter here
+            if self.pending_payments.has_sender(author):
+                self.snap_cache.put(
+                    author,
+                    op_data.get("permlink", ""),
+                    beneficiaries_from_comment_options(op_data),
+                )
 
     def valid_memo(self, memo):
-        import re
-
-        return bool(re.match(r"^kcs-hpos-[a-zA-Z0-9-]+$", memo))
+        return bool(MEMO_PATTERN.match(memo))
 
     def send_cashback(self, user, amount, memo):
+        from lighthive.datastructures import Operation
+
         logger.info(f"Sending {amount} HBD to {user} for {memo}")
-        try:
-            client = Client(nodes=self.nodes, keys=[self.active_key])
-            op = Operation(
+        op = Operation(
+            "transfer",
+            {
+                "from": self.username,
+                "to": user,
+                "amount": f"{amount:.3f} HBD",
+                "memo": memo,
+            },
+        )
+        tx = self.pool.broadcast([op], keys=[self.active_key])
+        logger.info(f"Transfer broadcast result: {tx}")
+        return tx
+
+    def send_cashback_batch(self, payouts):
+        """Broadcast several cashback transfers as one multi-op transaction"""
+        from lighthive.datastructures import Operation
+
+        logger.info(f"Sending {len(payouts)} cashback transfers in one transaction")
+        ops = [
+            Operation(
                 "transfer",
                 {
                     "from": self.username,
-                    "to": user,
-                    "amount": f"{amount:.3f} HBD",
-                    "memo": memo,
+                    "to": payout["user"],
+                    "amount": f"{payout['amount']:.3f} HBD",
+                    "memo": payout["memo"],
                 },
             )
-            tx = client.broadcast([op])
-            logger.info(f"Transfer broadcast result: {tx}")
-        except Exception as e:
-            logger.error(f"Error sending cashback to {user}: {e}")
+            for payout in payouts
+        ]
+        tx = self.pool.broadcast(ops, keys=[self.active_key])
+        logger.info(f"Batch transfer broadcast result: {tx}")
+        return tx
 
     def reply_comment(
-        self, user, memo, amount, parent_author, parent_permlink, store=None
+        self,
+        user,
+        memo,
+        amount,
+        parent_author,
+        parent_permlink,
+        store=None,
+        permlink=None,
     ):
-        import re
-
         invoice_match = re.match(r"^kcs-hpos-(\d{4})-(\d{4})$", memo)
         invoice_number = (
             memo
@@ -268,66 +596,29 @@ class HiveBot:
         logger.info(f"Replying to {user}: {msg}")
 
         # Try to post with beneficiary first, fallback to simple comment if it fails
-        client = Client(nodes=self.nodes, keys=[self.posting_key])
-        permlink = f"paynsnap-{int(time.time())}"
+        keys = [self.posting_key]
+        # A fixed permlink turns a retried broadcast into an edit, not a duplicate
+        permlink = permlink or f"paynsnap-{int(time.time())}"
 
         try:
-            # Attempt to post with 10% beneficiary to the store using proper structure
+            # Attempt to post with 10% beneficiary to the store
             if store:
-                # Create operations array like in the JavaScript code
-                operations = []
-
-                # First operation: comment
-                comment_op = Operation(
-                    "comment",
-                    {
-                        "parent_author": parent_author,
-                        "parent_permlink": parent_permlink,
-                        "author": self.username,
-                        "permlink": permlink,
-                        "title": "",
-                        "body": msg,
-                        "json_metadata": json.dumps(
-                            {"app": "paynsnapbot", "format": "markdown"}
-                        ),
-                    },
-                )
-                operations.append(comment_op)
-
-                # Second operation: comment_options with beneficiaries
-                comment_options_op = Operation(
-                    "comment_options",
-                    {
-                        "author": self.username,
-                        "permlink": permlink,
-                        "max_accepted_payout": "1000000.000 HBD",
-                        "percent_hbd": 10000,
-                        "allow_votes": True,
-                        "allow_curation_rewards": True,
-                        "extensions": [
-                            [
-                                0,
-                                {
-                                    "beneficiaries": [
-                                        {
-                                            "account": store,
-                                            "weight": 1000,
-                                        },  # 10% to store
-                                        {
-                                            "account": self.username,
-                                            "weight": 9000,
-                                        },  # 90% to bot
-                                    ]
-                                },
-                            ]
-                        ],
-                    },
+                operations = comment_operations(
+                    self.username,
+                    permlink,
+                    parent_author,
+                    parent_permlink,
+                    msg,
+                    beneficiaries=[
+                        {"account": store, "weight": 1000},  # 10% to store
+                        {"account": self.username, "weight": 9000},  # 90% to bot
+                    ],
                 )
-                operations.append(comment_options_op)
 
                 # Broadcast both operations together
-                client.broadcast(operations)
+                result = self.pool.broadcast(operations, keys=keys)
                 logger.info(f"Reply posted with 10% beneficiary to {store}")
+                return result
 
             else:
                 # No store provided, post simple comment
@@ -339,91 +630,90 @@ class HiveBot:
                 f"Failed to post with beneficiary to {store}: {e}. Falling back to simple reply."
             )
 
-            op = Operation(
-                "comment",
-                {
-                    "parent_author": parent_author,
-                    "parent_permlink": parent_permlink,
-                    "author": self.username,
-                    "permlink": f"paynsnap-fallback-{int(time.time())}",
-                    "title": "",
-                    "body": msg,
-                    "json_metadata": json.dumps(
-                        {"app": "paynsnapbot", "format": "markdown"}
-                    ),
-                },
+            operations = comment_operations(
+                self.username,
+                permlink.replace("paynsnap-", "paynsnap-fallback-", 1),
+                parent_author,
+                parent_permlink,
+                msg,
+            )
+            return self.pool.broadcast(operations, keys=keys)
+
+    def prefetch_snaps(self, payments):
+        """Look up every uncached snap for these payments in one batch request,
+        so the checks that follow are answered from snap_cache"""
+        missing = list(
+            dict.fromkeys(
+                (p.snap_author, p.snap_permlink)
+                for p in payments
+                if p.snap_author
+                and p.snap_permlink
+                and self.snap_cache.get(p.snap_author, p.snap_permlink) is None
             )
-            client.broadcast([op])
+        )
+        # A single lookup is no cheaper batched; user_has_valid_snap does it
+        if len(missing) < 2:
+            return
+        try:
+            posts = self.pool.batch("get_content", [list(key) for key in missing])
+        except Exception as e:
+            logger.warning(f"Batched snap lookup failed, checking one by one: {e}")
+            return
+        for (author, permlink), post in zip(missing, posts):
+            if isinstance(post, dict) and post:
+                self.snap_cache.put(author, permlink, post.get("beneficiaries", []))
 
-    def check_pending_payments(self):
+    def check_pending_payments(self, now=None):
+        if not self.pending_payments:
+            return
+        # Deadlines are in block time, so a catch-up replays timeouts as they happened
+        if now is None:
+            now = self.block_time or time.time()
+        due = self.pending_payments.due(now)
+        if not due:
+            return
         logger.info(
-            f"Checking pending payments queue: {len(self.pending_payments)} items."
+            "Checking pending payments: %s due of %s queued.",
+            len(due),
+            len(self.pending_payments),
+            extra=PER_BLOCK,
         )
-        now = time.time()
-        timeout = 120  # seconds
-        client = Client(nodes=self.nodes)
-        still_pending = []
-        for payment in self.pending_payments:
-            sender = payment["sender"]
-            to = payment["to"]
-            amount = payment["amount"]
-            memo = payment["memo"]
-            block_num = payment["block_num"]
-            op_id = payment["op_id"]
-            ts = payment["timestamp"]
-            snap_author = payment.get("snap_author")
-            snap_permlink = payment.get("snap_permlink")
+        timeout = self.SNAP_TIMEOUT
+        client = self.pool
+        self.prefetch_snaps(due)
+        for payment in due:
+            sender = payment.sender
+            to = payment.to
+            amount = payment.amount
+            memo = payment.memo
+            block_num = payment.block_num
+            op_id = payment.op_id
+            snap_author = payment.snap_author
+            snap_permlink = payment.snap_permlink
             logger.info(
-                f"Checking payment: sender={sender}, to={to}, amount={amount}, memo={memo}, block={block_num}"
+                "Checking payment: sender=%s, to=%s, amount=%s, memo=%s, block=%s",
+                sender,
+                to,
+                amount,
+                memo,
+                block_num,
+                extra=PER_OP,
             )
             logger.info(
-                f"Snap info: snap_author={snap_author}, snap_permlink={snap_permlink}"
+                "Snap info: snap_author=%s, snap_permlink=%s",
+                snap_author,
+                snap_permlink,
+                extra=PER_OP,
             )
 
-            # Get user data and check daily reset (UTC-based)
-            user_data = db.conn.execute(
-                "SELECT purchases, last_purchase FROM users WHERE username=?", (sender,)
-            ).fetchone()
-
-            from datetime import datetime, timezone
-
-            def _to_utc_date(ts: str):
-                # SQLite CURRENT_TIMESTAMP is 'YYYY-MM-DD HH:MM:SS'
-                # We interpret it as UTC.
-                try:
-                    if "T" in ts:
-                        # ISO style
-                        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                    else:
-                        dt = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
-                    return dt.replace(tzinfo=timezone.utc).date()
-                except Exception:
-                    return None
-
-            utc_today = datetime.now(timezone.utc).date()
-
-            if user_data:
-                stored_purchases, last_purchase_str = user_data
-                if last_purchase_str:
-                    last_date = _to_utc_date(last_purchase_str)
-                    if last_date is None or last_date < utc_today:
-                        purchase_num = 1
-                        logger.info(
-                            f"Daily reset for {sender}: last={last_date}, today={utc_today}"
-                        )
-                    else:
-                        purchase_num = (stored_purchases or 0) + 1
-                        logger.info(
-                            f"Same-day purchase for {sender}: {stored_purchases} -> {purchase_num}"
-                        )
-                else:
-                    purchase_num = 1
-            else:
-                purchase_num = 1
+            # Purchase number for today (UTC-based daily reset)
+            purchase_num = self.user_state.purchase_number(sender)
+            logger.info("Purchase #%s today for %s", purchase_num, sender, extra=PER_OP)
 
             daily_limit = config.get("limits", {}).get("daily_cashback_limit", 3)
             reason = None
             paid = 0
+            cashback = None
             snap_valid = False
             # Only process if snap info is present and valid
             mark_processed = False  # mark terminal outcomes
@@ -461,10 +751,15 @@ class HiveBot:
                 paid = 0
             else:
                 snap_valid = user_has_valid_snap(
-                    client, snap_author, snap_permlink, sender
+                    client, snap_author, snap_permlink, sender, self.snap_cache
                 )
                 logger.info(
-                    f"user_has_valid_snap({snap_author}, {snap_permlink}, {sender}) returned: {snap_valid}"
+                    "user_has_valid_snap(%s, %s, %s) returned: %s",
+                    snap_author,
+                    snap_permlink,
+                    sender,
+                    snap_valid,
+                    extra=PER_OP,
                 )
                 if not snap_valid:
                     reason = "Snap detected, wrong beneficiaries"
@@ -500,63 +795,85 @@ class HiveBot:
                         f"Valid snap detected for user {sender}. Processing cashback."
                     )
                     cashback = self.calculator.calculate(purchase_num, amount)
-                    self.send_cashback(sender, cashback, memo)
-                    self.reply_comment(
-                        sender, memo, cashback, snap_author, snap_permlink, to
-                    )
-
-                    # Send Discord notification for successful payment
-                    self.send_discord_notification(
-                        title="💰 Cashback Sent!",
-                        description=f"Successfully sent cashback to **@{sender}**",
-                        color=0x00FF00,  # Green
-                        fields=[
-                            {"name": "User", "value": f"@{sender}", "inline": True},
-                            {
-                                "name": "Amount",
-                                "value": f"{cashback:.3f} HBD",
-                                "inline": True,
-                            },
-                            {
-                                "name": "Purchase #",
-                                "value": str(purchase_num),
-                                "inline": True,
-                            },
-                            {
-                                "name": "Original Payment",
-                                "value": f"{amount:.3f} HBD",
-                                "inline": True,
-                            },
-                            {"name": "Invoice", "value": memo, "inline": True},
-                            {
-                                "name": "Store Beneficiary",
-                                "value": f"10% to @{to}",
-                                "inline": True,
-                            },
-                            {
-                                "name": "Snap Link",
-                                "value": f"[@{snap_author}/{snap_permlink}](https://peakd.com/@{snap_author}/{snap_permlink})",
-                                "inline": False,
+                    # Payouts go through the outbox in the same transaction as the
+                    # processed_ops / users updates; the broadcaster sends them.
+                    db.queue_outbox(
+                        "transfer",
+                        {
+                            "user": sender,
+                            "amount": cashback,
+                            "memo": memo,
+                            "notification": {
+                                "title": "💰 Cashback Sent!",
+                                "description": f"Successfully sent cashback to **@{sender}**",
+                                "color": 0x00FF00,  # Green
+                                "fields": [
+                                    {
+                                        "name": "User",
+                                        "value": f"@{sender}",
+                                        "inline": True,
+                                    },
+                                    {
+                                        "name": "Amount",
+                                        "value": f"{cashback:.3f} HBD",
+                                        "inline": True,
+                                    },
+                                    {
+                                        "name": "Purchase #",
+                                        "value": str(purchase_num),
+                                        "inline": True,
+                                    },
+                                    {
+                                        "name": "Original Payment",
+                                        "value": f"{amount:.3f} HBD",
+                                        "inline": True,
+                                    },
+                                    {"name": "Invoice", "value": memo, "inline": True},
+                                    {
+                                        "name": "Store Beneficiary",
+                                        "value": f"10% to @{to}",
+                                        "inline": True,
+                                    },
+                                    {
+                                        "name": "Snap Link",
+                                        "value": f"[@{snap_author}/{snap_permlink}](https://peakd.com/@{snap_author}/{snap_permlink})",
+                                        "inline": False,
+                                    },
+                                ],
                             },
-                        ],
+                        },
+                        block_num,
+                        op_id,
+                    )
+                    db.queue_outbox(
+                        "reply",
+                        {
+                            "user": sender,
+                            "memo": memo,
+                            "amount": cashback,
+                            "parent_author": snap_author,
+                            "parent_permlink": snap_permlink,
+                            "store": to,
+                            # Deterministic, so a replay or retry reuses it
+                            "permlink": f"paynsnap-{block_num}-{op_id[:8]}",
+                        },
+                        block_num,
+                        op_id,
                     )
-
                     db.conn.execute(
                         "INSERT INTO processed_ops (block_num, op_id) VALUES (?, ?)",
                         (block_num, op_id),
                     )
-                    db.conn.execute(
-                        "INSERT OR REPLACE INTO users (username, purchases, last_purchase) VALUES (?, ?, datetime('now'))",
-                        (sender, purchase_num),
-                    )
-                    db.conn.commit()
+                    self.user_state.record_purchase(sender, purchase_num)
                     paid = 1
                     reason = f"Snap detected, paid {cashback:.2f} HBD"
             # Timeout logic
-            if not paid and now - ts < timeout:
-                logger.info(f"Payment from {sender} still pending snap reply.")
-                still_pending.append(payment)
-            elif not paid and now - ts >= timeout:
+            if not paid and not mark_processed and now < payment.deadline:
+                logger.info(
+                    "Payment from %s still pending snap reply.", sender, extra=PER_OP
+                )
+                continue
+            elif not paid and not mark_processed:
                 reason = "Payment timed out waiting for snap"
                 logger.info(f"Payment from {sender} timed out waiting for snap.")
                 # Send Discord notification for timeout
@@ -580,10 +897,20 @@ class HiveBot:
                     ],
                 )
                 mark_processed = True
-            db.conn.execute(
-                "INSERT INTO payment_events (block_num, op_id, username, amount, memo, snap_permlink, paid, reason) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (block_num, op_id, sender, amount, memo, snap_permlink, paid, reason),
+            db.record_payment_event(
+                block_num,
+                op_id,
+                sender,
+                to,
+                amount,
+                memo,
+                snap_permlink,
+                paid,
+                reason,
+                cashback=cashback if paid else None,
+                payout_status="queued" if paid else None,
             )
+            metrics.OUTCOMES[reason_key(paid, reason)].inc()
             if mark_processed and paid == 0:
                 # Record terminal denial to avoid reprocessing on restarts or duplicate node responses
                 try:
@@ -595,5 +922,10 @@ class HiveBot:
                     logger.warning(
                         f"Failed to mark processed (denied) for {op_id}: {e}"
                     )
-            db.conn.commit()
-        self.pending_payments = still_pending
+            db.conn.execute(
+                "DELETE FROM pending_payments WHERE block_num=? AND op_id=?",
+                (block_num, op_id),
+            )
+            if paid or mark_processed:
+                self.processed_ops.add(block_num, op_id)
+            self.pending_payments.remove(payment)
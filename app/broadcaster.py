@@ -0,0 +1,341 @@
+import json
+import threading
+import time
+from app import metrics
+from app.config import config
+from app.db import db, write_with_retry
+from app.logging_utils import setup_logger
+from app.notifier import discord
+from app.rpc import RPCError
+
+logger = setup_logger("paynsnapbot")
+
+# condenser_api.get_account_history operation_filter_low bit for transfer ops
+TRANSFER_OP_FILTER = 1 << 2
+
+
+def is_rejection(error) -> bool:
+    """True when the node answered with an error, so the transaction was not
+    accepted; anything else (timeouts, dropped connections) may have landed"""
+    from lighthive.exceptions import RPCNodeException
+
+    return isinstance(error, (RPCNodeException, RPCError))
+
+
+class Broadcaster:
+    """Background worker that drains the outbox table.
+
+    check_pending_payments only queues transfers and replies in the outbox,
+    in the same transaction that marks the payment processed. This worker
+    broadcasts them with retries and exponential backoff, so block ingestion
+    never waits on signing or broadcast round-trips. A broadcast that raised
+    may still have landed (a timeout after the node accepted it), so every
+    retry, and every entry caught mid-send by a crash, is checked against the
+    chain before it is sent again.
+
+    Transfers are grouped into one multi-op transaction of up to batch_size
+    ops, waiting at most batch_delay seconds for a batch to fill. Replies
+    wait until their payment's transfer is sent, and are cancelled if it
+    fails for good.
+    """
+
+    def __init__(self, bot):
+        outbox_config = config.get("outbox", {})
+        self.bot = bot
+        self.poll_interval = outbox_config.get("poll_interval", 2)
+        self.max_attempts = outbox_config.get("max_attempts", 8)
+        self.base_backoff = outbox_config.get("base_backoff", 5)
+        self.max_backoff = outbox_config.get("max_backoff", 600)
+        # A transaction that raised can still be included until it expires;
+        # wait that long before checking the chain and retrying
+        self.settle_delay = outbox_config.get("settle_delay", 60)
+        self.batch_size = outbox_config.get("batch_size", 10)
+        self.batch_delay = outbox_config.get("batch_delay", 3)
+        self.conn = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(
+            target=self.run, name="broadcaster", daemon=True
+        )
+        self._thread.start()
+
+    def run(self):
+        logger.info("Starting outbox broadcaster...")
+        self.conn = db.connect()
+        self.recover()
+        while True:
+            try:
+                if not self.drain():
+                    time.sleep(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Broadcaster loop error: {e}")
+                time.sleep(self.poll_interval)
+
+    def recover(self):
+        """Resolve entries left in 'sending' by a crash"""
+        rows = self.conn.execute(
+            "SELECT id, kind, payload FROM outbox WHERE status = 'sending'"
+        ).fetchall()
+        for entry_id, kind, payload in rows:
+            try:
+                done = self.already_broadcast(kind, json.loads(payload))
+            except Exception as e:
+                logger.warning(f"Could not verify outbox entry {entry_id}: {e}")
+                done = False
+            if done:
+                logger.info(f"Outbox entry {entry_id} was already on chain")
+                self._sent(entry_id, kind, json.loads(payload), "recovered")
+            else:
+                # A transaction sent just before the crash may still be in
+                # flight; give it settle_delay before the chain is checked again
+                self._write(
+                    "UPDATE outbox SET status = 'pending', next_attempt = ? WHERE id = ?",
+                    (time.time() + self.settle_delay, entry_id),
+                )
+
+    def already_broadcast(self, kind, payload):
+        if kind == "transfer":
+            history = self.bot.pool.get_account_history(
+                self.bot.username, -1, 100, TRANSFER_OP_FILTER
+            )
+            amount = f"{payload['amount']:.3f} HBD"
+            for _, entry in history or []:
+                op_type, op_data = entry.get("op", [None, {}])
+                if (
+                    op_type == "transfer"
+                    and op_data.get("to") == payload["user"]
+                    and op_data.get("memo") == payload["memo"]
+                    and op_data.get("amount") == amount
+                ):
+                    return True
+            return False
+        if kind == "reply":
+            post = self.bot.pool.get_content(self.bot.username, payload["permlink"])
+            return bool(post and post.get("author"))
+        return False
+
+    def drain(self, limit: int = 20) -> int:
+        """Broadcast due entries; returns how many were attempted"""
+        rows = self.conn.execute(
+            """
+            SELECT id, kind, payload, attempts, CAST(strftime('%s', created_at) AS REAL)
+            FROM outbox
+            WHERE status = 'pending' AND next_attempt <= ?
+              AND (kind != 'reply' OR EXISTS (
+                  SELECT 1 FROM outbox t
+                  WHERE t.kind = 'transfer' AND t.block_num = outbox.block_num
+                    AND t.op_id = outbox.op_id AND t.status = 'sent'
+              ))
+            ORDER BY id
+            LIMIT ?
+            """,
+            (time.time(), limit),
+        ).fetchall()
+        entries = [
+            (entry_id, kind, json.loads(payload), attempts, created)
+            for entry_id, kind, payload, attempts, created in rows
+        ]
+        attempted = 0
+        if self.batch_size > 1:
+            transfers = [e for e in entries if e[1] == "transfer"]
+            entries = [e for e in entries if e[1] != "transfer"]
+            oldest = min((e[4] for e in transfers), default=None)
+            if transfers and (
+                len(transfers) >= self.batch_size
+                or time.time() - oldest >= self.batch_delay
+            ):
+                attempted += self._send_transfer_batch(transfers[: self.batch_size])
+        for entry in entries:
+            self._claim([entry[0]])
+            self._send_one(*entry[:4])
+            attempted += 1
+        return attempted
+
+    def _write(self, sql, params):
+        # Waits out the bot's block transaction instead of failing on
+        # busy_timeout, which would strand an entry in 'sending'
+        write_with_retry(self.conn, [(sql, params)])
+
+    def _claim(self, entry_ids):
+        write_with_retry(
+            self.conn,
+            [
+                (
+                    "UPDATE outbox SET status = 'sending', attempts = attempts + 1 WHERE id = ?",
+                    (entry_id,),
+                )
+                for entry_id in entry_ids
+            ],
+        )
+
+    def _send_one(self, entry_id, kind, payload, attempts):
+        if attempts:
+            try:
+                done = self.already_broadcast(kind, payload)
+            except Exception as e:
+                self._mark_failed(
+                    entry_id,
+                    kind,
+                    payload,
+                    attempts + 1,
+                    f"could not verify earlier attempt: {e}",
+                )
+                return
+            if done:
+                logger.info(f"Outbox entry {entry_id} landed on an earlier attempt")
+                self._sent(entry_id, kind, payload, "recovered")
+                return
+        try:
+            result = self.broadcast(kind, payload)
+        except Exception as e:
+            self._mark_failed(entry_id, kind, payload, attempts + 1, e)
+            return
+        self._sent(entry_id, kind, payload, result)
+
+    def _sent(self, entry_id, kind, payload, result):
+        self._mark_sent(entry_id, result)
+        self._record_payout(entry_id, kind, "sent", result)
+        metrics.PAYOUT_RESULTS[kind, "sent"].inc()
+        notification = payload.get("notification")
+        if notification:
+            discord.notify(**notification)
+
+    def _send_transfer_batch(self, transfers) -> int:
+        self._claim([entry[0] for entry in transfers])
+        # Retries go one at a time, so each is checked against the chain first
+        fresh = [entry for entry in transfers if not entry[3]]
+        for entry in transfers:
+            if entry[3] or len(fresh) == 1:
+                self._send_one(*entry[:4])
+        if len(fresh) < 2:
+            return len(transfers)
+        try:
+            with metrics.BROADCAST_KINDS["transfer_batch"].time():
+                result = self.bot.send_cashback_batch([entry[2] for entry in fresh])
+        except Exception as e:
+            self._batch_failed(fresh, e)
+            return len(transfers)
+        for entry_id, kind, payload, _, _ in fresh:
+            self._sent(entry_id, kind, payload, result)
+        return len(transfers)
+
+    def _batch_failed(self, transfers, error):
+        if is_rejection(error):
+            # Nothing landed; one bad transfer fails the whole transaction, so isolate it
+            logger.warning(
+                f"Batch of {len(transfers)} transfers rejected ({error}), retrying individually"
+            )
+            for entry in transfers:
+                self._send_one(*entry[:4])
+            return
+        # The batch may have landed: keep what is on chain, retry the rest later
+        logger.warning(
+            f"Batch of {len(transfers)} transfers failed ({error}), checking the chain"
+        )
+        for entry_id, kind, payload, attempts, _ in transfers:
+            try:
+                done = self.already_broadcast(kind, payload)
+            except Exception as e:
+                logger.warning(f"Could not verify outbox entry {entry_id}: {e}")
+                done = False
+            if done:
+                self._sent(entry_id, kind, payload, "recovered")
+            else:
+                self._mark_failed(entry_id, kind, payload, attempts + 1, error)
+
+    def _record_payout(self, entry_id, kind, status, result=None):
+        """Record a transfer's outcome on its payment_events row"""
+        if kind != "transfer":
+            return
+        tx_id = result.get("id") if isinstance(result, dict) else result
+        self._write(
+            """
+            UPDATE payment_events SET payout_status = ?, payout_tx = ?
+            WHERE paid = 1 AND (block_num, op_id) = (
+                SELECT block_num, op_id FROM outbox WHERE id = ?
+            )
+            """,
+            (status, None if tx_id is None else str(tx_id), entry_id),
+        )
+
+    def broadcast(self, kind, payload):
+        if kind == "transfer":
+            with metrics.BROADCAST_KINDS["transfer"].time():
+                return self.bot.send_cashback(
+                    payload["user"], payload["amount"], payload["memo"]
+                )
+        if kind == "reply":
+            with metrics.BROADCAST_KINDS["reply"].time():
+                return self.bot.reply_comment(
+                    payload["user"],
+                    payload["memo"],
+                    payload["amount"],
+                    payload["parent_author"],
+                    payload["parent_permlink"],
+                    payload.get("store"),
+                    payload.get("permlink"),
+                )
+        raise ValueError(f"Unknown outbox entry kind: {kind}")
+
+    def _mark_sent(self, entry_id, result):
+        self._write(
+            "UPDATE outbox SET status = 'sent', result = ?, sent_at = datetime('now') WHERE id = ?",
+            (json.dumps(result, default=str), entry_id),
+        )
+
+    def _mark_failed(self, entry_id, kind, payload, attempts, error):
+        if attempts >= self.max_attempts:
+            logger.error(
+                f"Outbox entry {entry_id} ({kind} for {payload.get('user')}) failed permanently: {error}"
+            )
+            statements = [
+                (
+                    "UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?",
+                    (str(error), entry_id),
+                )
+            ]
+            if kind == "transfer":
+                # "I just sent you X HBD" must not go out for a payout that failed
+                statements.append(
+                    (
+                        """
+                        UPDATE outbox SET status = 'cancelled', last_error = 'transfer failed'
+                        WHERE kind = 'reply' AND status = 'pending' AND (block_num, op_id) = (
+                            SELECT block_num, op_id FROM outbox WHERE id = ?
+                        )
+                        """,
+                        (entry_id,),
+                    )
+                )
+            write_with_retry(self.conn, statements)
+            self._record_payout(entry_id, kind, "failed")
+            metrics.PAYOUT_RESULTS[kind, "failed"].inc()
+            discord.notify(
+                title="❌ Broadcast Failed",
+                description=f"Could not broadcast {kind} for **@{payload.get('user')}** after {attempts} attempts",
+                color=0xFF0000,  # Red
+                fields=[
+                    {
+                        "name": "Invoice",
+                        "value": payload.get("memo", ""),
+                        "inline": True,
+                    },
+                    {"name": "Error", "value": str(error)[:1000], "inline": False},
+                ],
+            )
+            return
+        metrics.PAYOUT_RESULTS[kind, "retry"].inc()
+        backoff = max(
+            self.settle_delay,
+            min(self.max_backoff, self.base_backoff * 2 ** (attempts - 1)),
+        )
+        logger.warning(
+            f"Outbox entry {entry_id} ({kind} for {payload.get('user')}) failed, retrying in {backoff}s: {error}"
+        )
+        self._write(
+            "UPDATE outbox SET status = 'pending', next_attempt = ?, last_error = ? WHERE id = ?",
+            (time.time() + backoff, str(error), entry_id),
+        )
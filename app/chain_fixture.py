@@ -0,0 +1,213 @@
+"""Recorded Hive blocks for offline tests, replays and benchmarks.
+
+A fixture is a directory holding:
+
+  blocks.dat     one zlib-compressed JSON op list per block, back to back
+  blocks.idx     fixed-width (block_num, offset, length) entries sorted by
+                 block number, binary-searched in place
+  contents.json.gz  get_content results for the snaps referenced by the blocks
+  meta.json      first/last block and format version
+
+Both .dat and .idx are memory-mapped, so opening a fixture of any size is
+instant and a block read decompresses only that block.
+
+Record a range from the live nodes with:
+  python -m app.chain_fixture record 90000000 90001000 fixtures/sample
+"""
+
+import argparse
+import gzip
+import json
+import mmap
+import os
+import struct
+import zlib
+
+FORMAT_VERSION = 1
+INDEX_ENTRY = struct.Struct("<QQI")  # block_num, offset, length
+
+
+class ChainFixture:
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported fixture version {self.meta.get('version')}")
+        self.first_block = self.meta["first_block"]
+        self.last_block = self.meta["last_block"]
+        self._data_file = open(os.path.join(path, "blocks.dat"), "rb")
+        self._index_file = open(os.path.join(path, "blocks.idx"), "rb")
+        self._data = _map(self._data_file)
+        self._index = _map(self._index_file)
+        self.count = len(self._index) // INDEX_ENTRY.size
+        with gzip.open(os.path.join(path, "contents.json.gz"), "rt") as f:
+            self.contents = json.load(f)
+
+    def _entry(self, i: int):
+        return INDEX_ENTRY.unpack_from(self._index, i * INDEX_ENTRY.size)
+
+    def _find(self, block_num: int):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < block_num:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __contains__(self, block_num: int) -> bool:
+        i = self._find(block_num)
+        return i < self.count and self._entry(i)[0] == block_num
+
+    def __len__(self):
+        return self.count
+
+    def ops(self, block_num: int):
+        """Ops of a recorded block as get_ops_in_block returns them, or None"""
+        i = self._find(block_num)
+        if i >= self.count:
+            return None
+        found, offset, length = self._entry(i)
+        if found != block_num:
+            return None
+        return json.loads(zlib.decompress(self._data[offset : offset + length]))
+
+    def blocks(self, start: int = None, end: int = None):
+        """Yield (block_num, ops) for recorded blocks in [start, end]"""
+        i = self._find(start if start is not None else self.first_block)
+        while i < self.count:
+            block_num, offset, length = self._entry(i)
+            if end is not None and block_num > end:
+                return
+            yield block_num, json.loads(
+                zlib.decompress(self._data[offset : offset + length])
+            )
+            i += 1
+
+    def content(self, author: str, permlink: str):
+        return self.contents.get(f"{author}/{permlink}")
+
+    def close(self):
+        for view in (self._data, self._index):
+            if isinstance(view, mmap.mmap):
+                view.close()
+        self._data_file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _map(f):
+    # mmap cannot map an empty file
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class FixtureWriter:
+    """Write a fixture directory; blocks may be added in any order"""
+
+    def __init__(self, path: str, level: int = 6):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.level = level
+        self._data = open(os.path.join(path, "blocks.dat"), "wb")
+        self._offset = 0
+        self._index = []
+        self.contents = {}
+
+    def add_block(self, block_num: int, ops):
+        record = zlib.compress(
+            json.dumps(ops, separators=(",", ":")).encode(), self.level
+        )
+        self._data.write(record)
+        self._index.append((block_num, self._offset, len(record)))
+        self._offset += len(record)
+
+    def add_content(self, author: str, permlink: str, content: dict):
+        self.contents[f"{author}/{permlink}"] = content
+
+    def close(self, **meta):
+        self._data.close()
+        self._index.sort()
+        with open(os.path.join(self.path, "blocks.idx"), "wb") as f:
+            for entry in self._index:
+                f.write(INDEX_ENTRY.pack(*entry))
+        with gzip.open(os.path.join(self.path, "contents.json.gz"), "wt") as f:
+            json.dump(self.contents, f)
+        meta.update(
+            version=FORMAT_VERSION,
+            first_block=self._index[0][0] if self._index else 0,
+            last_block=self._index[-1][0] if self._index else 0,
+            blocks=len(self._index),
+        )
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+def snap_refs(ops):
+    """(author, permlink) of every snap posted in a block's ops"""
+    for op in ops:
+        op_type, op_data = op.get("op", [None, {}])
+        if op_type == "comment" and op_data.get("parent_author") == "peak.snaps":
+            yield op_data["author"], op_data["permlink"]
+
+
+def record(pool, path: str, start: int, end: int, progress=None) -> int:
+    """Record blocks start..end (inclusive) and the snaps they contain"""
+    writer = FixtureWriter(path)
+    for block_num in range(start, end + 1):
+        ops = pool.get_ops_in_block(block_num, False)
+        writer.add_block(block_num, ops)
+        for author, permlink in snap_refs(ops):
+            writer.add_content(author, permlink, pool.get_content(author, permlink))
+        if progress and (block_num - start) % 100 == 0:
+            progress(block_num)
+    writer.close(recorded_from=pool.urls)
+    return end - start + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and inspect chain fixtures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser(
+        "record", help="Record a block range from the configured nodes"
+    )
+    rec.add_argument("start", type=int)
+    rec.add_argument("end", type=int)
+    rec.add_argument("path")
+    info = sub.add_parser("info", help="Summarise a fixture")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from app.node_pool import NodePool
+
+        count = record(
+            NodePool(),
+            args.path,
+            args.start,
+            args.end,
+            progress=lambda n: print(f"Recorded up to block {n}"),
+        )
+        print(f"Recorded {count} blocks to {args.path}")
+    else:
+        with ChainFixture(args.path) as fixture:
+            size = sum(
+                os.path.getsize(os.path.join(args.path, name))
+                for name in os.listdir(args.path)
+            )
+            print(
+                f"Blocks {fixture.first_block}-{fixture.last_block} "
+                f"({len(fixture)} recorded, {len(fixture.contents)} snaps, {size / 1024:.0f} KiB)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Shared-database channel between the web app and the block worker.
+
+The worker (app/worker.py) owns ingestion and every write to bot state.
+The dashboard asks it to act by queueing rows in admin_commands; the worker
+runs them between blocks on its own connection, so caches it holds (such
+as UserStateCache) stay in step. The worker publishes its live status to
+bot_status every few seconds for the dashboard and /metrics to read.
+"""
+
+import json
+import time
+from typing import Optional
+
+CONTROL_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS admin_commands (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        command TEXT NOT NULL,
+        args TEXT,
+        status TEXT DEFAULT 'pending',
+        result TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        done_at TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_admin_commands_status ON admin_commands (status, id)",
+    """
+    CREATE TABLE IF NOT EXISTS bot_status (
+        name TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    )
+    """,
+]
+
+
+def queue_command(conn, command: str, **args) -> int:
+    from app.db import write_with_retry
+
+    # The worker may hold the write lock for a whole block; wait for it
+    cursor = write_with_retry(
+        conn,
+        [
+            (
+                "INSERT INTO admin_commands (command, args) VALUES (?, ?)",
+                (command, json.dumps(args)),
+            )
+        ],
+        timeout=30,
+    )
+    return cursor.lastrowid
+
+
+def get_command(conn, command_id: int) -> Optional[dict]:
+    row = conn.execute(
+        "SELECT id, command, args, status, result, created_at, done_at FROM admin_commands WHERE id = ?",
+        (command_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row[0],
+        "command": row[1],
+        "args": json.loads(row[2] or "{}"),
+        "status": row[3],
+        "result": json.loads(row[4]) if row[4] else None,
+        "created_at": row[5],
+        "done_at": row[6],
+    }
+
+
+def wait_for_command(
+    conn, command_id: int, timeout: float = 5.0, interval: float = 0.1
+) -> Optional[dict]:
+    """Poll until the worker has run the command or timeout passes; returns
+    the command row either way"""
+    deadline = time.monotonic() + timeout
+    while True:
+        command = get_command(conn, command_id)
+        if (
+            command is None
+            or command["status"] != "pending"
+            or time.monotonic() >= deadline
+        ):
+            return command
+        time.sleep(interval)
+
+
+def run_commands(conn, handlers: dict) -> int:
+    """Run pending commands oldest first with handlers[command](**args).
+
+    A command without a handler, or whose handler raises, is marked failed
+    with the error as its result. Returns the number of commands run.
+    """
+    pending = conn.execute(
+        "SELECT id, command, args FROM admin_commands WHERE status = 'pending' ORDER BY id"
+    ).fetchall()
+    for command_id, command, args in pending:
+        handler = handlers.get(command)
+        try:
+            if handler is None:
+                raise ValueError(f"unknown command {command}")
+            status, result = "done", handler(**json.loads(args or "{}"))
+        except Exception as e:
+            status, result = "failed", str(e)
+        conn.execute(
+            "UPDATE admin_commands SET status = ?, result = ?, done_at = datetime('now') WHERE id = ?",
+            (status, json.dumps(result), command_id),
+        )
+        conn.commit()
+    return len(pending)
+
+
+def write_status(conn, status: dict, name: str = "bot"):
+    conn.execute(
+        "INSERT OR REPLACE INTO bot_status (name, status, updated_at) VALUES (?, ?, ?)",
+        (name, json.dumps(status), time.time()),
+    )
+    conn.commit()
+
+
+def read_status(conn, name: str = "bot", max_age: float = 30) -> Optional[dict]:
+    """The last published status with its age; stale once older than max_age"""
+    row = conn.execute(
+        "SELECT status, updated_at FROM bot_status WHERE name = ?", (name,)
+    ).fetchone()
+    if row is None:
+        return None
+    status = json.loads(row[0])
+    status["age"] = round(time.time() - row[1], 1)
+    status["stale"] = status["age"] > max_age
+    return status
@@ -1,16 +1,29 @@
 import os
-import json
-import time
-import requests
 import secrets
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse
-from jinja2 import Environment, FileSystemLoader
+from typing import Optional
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, Request, Form, Header, HTTPException
+from fastapi.responses import HTMLResponse, StreamingResponse
 from app.db import db
 from app.config import config
+from app.notifier import discord
+from app import control, export, rollups
 
 router = APIRouter()
-env = Environment(loader=FileSystemLoader("templates"))
+_env = None
+
+
+def _template(name: str):
+    # jinja2 is loaded on the first page render, not at import
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+        # Query parameters and chain data (memos, usernames) end up in pages
+        _env = Environment(
+            loader=FileSystemLoader("templates"), autoescape=select_autoescape()
+        )
+    return _env.get_template(name)
 
 
 def get_admin():
@@ -18,27 +31,20 @@ def get_admin():
     pass
 
 
+def _check_token(token: str):
+    admin_token = os.getenv("ADMIN_TOKEN", "")
+    if not admin_token:
+        raise HTTPException(status_code=500, detail="Admin token not configured")
+    if not secrets.compare_digest(token or "", admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def _paid_filter(paid: Optional[str]) -> Optional[int]:
+    return int(paid) if paid in ("0", "1") else None
+
+
 def _discord_notify(title: str, description: str, color: int = 0x3399FF):
-    url = os.getenv("DISCORD_WEBHOOK_URL")
-    if not url:
-        return
-    try:
-        embed = {
-            "title": title,
-            "description": description,
-            "color": color,
-            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
-        }
-        payload = {"username": "PaySnap Bot", "embeds": [embed]}
-        requests.post(
-            url,
-            data=json.dumps(payload),
-            headers={"Content-Type": "application/json"},
-            timeout=10,
-        )
-    except Exception:
-        # Fail silently for admin UX; logs are handled elsewhere
-        pass
+    discord.notify(title, description, color)
 
 
 def _latest_transactions(limit: int = 20):
@@ -48,7 +54,7 @@ def _latest_transactions(limit: int = 20):
         SELECT username, amount, memo, paid, reason, timestamp, snap_permlink 
         FROM payment_events 
         WHERE paid = 1 
-        ORDER BY timestamp DESC 
+        ORDER BY id DESC 
         LIMIT ?
         """,
         (limit,),
@@ -60,31 +66,141 @@ def _latest_transactions(limit: int = 20):
 def dashboard(request: Request):
     # Query recent cashback transactions from payment_events table
     transactions = _latest_transactions()
-    template = env.get_template("dashboard.html")
+    template = _template("dashboard.html")
     return template.render(transactions=transactions, message=None)
 
 
+@router.get("/stats", response_class=HTMLResponse)
+def stats(
+    request: Request,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store: Optional[str] = None,
+):
+    template = _template("stats.html")
+    return template.render(
+        days=rollups.daily_stats(db.conn, start, end, store),
+        reasons=rollups.reason_stats(db.conn, start, end, store),
+        start=start or "",
+        end=end or "",
+        store=store or "",
+    )
+
+
+@router.get("/api/stats")
+def stats_api(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store: Optional[str] = None,
+):
+    return {"days": rollups.daily_stats(db.conn, start, end, store)}
+
+
+@router.get("/api/stats/reasons")
+def reason_stats_api(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store: Optional[str] = None,
+):
+    return {"reasons": rollups.reason_stats(db.conn, start, end, store)}
+
+
+@router.get("/transactions", response_class=HTMLResponse)
+def transactions(
+    request: Request,
+    before: Optional[int] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store: Optional[str] = None,
+    user: Optional[str] = None,
+    paid: Optional[str] = None,
+    limit: int = 50,
+):
+    filters = export.build_filters(start, end, store, user, _paid_filter(paid))
+    limit = max(1, min(limit, 500))
+    rows = export.newest_page(db.conn, filters, before_id=before, limit=limit)
+    query = {
+        "start": start or "",
+        "end": end or "",
+        "store": store or "",
+        "user": user or "",
+        "paid": paid if _paid_filter(paid) is not None else "",
+    }
+    next_url = None
+    if len(rows) == limit:
+        params = {k: v for k, v in query.items() if v}
+        params.update(before=rows[-1]["id"], limit=limit)
+        next_url = "/admin/transactions?" + urlencode(params)
+    template = _template("transactions.html")
+    return template.render(rows=rows, next_url=next_url, filters=query)
+
+
+@router.get("/export")
+def export_payment_events(
+    format: str = "csv",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store: Optional[str] = None,
+    user: Optional[str] = None,
+    paid: Optional[str] = None,
+    token: str = "",
+    x_admin_token: str = Header(""),
+):
+    _check_token(x_admin_token or token)
+    rows = export.iter_rows(
+        export.build_filters(start, end, store, user, _paid_filter(paid))
+    )
+    if format == "ndjson":
+        return StreamingResponse(
+            export.stream_ndjson(rows),
+            media_type="application/x-ndjson",
+            headers={
+                "Content-Disposition": "attachment; filename=payment_events.ndjson"
+            },
+        )
+    if format == "csv":
+        return StreamingResponse(
+            export.stream_csv(rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=payment_events.csv"},
+        )
+    raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+
+@router.get("/api/status")
+def worker_status():
+    """Live status published by the block worker"""
+    return {"worker": control.read_status(db.conn)}
+
+
+@router.get("/notifications")
+def notification_stats():
+    # Notifications are sent by the worker; report its dispatcher
+    status = control.read_status(db.conn)
+    return status["notifications"] if status else discord.stats()
+
+
 @router.post("/reset_user", response_class=HTMLResponse)
 def reset_user(request: Request, username: str = Form(...), token: str = Form("")):
-    admin_token = os.getenv("ADMIN_TOKEN", "")
-    if not admin_token:
-        raise HTTPException(status_code=500, detail="Admin token not configured")
-    if not secrets.compare_digest(token, admin_token):
-        raise HTTPException(status_code=403, detail="Forbidden")
+    _check_token(token)
 
-    success = db.reset_user(username.strip())
-    message = (
-        f"User @{username} reset successfully."
-        if success
-        else f"User @{username} not found or reset failed."
-    )
+    # The worker owns the users table and its cache, so it runs the reset
+    command_id = control.queue_command(db.conn, "reset_user", username=username.strip())
+    command = control.wait_for_command(db.conn, command_id)
+    success = command["status"] == "done" and command["result"]
+    if command["status"] == "pending":
+        message = f"Reset of @{username} queued; the worker will apply it shortly."
+    elif success:
+        message = f"User @{username} reset successfully."
+    else:
+        message = f"User @{username} not found or reset failed."
     if success:
         _discord_notify(
             title="Admin Action: User Reset",
             description=f"Admin reset daily counters for @{username}",
             color=0x3366FF,
         )
-    template = env.get_template("dashboard.html")
+    template = _template("dashboard.html")
     return template.render(transactions=_latest_transactions(), message=message)
 
 
@@ -1,13 +1,106 @@
+import json
+import os
 import sqlite3
-from typing import Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from app.config import config
+from app import control, rollups
+from app.metrics import MeteredConnection
 
-DB_PATH = "paynsnap.db"
+DB_PATH = os.getenv("DB_PATH", "paynsnap.db")
+
+# Applied to every connection. WAL lets dashboard readers run alongside the
+# bot's write transaction; NORMAL sync is durable across app crashes in WAL.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # KiB
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: indexes for the dashboard, per-user lookups and payout updates
+    [
+        "CREATE INDEX IF NOT EXISTS idx_payment_events_paid_timestamp ON payment_events (paid, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_payment_events_username ON payment_events (username)",
+        "CREATE INDEX IF NOT EXISTS idx_payment_events_op ON payment_events (block_num, op_id)",
+    ],
+    # 2: the weekly report sums the daily rollups; drop its own aggregates
+    [
+        "DROP TABLE IF EXISTS weekly_store_stats",
+        "DROP TABLE IF EXISTS weekly_store_reasons",
+        "DROP TABLE IF EXISTS weekly_store_users",
+        "DROP TABLE IF EXISTS report_watermarks",
+    ],
+]
+
+
+def write_with_retry(conn, statements, timeout: float = None):
+    """Execute [(sql, params), ...] and commit as one transaction.
+
+    The bot keeps its block transaction open across node calls, up to
+    catchup_commit_interval blocks, which can outlast busy_timeout. Writers
+    on other connections retry until the lock frees; timeout=None retries
+    for as long as it takes. Returns the last statement's cursor.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.5
+    while True:
+        try:
+            for sql, params in statements:
+                cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            if "locked" not in str(e) or (
+                deadline is not None and time.monotonic() >= deadline
+            ):
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 5)
 
 
 class Database:
+    """SQLite access with one connection per thread.
+
+    The bot loop, the broadcaster and each dashboard worker thread get their
+    own connection, so a reader never shares (or commits) the bot's open
+    write transaction. Nothing is opened until the first query; the schema
+    is created and migrated then, once per process.
+    """
+
+    connection_factory = MeteredConnection
+
     def __init__(self, db_path: str = DB_PATH):
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.create_tables()
+        self.path = db_path
+        self.pragmas = {**PRAGMAS, **config.get("database", {}).get("pragmas", {})}
+        self._local = threading.local()
+        self._user_reset_callbacks = []
+        self._schema_ready = False
+        self._schema_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            self.prepare()
+        return conn
+
+    def prepare(self):
+        """Create and migrate the schema if this process has not yet"""
+        with self._schema_lock:
+            if not self._schema_ready:
+                self.create_tables()
+                self.migrate()
+                self._schema_ready = True
 
     def create_tables(self):
         cursor = self.conn.cursor()
@@ -59,7 +152,223 @@ class Database:
         )
         """
         )
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS pending_payments (
+            block_num INTEGER,
+            op_id TEXT,
+            sender TEXT,
+            store TEXT,
+            amount REAL,
+            memo TEXT,
+            block_time REAL,
+            deadline REAL,
+            snap_author TEXT,
+            snap_permlink TEXT,
+            PRIMARY KEY (block_num, op_id)
+        )
+        """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_pending_payments_sender ON pending_payments (sender)"
+        )
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT,
+            payload TEXT,
+            block_num INTEGER,
+            op_id TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt REAL DEFAULT 0,
+            last_error TEXT,
+            result TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP
+        )
+        """
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, next_attempt)"
+        )
+        cursor.execute(
+            """
+        CREATE TABLE IF NOT EXISTS checkpoints (
+            name TEXT PRIMARY KEY,
+            block_num INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+        )
+        for statement in rollups.ROLLUP_TABLES + control.CONTROL_TABLES:
+            cursor.execute(statement)
+        self.add_column("payment_events", "store", "TEXT")
+        self.add_column("payment_events", "cashback", "REAL")
+        self.add_column("payment_events", "payout_status", "TEXT")
+        self.add_column("payment_events", "payout_tx", "TEXT")
+        self.conn.commit()
+
+    def add_column(self, table: str, column: str, declaration: str):
+        """Add a column to an existing table if it is missing"""
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection with the performance pragmas applied"""
+        conn = sqlite3.connect(
+            self.path, check_same_thread=False, factory=self.connection_factory
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def close(self):
+        """Close this thread's connection; the next access reconnects"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def reopen(self, db_path: str):
+        """Point this thread at another database file, creating its schema"""
+        self.close()
+        self.path = db_path
+        self._schema_ready = False
+        self._local.conn = self.connect()
+        self.prepare()
+
+    def migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                self.conn.execute(statement)
+            self.conn.execute(f"PRAGMA user_version = {number}")
+            self.conn.commit()
+
+    def prune_processed_ops(self, before_block: int) -> int:
+        """Delete processed_ops rows older than before_block (uses the primary key prefix)"""
+        cursor = self.conn.execute(
+            "DELETE FROM processed_ops WHERE block_num < ?", (before_block,)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def get_checkpoint(self, name: str = "last_block") -> Optional[int]:
+        row = self.conn.execute(
+            "SELECT block_num FROM checkpoints WHERE name = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_checkpoint(self, block_num: int, name: str = "last_block"):
+        """Record the last fully processed block.
+        Does not commit: it belongs to the same transaction as the block's writes."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (name, block_num, updated_at) VALUES (?, ?, datetime('now'))",
+            (name, block_num),
+        )
+
+    def import_checkpoint_file(self, path: str, name: str = "last_block") -> bool:
+        """One-time import of a legacy checkpoint file; the file is renamed afterwards"""
+        if self.get_checkpoint(name) is not None or not os.path.exists(path):
+            return False
+        with open(path, "r") as f:
+            block_num = int(f.read().strip())
+        self.set_checkpoint(block_num, name)
         self.conn.commit()
+        os.replace(path, path + ".imported")
+        return True
+
+    def record_payment_event(
+        self,
+        block_num: int,
+        op_id: str,
+        username: str,
+        store: str,
+        amount: float,
+        memo: str,
+        snap_permlink: Optional[str],
+        paid: int,
+        reason: Optional[str],
+        cashback: Optional[float] = None,
+        payout_status: Optional[str] = None,
+    ):
+        """Insert a payment_events row and fold it into the daily rollups.
+        Does not commit: it belongs to the payment's transaction."""
+        cursor = self.conn.execute(
+            """
+            INSERT INTO payment_events (block_num, op_id, username, store, amount, cashback, memo, snap_permlink, paid, reason, payout_status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                block_num,
+                op_id,
+                username,
+                store,
+                amount,
+                cashback,
+                memo,
+                snap_permlink,
+                paid,
+                reason,
+                payout_status,
+            ),
+        )
+        day = self.conn.execute(
+            "SELECT date(timestamp) FROM payment_events WHERE id = ?",
+            (cursor.lastrowid,),
+        ).fetchone()[0]
+        rollups.apply_event(
+            self.conn, day, store, username, amount, cashback, paid, reason
+        )
+
+    def queue_outbox(self, kind: str, payload: dict, block_num: int, op_id: str):
+        """Queue a broadcast for the broadcaster worker.
+        Does not commit: call it inside the transaction that decides the payout."""
+        self.conn.execute(
+            "INSERT INTO outbox (kind, payload, block_num, op_id) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload), block_num, op_id),
+        )
+
+    def add_pending_payment(
+        self,
+        block_num: int,
+        op_id: str,
+        sender: str,
+        store: str,
+        amount: float,
+        memo: str,
+        block_time: float,
+        deadline: float,
+    ) -> bool:
+        """Persist a qualifying transfer awaiting its snap.
+        Returns False if the payment was already pending.
+        Does not commit: it is committed with the block's checkpoint."""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "INSERT OR IGNORE INTO pending_payments (block_num, op_id, sender, store, amount, memo, block_time, deadline) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (block_num, op_id, sender, store, amount, memo, block_time, deadline),
+        )
+        return cursor.rowcount > 0
+
+    def attach_pending_snap(self, sender: str, snap_author: str, snap_permlink: str):
+        self.conn.execute(
+            "UPDATE pending_payments SET snap_author = ?, snap_permlink = ? WHERE sender = ? AND snap_author IS NULL",
+            (snap_author, snap_permlink, sender),
+        )
+
+    def load_pending_payments(self):
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """
+            SELECT sender, store, amount, memo, block_num, op_id, block_time, deadline, snap_author, snap_permlink
+            FROM pending_payments
+            ORDER BY block_num, rowid
+            """
+        )
+        return cursor.fetchall()
 
     def add_user(self, username: str):
         cursor = self.conn.cursor()
@@ -77,8 +386,14 @@ class Database:
             (username,),
         )
         self.conn.commit()
+        for callback in self._user_reset_callbacks:
+            callback(username)
         return cursor.rowcount > 0
 
+    def on_user_reset(self, callback):
+        """Register a callback run with the username after reset_user"""
+        self._user_reset_callbacks.append(callback)
+
     def ban_user(self, username: str):
         cursor = self.conn.cursor()
         cursor.execute("INSERT OR IGNORE INTO bans (username) VALUES (?)", (username,))
@@ -92,4 +407,52 @@ class Database:
     # ...additional methods for stores, ops, purchases...
 
 
+class ProcessedOpsCache:
+    """Bounded LRU of (block_num, op_id) pairs known to be in processed_ops.
+
+    Nothing can be recorded for a block above the table's high-water mark
+    at startup except through add(), so live blocks never hit SQLite. Older
+    blocks (re-processing after a restart) are loaded with one query per block.
+    """
+
+    def __init__(self, database: Database, max_entries: int = 50000):
+        self.db = database
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._loaded_blocks = set()
+        row = database.conn.execute(
+            "SELECT MAX(block_num) FROM processed_ops"
+        ).fetchone()
+        self.high_water = row[0] or 0
+
+    def load_block(self, block_num: int):
+        if block_num > self.high_water or block_num in self._loaded_blocks:
+            return
+        rows = self.db.conn.execute(
+            "SELECT op_id FROM processed_ops WHERE block_num=?", (block_num,)
+        ).fetchall()
+        for (op_id,) in rows:
+            self._remember((block_num, op_id))
+        self._loaded_blocks.add(block_num)
+
+    def contains(self, block_num: int, op_id: str) -> bool:
+        self.load_block(block_num)
+        key = (block_num, op_id)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True
+        return False
+
+    def add(self, block_num: int, op_id: str):
+        self._remember((block_num, op_id))
+
+    def _remember(self, key):
+        self._entries[key] = None
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            (evicted_block, _), _ = self._entries.popitem(last=False)
+            # The block must be re-read if it is looked up again
+            self._loaded_blocks.discard(evicted_block)
+
+
 db = Database()
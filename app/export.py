@@ -0,0 +1,120 @@
+"""Keyset-paginated access to payment_events for exports and the dashboard.
+
+Pages are fetched with `id > cursor` (or `id < cursor` for newest-first
+views) and a LIMIT, so each query is an index range scan and memory stays
+constant however large the table grows.
+"""
+
+import csv
+import io
+import json
+from typing import Optional
+from app.db import db
+
+EXPORT_COLUMNS = [
+    "id",
+    "block_num",
+    "op_id",
+    "username",
+    "store",
+    "amount",
+    "cashback",
+    "memo",
+    "snap_permlink",
+    "paid",
+    "reason",
+    "payout_status",
+    "payout_tx",
+    "timestamp",
+]
+PAGE_SIZE = 500
+
+
+def build_filters(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    store: Optional[str] = None,
+    user: Optional[str] = None,
+    paid: Optional[int] = None,
+):
+    """Return a SQL condition and params for the export filters (dates are UTC YYYY-MM-DD)"""
+    clauses = []
+    params = []
+    if start:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        clauses.append("timestamp < date(?, '+1 day')")
+        params.append(end)
+    if store:
+        clauses.append("store = ?")
+        params.append(store)
+    if user:
+        clauses.append("username = ?")
+        params.append(user)
+    if paid is not None:
+        clauses.append("paid = ?")
+        params.append(paid)
+    return clauses, params
+
+
+def fetch_page(
+    conn,
+    filters,
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = PAGE_SIZE,
+    descending: bool = False,
+):
+    """Fetch one page as dicts: ascending after after_id, or descending
+    (newest first) before before_id or when descending is set"""
+    clauses, params = list(filters[0]), list(filters[1])
+    if after_id is not None:
+        clauses.append("id > ?")
+        params.append(after_id)
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    order = "DESC" if before_id is not None or descending else "ASC"
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM payment_events"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += f" ORDER BY id {order} LIMIT ?"
+    params.append(limit)
+    return [dict(zip(EXPORT_COLUMNS, row)) for row in conn.execute(query, params)]
+
+
+def newest_page(conn, filters, before_id: Optional[int] = None, limit: int = 50):
+    """Newest-first page for the dashboard; pass the last row's id as the next cursor"""
+    return fetch_page(conn, filters, before_id=before_id, limit=limit, descending=True)
+
+
+def iter_rows(filters, page_size: int = PAGE_SIZE, connect=lambda: db.conn):
+    """Yield every matching row oldest-first, one page in memory at a time"""
+    cursor = 0
+    while True:
+        # connect() is called per page: a streaming response may resume this
+        # generator on a different worker thread, which needs its own connection
+        page = fetch_page(connect(), filters, after_id=cursor, limit=page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        cursor = page[-1]["id"]
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() > 65536:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
@@ -1,5 +1,21 @@
+import atexit
 import logging
+import logging.handlers
 import json
+import queue
+import threading
+import time
+from app.config import config
+
+# Pass as extra= on per-block and per-op log calls so they are rate limited
+# per call site (see RateLimitFilter)
+PER_BLOCK = {"rate_limit": "block"}
+PER_OP = {"rate_limit": "op"}
+
+_lock = threading.Lock()
+_queue = queue.SimpleQueue()
+_listener = None
+_rate_filter = None
 
 
 class JsonFormatter(logging.Formatter):
@@ -10,23 +26,98 @@ class JsonFormatter(logging.Formatter):
             "message": record.getMessage(),
             "name": record.name,
         }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            log_record["suppressed"] = suppressed
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
         return json.dumps(log_record)
 
 
+class RateLimitFilter(logging.Filter):
+    """Token-bucket limit per call site for records tagged with rate_limit.
+
+    limits maps a tag ("block", "op") to records per second allowed from
+    each call site, with a burst of the same size. Warnings and errors are
+    never dropped. Dropped records are counted, and the next record let
+    through from that call site carries the count as "suppressed".
+    """
+
+    def __init__(self, limits: dict):
+        super().__init__()
+        self.limits = limits
+        self.suppressed = 0
+        self._sites = {}  # (pathname, lineno) -> [tokens, last, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        rate = self.limits.get(getattr(record, "rate_limit", None))
+        if rate is None or record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [rate, now, 0]
+            site[0] = min(rate, site[0] + (now - site[1]) * rate)
+            site[1] = now
+            if site[0] < 1:
+                site[2] += 1
+                self.suppressed += 1
+                return False
+            site[0] -= 1
+            record.suppressed, site[2] = site[2], 0
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread without formatting them.
+
+    The stock QueueHandler renders the message on the calling thread; here
+    msg % args is only evaluated when the listener writes the record, so
+    hot-path callers pay for one enqueue. Arguments should not be mutated
+    after logging.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _start_listener():
+    global _listener, _rate_filter
+    settings = config.get("logging", {}) or {}
+    _rate_filter = RateLimitFilter(
+        settings.get("rate_limits", {"block": 1.0, "op": 20.0})
+    )
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(_queue, stream)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
 def setup_logger(name: str = "paynsnapbot"):
+    """Return the named logger, attaching the shared queue handler once.
+
+    Safe to call from every module: records are JSON-encoded and written by
+    a single listener thread, never on the caller's thread.
+    """
     logger = logging.getLogger(name)
-    handler = logging.StreamHandler()
-    handler.setFormatter(JsonFormatter())
-    logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
+    with _lock:
+        if _listener is None:
+            _start_listener()
+        if not getattr(logger, "_queue_configured", False):
+            handler = DeferredQueueHandler(_queue)
+            handler.addFilter(_rate_filter)
+            logger.addHandler(handler)
+            logger.setLevel((config.get("logging", {}) or {}).get("level", "INFO"))
+            # The queue handler is the only output; don't repeat through root
+            logger.propagate = False
+            logger._queue_configured = True
     return logger
-    # Ensure root logger is configured so all logs go to terminal
-    root_logger = logging.getLogger()
-    if not root_logger.hasHandlers():
-        handler = logging.StreamHandler()
-        handler.setFormatter(JsonFormatter())
-        root_logger.addHandler(handler)
-        root_logger.setLevel(logging.INFO)
-    logger.setLevel(logging.INFO)
+
+
+def suppressed_count() -> int:
+    """Log records dropped by rate limits since startup"""
+    return _rate_filter.suppressed if _rate_filter else 0
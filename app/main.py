@@ -1,24 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from app.db import db
 from app.config import config
 from app.logging_utils import setup_logger
 from app.dashboard import dashboard_router
-from app.bot import HiveBot
-import threading
+from app import control, metrics
 
+# Read-only web app: blocks are ingested by the worker (python -m app.worker),
+# so this can run under any number of uvicorn workers. Importing it opens
+# no database connection and makes no network calls.
 app = FastAPI()
 logger = setup_logger()
-bot = HiveBot()
-
-
-def start_bot():
-    bot.poll_blocks()
-
-
-@app.on_event("startup")
-def startup_event():
-    thread = threading.Thread(target=start_bot, daemon=True)
-    thread.start()
+worker_settings = config.get("worker", {}) or {}
+READY_MAX_LAG = worker_settings.get("ready_max_lag", 20)
+STATUS_MAX_AGE = worker_settings.get("status_max_age", 30)
+metrics.track_worker_status(db, max_age=STATUS_MAX_AGE)
 
 
 app.include_router(dashboard_router, prefix="/admin")
@@ -26,4 +21,37 @@ app.include_router(dashboard_router, prefix="/admin")
 
 @app.get("/")
 def root():
-    return {"status": "Pay n Snap Hive Cashback Bot is running."}
+    return {
+        "status": "Pay n Snap Hive Cashback Bot is running.",
+        "worker": control.read_status(db.conn, max_age=STATUS_MAX_AGE),
+    }
+
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the web process is serving requests"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz(response: Response):
+    """Readiness: the worker is publishing status and within READY_MAX_LAG blocks of head"""
+    status = control.read_status(db.conn, max_age=STATUS_MAX_AGE)
+    ready = (
+        status is not None
+        and not status["stale"]
+        and status["lag"] is not None
+        and status["lag"] <= READY_MAX_LAG
+    )
+    if not ready:
+        response.status_code = 503
+    return {"ready": ready, "worker": status}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Database-backed gauges and the worker's published status; the
+    worker's own counters are on its metrics port"""
+    return Response(
+        metrics.render(metrics.WEB_REGISTRY), media_type=metrics.CONTENT_TYPE
+    )
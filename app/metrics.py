@@ -0,0 +1,241 @@
+"""Prometheus metrics, served by the worker (app/worker.py) on its own port
+and by the web app at /metrics.
+
+Label children for every known label value are bound once, here or when a
+node is added to the pool, so the block and op paths only increment or
+observe an existing child. Queue sizes and head lag are gauges read through
+callbacks at scrape time, which costs nothing per block.
+
+The web app does no ingestion, so it renders WEB_REGISTRY instead: gauges
+read from the database at scrape time, including the worker's published
+status, which every uvicorn worker reports alike.
+"""
+
+import sqlite3
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from app import control
+from app.logging_utils import suppressed_count
+from app.rollups import REASON_KEYS
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RPC_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+BLOCKS_PROCESSED = Counter(
+    "paynsnap_blocks_processed_total", "Blocks processed and checkpointed"
+)
+OPS_SEEN = Counter("paynsnap_ops_seen_total", "Ops in processed blocks")
+OPS_RELEVANT = Counter(
+    "paynsnap_ops_relevant_total", "Ops passed to process_op after prefiltering"
+)
+BLOCK_SECONDS = Histogram(
+    "paynsnap_block_seconds",
+    "Time to process and checkpoint one block",
+    buckets=FAST_BUCKETS,
+)
+HEAD_BLOCK = Gauge("paynsnap_head_block", "Chain head block at the last poll")
+LAST_BLOCK = Gauge("paynsnap_last_block", "Last processed block")
+HEAD_LAG = Gauge(
+    "paynsnap_head_lag_blocks", "Blocks between chain head and the last processed block"
+)
+
+NODE_RPC_SECONDS = Histogram(
+    "paynsnap_node_rpc_seconds",
+    "Successful RPC call latency per node",
+    ["node"],
+    buckets=RPC_BUCKETS,
+)
+NODE_RPC_ERRORS = Counter(
+    "paynsnap_node_rpc_errors_total", "Failed RPC calls per node", ["node"]
+)
+NODE_BLOCKS = Counter(
+    "paynsnap_node_blocks_total", "Blocks fetched from each node", ["node"]
+)
+NODE_HANDSHAKES = Counter(
+    "paynsnap_node_handshakes_total",
+    "New HTTP connections opened to each node",
+    ["node"],
+)
+NODE_HTTP_REQUESTS = Counter(
+    "paynsnap_node_http_requests_total", "HTTP requests sent to each node", ["node"]
+)
+NODE_RPC_CALLS = Counter(
+    "paynsnap_node_rpc_calls_total",
+    "JSON-RPC calls sent to each node, batched or not",
+    ["node"],
+)
+
+SQLITE_SECONDS = Counter(
+    "paynsnap_sqlite_seconds_total", "Time spent executing SQLite statements"
+)
+SQLITE_STATEMENTS = Counter(
+    "paynsnap_sqlite_statements_total", "SQLite statements executed"
+)
+SQLITE_COMMIT_SECONDS = Histogram(
+    "paynsnap_sqlite_commit_seconds",
+    "Time to commit the block checkpoint transaction",
+    buckets=FAST_BUCKETS,
+)
+
+PENDING_PAYMENTS = Gauge("paynsnap_pending_payments", "Payments waiting for a snap")
+OUTBOX_DEPTH = Gauge("paynsnap_outbox_depth", "Outbox entries not yet broadcast")
+DISCORD_QUEUE = Gauge(
+    "paynsnap_discord_queue_depth", "Discord notifications waiting to be sent"
+)
+LOG_SUPPRESSED = Gauge(
+    "paynsnap_log_suppressed", "Log records dropped by per-call-site rate limits"
+)
+LOG_SUPPRESSED.set_function(suppressed_count)
+
+PAYMENT_OUTCOMES = Counter(
+    "paynsnap_payment_outcomes_total",
+    "Terminal payment outcomes by reason",
+    ["outcome"],
+)
+PAYOUTS = Counter(
+    "paynsnap_payouts_total", "Outbox broadcasts by kind and result", ["kind", "result"]
+)
+BROADCAST_SECONDS = Histogram(
+    "paynsnap_broadcast_seconds",
+    "Broadcast round-trip time",
+    ["kind"],
+    buckets=RPC_BUCKETS,
+)
+
+WEB_REGISTRY = CollectorRegistry()
+WEB_OUTBOX_DEPTH = Gauge(
+    "paynsnap_outbox_depth",
+    "Outbox entries not yet broadcast",
+    registry=WEB_REGISTRY,
+)
+WORKER_UP = Gauge(
+    "paynsnap_worker_up",
+    "1 while the worker's published status is fresh",
+    registry=WEB_REGISTRY,
+)
+WORKER_STATUS_AGE = Gauge(
+    "paynsnap_worker_status_age_seconds",
+    "Seconds since the worker last published status",
+    registry=WEB_REGISTRY,
+)
+WORKER_HEAD_LAG = Gauge(
+    "paynsnap_worker_head_lag_blocks",
+    "Head lag from the worker's published status",
+    registry=WEB_REGISTRY,
+)
+WORKER_PENDING_PAYMENTS = Gauge(
+    "paynsnap_worker_pending_payments",
+    "Pending payments from the worker's published status",
+    registry=WEB_REGISTRY,
+)
+
+OUTCOMES = {
+    key: PAYMENT_OUTCOMES.labels(key)
+    for key in ["paid", "other"] + list(REASON_KEYS.values())
+}
+PAYOUT_RESULTS = {
+    (kind, result): PAYOUTS.labels(kind, result)
+    for kind in ("transfer", "reply")
+    for result in ("sent", "retry", "failed")
+}
+BROADCAST_KINDS = {
+    kind: BROADCAST_SECONDS.labels(kind)
+    for kind in ("transfer", "transfer_batch", "reply")
+}
+
+
+class NodeMetrics:
+    """Label children for one node, bound when the node joins the pool"""
+
+    __slots__ = ("latency", "errors", "blocks", "handshakes", "requests", "calls")
+
+    def __init__(self, url: str):
+        self.latency = NODE_RPC_SECONDS.labels(url)
+        self.errors = NODE_RPC_ERRORS.labels(url)
+        self.blocks = NODE_BLOCKS.labels(url)
+        self.handshakes = NODE_HANDSHAKES.labels(url)
+        self.requests = NODE_HTTP_REQUESTS.labels(url)
+        self.calls = NODE_RPC_CALLS.labels(url)
+
+
+class MeteredConnection(sqlite3.Connection):
+    """sqlite3 connection that counts statements and the time spent in them"""
+
+    def execute(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            SQLITE_SECONDS.inc(time.perf_counter() - started)
+            SQLITE_STATEMENTS.inc()
+
+    def executemany(self, *args):
+        started = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            SQLITE_SECONDS.inc(time.perf_counter() - started)
+            SQLITE_STATEMENTS.inc()
+
+
+def track_bot(bot):
+    """Read queue sizes and lag from a running bot at scrape time"""
+    PENDING_PAYMENTS.set_function(lambda: len(bot.pending_payments))
+    HEAD_LAG.set_function(
+        lambda: max(0, (bot.head_block or 0) - bot.last_block) if bot.last_block else 0
+    )
+
+
+def _outbox_depth(database) -> int:
+    return database.conn.execute(
+        "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')"
+    ).fetchone()[0]
+
+
+def track_queues(database, discord):
+    OUTBOX_DEPTH.set_function(lambda: _outbox_depth(database))
+    DISCORD_QUEUE.set_function(lambda: discord.stats()["queue_depth"])
+
+
+def track_worker_status(database, max_age: float):
+    """Fill WEB_REGISTRY from the database; lag and pending payments are NaN
+    while the worker has no fresh status, so a dead worker never looks idle"""
+
+    def field(name):
+        status = control.read_status(database.conn, max_age=max_age)
+        if status is None or status["stale"] or status.get(name) is None:
+            return float("nan")
+        return status[name]
+
+    def age():
+        status = control.read_status(database.conn, max_age=max_age)
+        return float("nan") if status is None else status["age"]
+
+    def up():
+        status = control.read_status(database.conn, max_age=max_age)
+        return 0 if status is None or status["stale"] else 1
+
+    WEB_OUTBOX_DEPTH.set_function(lambda: _outbox_depth(database))
+    WORKER_UP.set_function(up)
+    WORKER_STATUS_AGE.set_function(age)
+    WORKER_HEAD_LAG.set_function(lambda: field("lag"))
+    WORKER_PENDING_PAYMENTS.set_function(lambda: field("pending_payments"))
+
+
+def render(registry=REGISTRY) -> bytes:
+    return generate_latest(registry)
+
+
+def serve(port: int):
+    """Serve /metrics from a background thread (used by the worker process)"""
+    start_http_server(port)
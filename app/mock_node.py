@@ -0,0 +1,397 @@
+"""Local Hive JSON-RPC node serving a recorded chain fixture.
+
+Answers the calls the bot makes (get_dynamic_global_properties,
+get_ops_in_block, get_content, get_account_history, broadcast_transaction*)
+for single and batch requests, in both condenser_api.<method> and
+call(api, method, params) form. The head block advances at block_interval
+seconds per block (0 serves the whole fixture at once). Latency, jitter and
+failures can be injected per request to exercise the node pool.
+
+Broadcasts are accepted without verifying signatures and kept in
+`broadcasts`; broadcast comments become visible through get_content.
+get_account_history serves each account's fixture ops up to the head block
+followed by its broadcasts, honouring start, limit and the operation filter
+bits the way hived does, so history sync can run against the mock.
+
+  python -m app.mock_node fixtures/sample --port 8091 --latency 0.05 --failure-rate 0.02
+then point `nodes:` in config.yaml at http://127.0.0.1:8091.
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.chain_fixture import ChainFixture
+
+FAILURE_MODES = ("http", "rpc", "empty")
+BLANK_CONTENT = {"author": "", "permlink": "", "body": "", "beneficiaries": []}
+# Operation ids behind the get_account_history filter bits (1 << id, ids of
+# 64 and up in the high word) for the op types fixtures hold
+OP_IDS = {
+    "vote": 0,
+    "comment": 1,
+    "transfer": 2,
+    "transfer_to_vesting": 3,
+    "custom_json": 18,
+    "comment_options": 19,
+    "claim_reward_balance": 39,
+    "author_reward": 51,
+    "curation_reward": 52,
+    "comment_reward": 53,
+    "fill_order": 57,
+    "comment_payout_update": 61,
+    "producer_reward": 64,
+    "effective_comment_vote": 72,
+}
+# Op fields naming the accounts whose history an op appears in
+ACCOUNT_FIELDS = (
+    "from",
+    "to",
+    "author",
+    "parent_author",
+    "account",
+    "voter",
+    "curator",
+    "producer",
+    "owner",
+    "current_owner",
+    "open_owner",
+)
+ACCOUNT_LIST_FIELDS = ("required_auths", "required_posting_auths")
+MAX_HISTORY_LIMIT = 1000
+
+
+def impacted_accounts(op_data: dict) -> set:
+    accounts = {op_data.get(field) for field in ACCOUNT_FIELDS}
+    for field in ACCOUNT_LIST_FIELDS:
+        accounts.update(op_data.get(field) or ())
+    accounts.discard(None)
+    accounts.discard("")
+    return accounts
+
+
+def matches_filter(op_type: str, low: int, high: int) -> bool:
+    if not low and not high:
+        return True
+    op_id = OP_IDS.get(op_type)
+    if op_id is None:
+        return False
+    return bool(low & (1 << op_id)) if op_id < 64 else bool(high & (1 << (op_id - 64)))
+
+
+class RPCError(Exception):
+    def __init__(self, message, code=-32000):
+        super().__init__(message)
+        self.code = code
+
+
+class MockHiveNode:
+    def __init__(
+        self,
+        fixture: ChainFixture,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        block_interval: float = 0.0,
+        head_block: int = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_mode: str = "http",
+        seed: int = None,
+    ):
+        if failure_mode not in FAILURE_MODES:
+            raise ValueError(f"failure_mode must be one of {FAILURE_MODES}")
+        self.fixture = fixture
+        self.host = host
+        self.port = port
+        self.block_interval = block_interval
+        if head_block is None:
+            head_block = fixture.first_block if block_interval else fixture.last_block
+        self.start_head = head_block
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.random = random.Random(seed)
+        self.broadcasts = []
+        self.requests = 0
+        self.failures = 0
+        self._posts = {}
+        self._history = None
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def head_block(self) -> int:
+        if not self.block_interval:
+            return self.start_head
+        advanced = int((time.time() - self._started) / self.block_interval)
+        return min(self.fixture.last_block, self.start_head + advanced)
+
+    def start(self) -> str:
+        """Serve on a background thread; returns the node URL"""
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, payload = node.handle_http(body)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._started = time.time()
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-hive-node", daemon=True
+        )
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def handle_http(self, body: bytes):
+        """Returns (status, response JSON) for one HTTP request body"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + (
+                self.random.uniform(0, self.jitter) if self.jitter else 0
+            )
+            fail = self.failure_rate and self.random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        if delay:
+            time.sleep(delay)
+        if fail and self.failure_mode == "http":
+            return 503, {"error": "injected failure"}
+        try:
+            request = json.loads(body)
+        except ValueError:
+            return 400, {
+                "jsonrpc": "2.0",
+                "id": None,
+                "error": {"code": -32700, "message": "Parse error"},
+            }
+        if isinstance(request, list):
+            return 200, [self.handle(r, fail) for r in request]
+        return 200, self.handle(request, fail)
+
+    def handle(self, request: dict, fail: bool = False) -> dict:
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        method, params = request.get("method", ""), request.get("params", [])
+        if method == "call":
+            method, params = f"{params[0]}.{params[1]}", (
+                params[2] if len(params) > 2 else []
+            )
+        name = method.split(".")[-1]
+        if fail and self.failure_mode == "rpc":
+            response["error"] = {"code": -32003, "message": "injected failure"}
+            return response
+        try:
+            if fail and self.failure_mode == "empty" and name == "get_ops_in_block":
+                response["result"] = []
+                return response
+            handler = getattr(self, f"rpc_{name}", None)
+            if handler is None:
+                raise RPCError(f"Could not find method {method}", code=-32601)
+            response["result"] = (
+                handler(*params) if isinstance(params, list) else handler(**params)
+            )
+        except RPCError as e:
+            response["error"] = {"code": e.code, "message": str(e)}
+        except (TypeError, KeyError, IndexError) as e:
+            response["error"] = {"code": -32602, "message": f"Invalid parameters: {e}"}
+        return response
+
+    def _block_time(self, block_num: int) -> str:
+        ops = self.fixture.ops(block_num)
+        if ops:
+            return ops[0]["timestamp"]
+        return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+    def rpc_get_dynamic_global_properties(self):
+        head = self.head_block()
+        return {
+            "head_block_number": head,
+            # ref_block_num/prefix for signing are read from this id
+            "head_block_id": f"{head:08x}"
+            + hashlib.sha1(str(head).encode()).hexdigest()[:32],
+            "time": self._block_time(head),
+            "last_irreversible_block_num": max(self.fixture.first_block, head - 20),
+        }
+
+    def rpc_get_ops_in_block(self, block_num, only_virtual=False):
+        if block_num > self.head_block():
+            return []
+        ops = self.fixture.ops(block_num) or []
+        if only_virtual:
+            ops = [op for op in ops if op.get("virtual_op")]
+        return ops
+
+    def rpc_get_content(self, author, permlink):
+        with self._lock:
+            post = self._posts.get(f"{author}/{permlink}")
+        return post or self.fixture.content(author, permlink) or dict(BLANK_CONTENT)
+
+    def _account_index(self) -> dict:
+        """Fixture ops per impacted account, in block order; built once"""
+        with self._lock:
+            if self._history is None:
+                history = {}
+                for _, ops in self.fixture.blocks():
+                    for entry in ops:
+                        for account in impacted_accounts(entry["op"][1]):
+                            history.setdefault(account, []).append(entry)
+                self._history = history
+            return self._history
+
+    def rpc_get_account_history(
+        self, account, start=-1, limit=100, filter_low=0, filter_high=0
+    ):
+        if not 0 < limit <= MAX_HISTORY_LIMIT:
+            raise RPCError(f"limit must be between 1 and {MAX_HISTORY_LIMIT}")
+        if start >= 0 and limit > start + 1:
+            raise RPCError("start must be >= limit - 1")
+        head = self.head_block()
+        history = [
+            entry
+            for entry in self._account_index().get(account, [])
+            if entry["block"] <= head
+        ]
+        with self._lock:
+            history += [
+                entry
+                for entry in self.broadcasts
+                if account in impacted_accounts(entry["op"][1])
+            ]
+        index = len(history) - 1 if start < 0 else min(start, len(history) - 1)
+        page = []
+        # Scan back from start, keeping up to limit ops that pass the filter
+        while index >= 0 and len(page) < limit:
+            entry = history[index]
+            if matches_filter(entry["op"][0], filter_low, filter_high):
+                page.append([index, entry])
+            index -= 1
+        page.reverse()
+        return page
+
+    def rpc_broadcast_transaction_synchronous(self, transaction):
+        head = self.head_block()
+        trx_id = hashlib.sha1(
+            json.dumps(transaction, sort_keys=True).encode()
+        ).hexdigest()
+        timestamp = (
+            datetime.strptime(self._block_time(head), "%Y-%m-%dT%H:%M:%S")
+            + timedelta(seconds=3)
+        ).strftime("%Y-%m-%dT%H:%M:%S")
+        with self._lock:
+            for op in transaction.get("operations", []):
+                if isinstance(op, dict):
+                    # appbase form: {"type": "comment_operation", "value": {...}}
+                    op = [op["type"].replace("_operation", ""), op["value"]]
+                op_type, op_data = op
+                self.broadcasts.append(
+                    {
+                        "trx_id": trx_id,
+                        "block": head + 1,
+                        "timestamp": timestamp,
+                        "op": [op_type, op_data],
+                    }
+                )
+                if op_type == "comment":
+                    self._posts[f"{op_data['author']}/{op_data['permlink']}"] = dict(
+                        op_data, beneficiaries=[]
+                    )
+        return {"id": trx_id, "block_num": head + 1, "trx_num": 0, "expired": False}
+
+    rpc_broadcast_transaction = rpc_broadcast_transaction_synchronous
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "broadcasts": len(self.broadcasts),
+            "head_block": self.head_block(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a chain fixture as a Hive JSON-RPC node"
+    )
+    parser.add_argument("fixture")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument(
+        "--block-interval",
+        type=float,
+        default=3.0,
+        help="Seconds per block as the head advances (0 serves every block at once)",
+    )
+    parser.add_argument("--head-block", type=int, help="Starting head block")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to each request"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Extra random latency, up to this many seconds",
+    )
+    parser.add_argument(
+        "--failure-rate", type=float, default=0.0, help="Fraction of requests that fail"
+    )
+    parser.add_argument("--failure-mode", choices=FAILURE_MODES, default="http")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    fixture = ChainFixture(args.fixture)
+    node = MockHiveNode(
+        fixture,
+        host=args.host,
+        port=args.port,
+        block_interval=args.block_interval,
+        head_block=args.head_block,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode,
+        seed=args.seed,
+    )
+    print(
+        f"Serving blocks {fixture.first_block}-{fixture.last_block} at {node.start()}"
+    )
+    try:
+        while True:
+            time.sleep(60)
+            print(node.stats())
+    except KeyboardInterrupt:
+        node.stop()
+        fixture.close()
+
+
+if __name__ == "__main__":
+    main()
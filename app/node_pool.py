@@ -0,0 +1,238 @@
+import threading
+import time
+from app.config import config
+from app.metrics import NodeMetrics
+from app.rpc import Transport
+from app.logging_utils import setup_logger
+
+logger = setup_logger("paynsnapbot")
+
+DEFAULT_NODES = [
+    "https://api.hive.blog",  # @blocktrades
+    "https://api.openhive.network",  # @gtg
+    "https://anyx.io",  # @anyx
+    "https://rpc.ausbit.dev",  # @ausbitbank
+    "https://rpc.mahdiyari.info",  # @mahdiyari
+    "https://api.hive.blue",  # @guiltyparties
+    "https://techcoderx.com",  # @techcoderx
+    "https://hive.roelandp.nl",  # @roelandp
+    "https://hived.emre.sh",  # @emrebeyler
+    "https://api.deathwing.me",  # @deathwing
+    "https://api.c0ff33a.uk",  # @c0ff33a
+    "https://hive-api.arcange.eu",  # @arcange
+    "https://hive-api.3speak.tv",  # @threespeak
+    "https://hiveapi.actifit.io",  # @actifit
+]
+
+# Weight of the newest sample in the latency / error-rate moving averages
+EWMA_ALPHA = 0.3
+# Assumed latency for nodes that have not answered yet, so they get tried
+UNKNOWN_LATENCY = 0.5
+# Score penalty (in seconds) per block a node is behind the freshest node
+STALE_BLOCK_PENALTY = 0.5
+# Hive block interval; head observations are projected forward at this rate
+BLOCK_INTERVAL = 3
+
+
+class NodeStats:
+    def __init__(self, url: str):
+        self.url = url
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.head_block = 0
+        self.head_seen_at = 0.0
+        self.sidelined_until = 0.0
+        self.metrics = NodeMetrics(url)
+
+    def as_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "latency": self.latency,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "errors": self.errors,
+            "head_block": self.head_block,
+            "sidelined_until": self.sidelined_until,
+        }
+
+
+class NodePool:
+    """Shared set of Hive API nodes ranked by latency, errors and freshness.
+
+    Calls go to the best-scoring node first and fall back down the ranking.
+    A node that fails is sidelined with exponential backoff. The pool can be
+    used in place of a lighthive Client for read calls (pool.get_content(...)).
+    Plain reads go through one shared keep-alive transport (app/rpc.py);
+    broadcasts and keyword-argument calls use a cached lighthive Client.
+    """
+
+    def __init__(
+        self, nodes=None, base_backoff: float = None, max_backoff: float = None
+    ):
+        pool_config = config.get("node_pool", {})
+        urls = nodes or config.get("nodes") or DEFAULT_NODES
+        self.nodes = [NodeStats(url) for url in urls]
+        self.base_backoff = base_backoff or pool_config.get("base_backoff", 5)
+        self.max_backoff = max_backoff or pool_config.get("max_backoff", 300)
+        self.transport = Transport(
+            timeout=pool_config.get("timeout", 30),
+            pool_maxsize=pool_config.get("connections_per_node", 4),
+        )
+        for node in self.nodes:
+            self.transport.node(node.url, node.metrics)
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def urls(self):
+        return [node.url for node in self.nodes]
+
+    @staticmethod
+    def _projected_head(node: NodeStats, now: float) -> int:
+        """The node's head as of now, assuming it kept up since it last
+        answered. Idle nodes are only called stale once they report a head
+        behind what the others reported at about the same time."""
+        if not node.head_block:
+            return 0
+        return node.head_block + int((now - node.head_seen_at) // BLOCK_INTERVAL)
+
+    def _score(self, node: NodeStats, best_head: int, now: float) -> float:
+        latency = node.latency if node.latency is not None else UNKNOWN_LATENCY
+        head = self._projected_head(node, now)
+        behind = max(0, best_head - head) if head else 0
+        return latency * (1 + 4 * node.error_rate) + behind * STALE_BLOCK_PENALTY
+
+    def ranked(self):
+        """Return nodes best-first, skipping sidelined ones while any are available"""
+        now = time.time()
+        with self._lock:
+            best_head = max(self._projected_head(node, now) for node in self.nodes)
+            available = [n for n in self.nodes if n.sidelined_until <= now]
+            if not available:
+                # Everything is sidelined: try the ones whose backoff ends first
+                return sorted(self.nodes, key=lambda n: n.sidelined_until)
+            return sorted(available, key=lambda n: self._score(n, best_head, now))
+
+    def record_success(self, node: NodeStats, elapsed: float, head_block: int = None):
+        with self._lock:
+            node.calls += 1
+            node.consecutive_failures = 0
+            node.sidelined_until = 0.0
+            node.latency = (
+                elapsed
+                if node.latency is None
+                else EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * node.latency
+            )
+            node.error_rate = (1 - EWMA_ALPHA) * node.error_rate
+            if head_block and head_block >= node.head_block:
+                node.head_block = head_block
+                node.head_seen_at = time.time()
+        node.metrics.latency.observe(elapsed)
+
+    def record_failure(self, node: NodeStats, error):
+        with self._lock:
+            node.calls += 1
+            node.errors += 1
+            node.consecutive_failures += 1
+            node.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * node.error_rate
+            backoff = min(
+                self.max_backoff,
+                self.base_backoff * 2 ** (node.consecutive_failures - 1),
+            )
+            node.sidelined_until = time.time() + backoff
+        node.metrics.errors.inc()
+        logger.warning(f"Node {node.url} failed ({error}), sidelined for {backoff}s")
+
+    def client(self, url: str, keys=None):
+        """Return a cached single-node lighthive Client"""
+        from lighthive.client import Client
+
+        cache_key = (url, tuple(keys or ()))
+        with self._lock:
+            client = self._clients.get(cache_key)
+            if client is None:
+                client = Client(nodes=[url], keys=keys)
+                self._clients[cache_key] = client
+            return client
+
+    def call(self, method: str, *args, keys=None, **kwargs):
+        """Call a condenser_api method on the best node, falling back in rank order.
+
+        Broadcasts go to the best node only and re-raise its error: one that
+        raised may still have been accepted, and lighthive signs a new
+        transaction per call, so a fallback could pay twice. The broadcaster
+        checks the chain before retrying instead.
+        """
+        nodes = self.ranked()
+        if method == "broadcast":
+            nodes = nodes[:1]
+        last_error = None
+        for node in nodes:
+            started = time.time()
+            try:
+                if keys is None and not kwargs:
+                    result = self.transport.call(
+                        node.url, f"condenser_api.{method}", args
+                    )
+                else:
+                    result = getattr(self.client(node.url, keys), method)(
+                        *args, **kwargs
+                    )
+            except Exception as e:
+                self.record_failure(node, e)
+                last_error = e
+                continue
+            head_block = None
+            if method == "get_dynamic_global_properties" and isinstance(result, dict):
+                head_block = result.get("head_block_number")
+            self.record_success(node, time.time() - started, head_block)
+            return result
+        if method == "broadcast":
+            raise last_error
+        raise Exception(f"{method} failed on all nodes: {last_error}")
+
+    def batch(self, method: str, params_list):
+        """Call one condenser_api method for each params list in a single
+        JSON-RPC batch request, falling back in rank order.
+
+        Returns results in order; items the node could not answer are
+        app.rpc.RPCError instances.
+        """
+        calls = [(f"condenser_api.{method}", params) for params in params_list]
+        last_error = None
+        for node in self.ranked():
+            started = time.time()
+            try:
+                results = self.transport.batch(node.url, calls)
+            except Exception as e:
+                self.record_failure(node, e)
+                last_error = e
+                continue
+            self.record_success(node, time.time() - started)
+            return results
+        raise Exception(f"{method} batch failed on all nodes: {last_error}")
+
+    def broadcast(self, operations, keys):
+        return self.call("broadcast", operations, keys=keys)
+
+    def status(self):
+        status = []
+        for node in self.nodes:
+            session = self.transport.node(node.url)
+            status.append(
+                dict(
+                    node.as_dict(),
+                    handshakes=session.handshakes,
+                    http_requests=session.requests,
+                    rpc_calls=session.calls,
+                )
+            )
+        return status
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from app.config import config
+from app.logging_utils import setup_logger
+
+logger = setup_logger("paynsnapbot")
+
+
+class DiscordDispatcher:
+    """Send Discord webhook embeds from a background thread.
+
+    notify() only appends to a bounded queue, so callers never wait on
+    Discord. The worker posts up to MAX_EMBEDS embeds per webhook message
+    over a pooled session and honours 429 retry_after. When the queue is
+    full the oldest embeds are dropped and summarised in the next message.
+    """
+
+    MAX_EMBEDS = 10  # Discord's limit per webhook message
+
+    def __init__(self, webhook_url: str = None, max_queue: int = 500):
+        self.webhook_url = webhook_url
+        self.max_queue = max_queue
+        self._session = None
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._sending = False
+        self._unreported_drops = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.last_latency = None
+        self.avg_latency = None
+
+    @property
+    def session(self):
+        # Created on first send, so importing the app does not load requests
+        if self._session is None:
+            import requests
+
+            self._session = requests.Session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    def notify(self, title, description, color=0x00FF00, fields=None):
+        if not self.webhook_url:
+            logger.debug("Discord webhook URL not configured, skipping notification")
+            return
+        embed = {
+            "title": title,
+            "description": description,
+            "color": color,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()),
+        }
+        if fields:
+            embed["fields"] = fields
+        with self._cond:
+            self._queue.append(embed)
+            while len(self._queue) > self.max_queue:
+                self._queue.popleft()
+                self.dropped += 1
+                self._unreported_drops += 1
+            self._ensure_worker()
+            self._cond.notify()
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="discord-dispatcher", daemon=True
+            )
+            self._thread.start()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            batch = []
+            if self._unreported_drops:
+                batch.append(
+                    {
+                        "title": "⚠️ Notifications dropped",
+                        "description": f"{self._unreported_drops} notifications were dropped because the queue was full",
+                        "color": 0xFFAA00,
+                    }
+                )
+                self._unreported_drops = 0
+            while self._queue and len(batch) < self.MAX_EMBEDS:
+                batch.append(self._queue.popleft())
+            self._sending = True
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._send(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error(f"Error sending Discord notification: {e}")
+            with self._cond:
+                self._sending = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 10) -> bool:
+        """Wait for queued notifications to be sent; for short-lived scripts"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._queue or self._sending:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _send(self, embeds):
+        payload = json.dumps({"username": "PaySnap Bot", "embeds": embeds})
+        while True:
+            started = time.time()
+            response = self.session.post(
+                self.webhook_url,
+                data=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=10,
+            )
+            self._record_latency(time.time() - started)
+            if response.status_code == 429:
+                self.rate_limited += 1
+                try:
+                    retry_after = float(response.json().get("retry_after", 1))
+                except Exception:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                logger.warning(f"Discord rate limited, retrying in {retry_after}s")
+                time.sleep(retry_after)
+                continue
+            if response.status_code in (200, 204):
+                self.sent += len(embeds)
+                logger.info(
+                    f"Discord notification sent successfully ({len(embeds)} embeds)"
+                )
+            else:
+                self.failed += len(embeds)
+                logger.error(
+                    f"Failed to send Discord notification: {response.status_code} - {response.text}"
+                )
+            # Wait out the bucket instead of hitting a 429 on the next send
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                time.sleep(float(response.headers.get("X-RateLimit-Reset-After", 1)))
+            return
+
+    def _record_latency(self, elapsed):
+        self.last_latency = elapsed
+        self.avg_latency = (
+            elapsed
+            if self.avg_latency is None
+            else 0.2 * elapsed + 0.8 * self.avg_latency
+        )
+
+    def stats(self):
+        return {
+            "queue_depth": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "last_send_latency": self.last_latency,
+            "avg_send_latency": self.avg_latency,
+        }
+
+
+discord = DiscordDispatcher(
+    os.getenv("DISCORD_WEBHOOK_URL"),
+    max_queue=config.get("discord", {}).get("max_queue", 500),
+)
@@ -0,0 +1,115 @@
+import heapq
+import itertools
+
+
+class PendingPayment:
+    """A qualifying transfer waiting for its snap"""
+
+    __slots__ = (
+        "sender",
+        "to",
+        "amount",
+        "memo",
+        "block_num",
+        "op_id",
+        "timestamp",
+        "deadline",
+        "snap_author",
+        "snap_permlink",
+        "seq",
+        "active",
+    )
+
+    def __init__(
+        self,
+        sender,
+        to,
+        amount,
+        memo,
+        block_num,
+        op_id,
+        timestamp,
+        deadline,
+        snap_author=None,
+        snap_permlink=None,
+    ):
+        self.sender = sender
+        self.to = to
+        self.amount = amount
+        self.memo = memo
+        self.block_num = block_num
+        self.op_id = op_id
+        self.timestamp = timestamp
+        self.deadline = deadline
+        self.snap_author = snap_author
+        self.snap_permlink = snap_permlink
+        self.seq = None
+        self.active = True
+
+
+class PendingPayments:
+    """Pending payments indexed by sender, with a min-heap of snap deadlines.
+
+    A payment only needs evaluating when it is new, when its snap arrives or
+    when its deadline passes, so due() returns just those instead of the
+    whole queue.
+    """
+
+    def __init__(self):
+        self.by_sender = {}
+        self._deadlines = []  # (deadline, seq, payment)
+        self._due = {}  # seq -> payment
+        self._seq = itertools.count()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for payments in list(self.by_sender.values()):
+            yield from payments
+
+    def has_sender(self, sender: str) -> bool:
+        return sender in self.by_sender
+
+    def add(self, payment: PendingPayment):
+        payment.seq = next(self._seq)
+        payment.active = True
+        self.by_sender.setdefault(payment.sender, []).append(payment)
+        heapq.heappush(self._deadlines, (payment.deadline, payment.seq, payment))
+        self._due[payment.seq] = payment
+        self._count += 1
+
+    def attach_snap(self, author: str, permlink: str):
+        """Attach a snap to every payment from author still waiting for one"""
+        matched = []
+        for payment in self.by_sender.get(author, ()):
+            if payment.snap_author is None:
+                payment.snap_author = author
+                payment.snap_permlink = permlink
+                self._due[payment.seq] = payment
+                matched.append(payment)
+        return matched
+
+    def due(self, now: float):
+        """Return payments that are new, have a snap attached, or have expired"""
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, seq, payment = heapq.heappop(self._deadlines)
+            if payment.active:
+                self._due[seq] = payment
+        if not self._due:
+            return []
+        due = sorted(self._due.values(), key=lambda p: p.seq)
+        self._due.clear()
+        return due
+
+    def remove(self, payment: PendingPayment):
+        if not payment.active:
+            return
+        payment.active = False
+        payments = self.by_sender.get(payment.sender, [])
+        payments.remove(payment)
+        if not payments:
+            del self.by_sender[payment.sender]
+        self._due.pop(payment.seq, None)
+        self._count -= 1
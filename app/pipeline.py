@@ -0,0 +1,60 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BlockPipeline:
+    """Prefetch upcoming block ranges concurrently and return them in block order.
+
+    At most `window` fetches are in flight at once, each covering `batch_size`
+    consecutive blocks, so memory is bounded by window * batch_size blocks.
+    The in-flight deque doubles as the reorder buffer: results are only handed
+    out from its head, however the fetches complete.
+    """
+
+    def __init__(self, fetch_range, window: int = 4):
+        self.fetch_range = fetch_range
+        self.window = max(1, window)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.window, thread_name_prefix="block-fetch"
+        )
+        self.inflight = deque()  # (start_block, count, future), in block order
+
+    def __len__(self):
+        return len(self.inflight)
+
+    def fill(self, next_block: int, head_block: int, batch_size: int = 1):
+        """Keep the window full with fetches for next_block..head_block"""
+        if self.inflight and self.inflight[0][0] != next_block:
+            self.reset()
+        if self.inflight:
+            last_start, last_count, _ = self.inflight[-1]
+            start = last_start + last_count
+        else:
+            start = next_block
+        while len(self.inflight) < self.window and start <= head_block:
+            count = min(batch_size, head_block - start + 1)
+            future = self.executor.submit(self.fetch_range, start, count)
+            self.inflight.append((start, count, future))
+            start += count
+
+    def take(self):
+        """Wait for the oldest fetch and return (start_block, list of op lists)"""
+        start, count, future = self.inflight.popleft()
+        try:
+            blocks = future.result()
+        except Exception:
+            self.reset()
+            raise
+        if len(blocks) < count:
+            # Short read: later fetches no longer line up with the next block
+            self.reset()
+        return start, blocks
+
+    def reset(self):
+        for _, _, future in self.inflight:
+            future.cancel()
+        self.inflight.clear()
+
+    def shutdown(self):
+        self.reset()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,62 @@
+import json
+
+JSON_METADATA = {"app": "paynsnapbot", "format": "markdown"}
+
+
+def comment_operations(
+    author,
+    permlink,
+    parent_author,
+    parent_permlink,
+    body,
+    title="",
+    beneficiaries=None,
+    json_metadata=None,
+):
+    """Build the comment op, plus comment_options when beneficiaries are given.
+
+    Broadcasting a comment with an existing permlink edits it, so callers can
+    retry with the same permlink without creating duplicates.
+    """
+    from lighthive.datastructures import Operation
+
+    operations = [
+        Operation(
+            "comment",
+            {
+                "parent_author": parent_author,
+                "parent_permlink": parent_permlink,
+                "author": author,
+                "permlink": permlink,
+                "title": title,
+                "body": body,
+                "json_metadata": json.dumps(json_metadata or JSON_METADATA),
+            },
+        )
+    ]
+    if beneficiaries:
+        operations.append(
+            Operation(
+                "comment_options",
+                {
+                    "author": author,
+                    "permlink": permlink,
+                    "max_accepted_payout": "1000000.000 HBD",
+                    "percent_hbd": 10000,
+                    "allow_votes": True,
+                    "allow_curation_rewards": True,
+                    "extensions": [
+                        [
+                            0,
+                            {
+                                # Hive requires beneficiaries sorted by account
+                                "beneficiaries": sorted(
+                                    beneficiaries, key=lambda b: b["account"]
+                                )
+                            },
+                        ]
+                    ],
+                },
+            )
+        )
+    return operations
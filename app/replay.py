@@ -0,0 +1,261 @@
+"""Replay recorded blocks through HiveBot offline and report throughput.
+
+Blocks from a chain fixture (app/chain_fixture.py) go through the same
+process_block / complete_block path as live polling, against a scratch
+database. Time comes from the blocks, so snap timeouts and daily limits
+play out exactly as they did on chain. Nothing is broadcast: payouts stay
+queued in the scratch outbox and Discord is disabled. Snap lookups are
+answered from the fixture.
+
+  python -m app.replay fixtures/sample
+  python -m app.replay fixtures/sample --start 90000100 --end 90000600 --json
+
+Use CONFIG_PATH to try a different store list or rates against the same
+history.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+STAGES = ("block", "op", "pending_check", "snap_lookup", "commit")
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection that accumulates time spent in SQLite"""
+
+    elapsed = 0.0
+    statements = 0
+
+    def _timed(self, call, *args):
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            TimedConnection.elapsed += time.perf_counter() - started
+            TimedConnection.statements += 1
+
+    def execute(self, *args):
+        return self._timed(super().execute, *args)
+
+    def executemany(self, *args):
+        return self._timed(super().executemany, *args)
+
+    def commit(self):
+        return self._timed(super().commit)
+
+
+class ReplayPool:
+    """Stands in for NodePool: reads come from the fixture, broadcasts are counted"""
+
+    def __init__(self, fixture):
+        from app.mock_node import MockHiveNode
+
+        self.node = MockHiveNode(fixture)
+        self.broadcasts = 0
+
+    def broadcast(self, operations, keys=None):
+        self.broadcasts += len(operations)
+        return {"id": "replay", "block_num": self.node.head_block()}
+
+    def batch(self, method, params_list):
+        call = getattr(self, method)
+        return [call(*params) for params in params_list]
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return getattr(self.node, f"rpc_{method}")
+
+
+def _timed(samples, func):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    return wrapper
+
+
+def percentiles(samples) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.50), 3),
+        "p90_ms": round(pick(0.90), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def offline_environment(prefix: str, path: str = None):
+    """Set up an offline command's process; returns (db path, scratch dir).
+
+    Call it before anything imports app.db, which reads DB_PATH at import,
+    so the live database is never opened. Without a path the database is a
+    fresh file in the scratch directory; call scratch.cleanup() when done.
+    Per-op INFO records would drown the report, so the bot's logger is set
+    to WARNING. setup_logger only sets the level on first use, so it sticks.
+    """
+    import logging
+    from app.logging_utils import setup_logger
+
+    scratch = tempfile.TemporaryDirectory(prefix=prefix)
+    path = path or os.path.join(scratch.name, "scratch.db")
+    os.environ["DB_PATH"] = path
+    setup_logger().setLevel(logging.WARNING)
+    return path, scratch
+
+
+def offline_bot(pool, start_block: int):
+    """A HiveBot on the current database that resumes after start_block - 1,
+    uses pool for every node call, keeps Discord silent and follows block time"""
+    from app.bot import HiveBot
+    from app.db import db
+    from app.notifier import discord
+
+    discord.webhook_url = None
+    db.set_checkpoint(start_block - 1)
+    db.conn.commit()
+
+    class OfflineBot(HiveBot):
+        # Never pick up (and rename) a live checkpoint file
+        LAST_BLOCK_FILE = os.path.join(
+            os.path.dirname(db.path) or ".", "replay_last_block.txt"
+        )
+
+    bot = OfflineBot()
+    bot.pool = pool
+    bot.user_state.clock = lambda: datetime.fromtimestamp(
+        bot.block_time or time.time(), timezone.utc
+    )
+    return bot
+
+
+def replay(fixture, start: int = None, end: int = None) -> dict:
+    """Run blocks start..end through a HiveBot on the current database.
+
+    The caller points app.db.db at a scratch file first (see main()).
+    """
+    from app.db import db
+
+    start = start if start is not None else fixture.first_block
+    end = end if end is not None else fixture.last_block
+    bot = offline_bot(ReplayPool(fixture), start)
+    samples = {stage: [] for stage in STAGES}
+    bot.pool.get_content = _timed(samples["snap_lookup"], bot.pool.get_content)
+    bot.process_op = _timed(samples["op"], bot.process_op)
+    bot.check_pending_payments = _timed(
+        samples["pending_check"], bot.check_pending_payments
+    )
+    process_block = _timed(samples["block"], bot.process_block)
+    write_last_block = _timed(samples["commit"], bot.write_last_block)
+    bot.write_last_block = write_last_block
+
+    db_elapsed, db_statements = TimedConnection.elapsed, TimedConnection.statements
+    blocks = ops = pending_peak = 0
+    started = time.perf_counter()
+    for block_num, block_ops in fixture.blocks(start, end):
+        process_block(block_num, block_ops)
+        bot.complete_block(block_num)
+        blocks += 1
+        ops += len(block_ops)
+        pending_peak = max(pending_peak, len(bot.pending_payments))
+    bot.commit_blocks()
+    elapsed = time.perf_counter() - started
+
+    outcomes = {
+        reason: count
+        for reason, count in db.conn.execute(
+            "SELECT reason, COUNT(*) FROM payment_events GROUP BY reason ORDER BY reason"
+        )
+    }
+    queued = dict(
+        db.conn.execute("SELECT kind, COUNT(*) FROM outbox GROUP BY kind").fetchall()
+    )
+    return {
+        "blocks": blocks,
+        "first_block": start,
+        "last_block": bot.last_block,
+        "ops": ops,
+        "seconds": round(elapsed, 3),
+        "blocks_per_sec": round(blocks / elapsed, 1) if elapsed else None,
+        "ops_per_sec": round(ops / elapsed, 1) if elapsed else None,
+        "pending_peak": pending_peak,
+        "pending_remaining": len(bot.pending_payments),
+        "db_seconds": round(TimedConnection.elapsed - db_elapsed, 3),
+        "db_statements": TimedConnection.statements - db_statements,
+        "payment_events": outcomes,
+        "outbox": queued,
+        "stages": {stage: percentiles(values) for stage, values in samples.items()},
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Replayed blocks {report['first_block']}-{report['last_block']}: "
+        f"{report['blocks']} blocks, {report['ops']} ops in {report['seconds']}s",
+        f"  {report['blocks_per_sec']} blocks/sec, {report['ops_per_sec']} ops/sec",
+        f"  SQLite: {report['db_seconds']}s over {report['db_statements']} statements",
+        f"  Pending payments: peak {report['pending_peak']}, {report['pending_remaining']} left at end",
+        f"  Outbox: {report['outbox'] or 'empty'}",
+        "  Outcomes:",
+    ]
+    lines += [
+        f"    {count:6d}  {reason}"
+        for reason, count in report["payment_events"].items()
+    ]
+    lines.append("  Stage latency (ms):      count      p50      p90      p99      max")
+    for stage, stats in report["stages"].items():
+        if stats["count"]:
+            lines.append(
+                f"    {stage:<20}{stats['count']:>9}{stats['p50_ms']:>9}{stats['p90_ms']:>9}"
+                f"{stats['p99_ms']:>9}{stats['max_ms']:>9}"
+            )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a chain fixture through the bot offline"
+    )
+    parser.add_argument("fixture")
+    parser.add_argument(
+        "--start", type=int, help="First block (default: start of fixture)"
+    )
+    parser.add_argument("--end", type=int, help="Last block (default: end of fixture)")
+    parser.add_argument(
+        "--db", help="Scratch database path (default: a temporary file)"
+    )
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.db and os.path.exists(args.db):
+        parser.error(f"{args.db} already exists; replays need a fresh database")
+    path, scratch = offline_environment("paynsnap-replay-", args.db)
+
+    from app.chain_fixture import ChainFixture
+    from app.db import db
+
+    db.connection_factory = TimedConnection
+    db.reopen(path)
+    with ChainFixture(args.fixture) as fixture:
+        report = replay(fixture, args.start, args.end)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    scratch.cleanup()
+
+
+if __name__ == "__main__":
+    main()
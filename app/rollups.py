@@ -0,0 +1,189 @@
+"""Daily per-store rollups of payment_events for the admin dashboard.
+
+Rows are keyed by (UTC day, store) and updated in the same transaction as
+each payment_events insert, so analytics never scan the event history.
+Run `python -m app.rollups backfill` once to build them from existing rows.
+"""
+
+import argparse
+import re
+
+REASON_KEYS = {
+    "User exceeded daily limit": "daily_limit",
+    "Snap detected, wrong beneficiaries": "invalid_snap",
+    "Payment timed out waiting for snap": "timeout",
+    "No snap detected": "no_snap",
+}
+# Written per block while a payment waited, by versions before the outbox
+NON_TERMINAL_REASON = "No snap detected"
+_PAID_REASON = re.compile(r"paid ([0-9.]+) HBD")
+
+ROLLUP_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS daily_store_stats (
+        day TEXT,
+        store TEXT,
+        events INTEGER DEFAULT 0,
+        paid INTEGER DEFAULT 0,
+        payments_total REAL DEFAULT 0,
+        cashback_total REAL DEFAULT 0,
+        unique_users INTEGER DEFAULT 0,
+        PRIMARY KEY (day, store)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_store_reasons (
+        day TEXT,
+        store TEXT,
+        reason TEXT,
+        count INTEGER DEFAULT 0,
+        PRIMARY KEY (day, store, reason)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_store_users (
+        day TEXT,
+        store TEXT,
+        username TEXT,
+        PRIMARY KEY (day, store, username)
+    )
+    """,
+]
+
+
+def reason_key(paid, reason) -> str:
+    if paid:
+        return "paid"
+    return REASON_KEYS.get(reason, "other")
+
+
+def event_cashback(cashback, paid, reason) -> float:
+    """Cashback for a row, recovered from the reason on rows that predate the column"""
+    if cashback is None and paid and reason:
+        match = _PAID_REASON.search(reason)
+        return float(match.group(1)) if match else 0
+    return cashback or 0
+
+
+def apply_event(conn, day, store, username, amount, cashback, paid, reason):
+    """Fold one payment_events row into the rollups. Does not commit."""
+    store = store or "unknown"
+    new_user = conn.execute(
+        "INSERT OR IGNORE INTO daily_store_users (day, store, username) VALUES (?, ?, ?)",
+        (day, store, username),
+    ).rowcount
+    conn.execute(
+        """
+        INSERT INTO daily_store_stats (day, store, events, paid, payments_total, cashback_total, unique_users)
+        VALUES (?, ?, 1, ?, ?, ?, ?)
+        ON CONFLICT (day, store) DO UPDATE SET
+            events = events + 1,
+            paid = paid + excluded.paid,
+            payments_total = payments_total + excluded.payments_total,
+            cashback_total = cashback_total + excluded.cashback_total,
+            unique_users = unique_users + excluded.unique_users
+        """,
+        (
+            day,
+            store,
+            1 if paid else 0,
+            amount or 0,
+            (cashback or 0) if paid else 0,
+            new_user,
+        ),
+    )
+    conn.execute(
+        """
+        INSERT INTO daily_store_reasons (day, store, reason, count) VALUES (?, ?, ?, 1)
+        ON CONFLICT (day, store, reason) DO UPDATE SET count = count + 1
+        """,
+        (day, store, reason_key(paid, reason)),
+    )
+
+
+def backfill(conn) -> int:
+    """Rebuild all rollups from payment_events; returns the number of events folded in.
+
+    Older versions wrote a "No snap detected" row for every pending payment
+    on every block, so only the last row per payment is folded in, and only
+    if it is a terminal outcome.
+    """
+    conn.execute("DELETE FROM daily_store_stats")
+    conn.execute("DELETE FROM daily_store_reasons")
+    conn.execute("DELETE FROM daily_store_users")
+    cursor = conn.execute(
+        """
+        SELECT date(timestamp), store, username, amount, cashback, paid, reason
+        FROM payment_events
+        WHERE id IN (SELECT MAX(id) FROM payment_events GROUP BY block_num, op_id)
+          AND reason IS NOT ?
+        ORDER BY id
+        """,
+        (NON_TERMINAL_REASON,),
+    )
+    count = 0
+    for day, store, username, amount, cashback, paid, reason in cursor.fetchall():
+        cashback = event_cashback(cashback, paid, reason)
+        apply_event(conn, day, store, username, amount, cashback, paid, reason)
+        count += 1
+    conn.commit()
+    return count
+
+
+def daily_stats(conn, start=None, end=None, store=None):
+    query = "SELECT day, store, events, paid, payments_total, cashback_total, unique_users FROM daily_store_stats WHERE 1=1"
+    params = []
+    if start:
+        query += " AND day >= ?"
+        params.append(start)
+    if end:
+        query += " AND day <= ?"
+        params.append(end)
+    if store:
+        query += " AND store = ?"
+        params.append(store)
+    query += " ORDER BY day DESC, store"
+    columns = [
+        "day",
+        "store",
+        "events",
+        "paid",
+        "payments_total",
+        "cashback_total",
+        "unique_users",
+    ]
+    return [dict(zip(columns, row)) for row in conn.execute(query, params)]
+
+
+def reason_stats(conn, start=None, end=None, store=None):
+    query = "SELECT store, reason, SUM(count) FROM daily_store_reasons WHERE 1=1"
+    params = []
+    if start:
+        query += " AND day >= ?"
+        params.append(start)
+    if end:
+        query += " AND day <= ?"
+        params.append(end)
+    if store:
+        query += " AND store = ?"
+        params.append(store)
+    query += " GROUP BY store, reason ORDER BY store, reason"
+    return [
+        {"store": row[0], "reason": row[1], "count": row[2]}
+        for row in conn.execute(query, params)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain payment_events rollups")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+    from app.db import db
+
+    if args.command == "backfill":
+        count = backfill(db.conn)
+        print(f"Rebuilt rollups from {count} payment events")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Long-lived JSON-RPC transport shared by every node call.
+
+Each node gets one requests.Session with keep-alive connections, so
+repeated calls reuse a TCP/TLS connection instead of opening a new one.
+batch() sends several independent calls in one JSON-RPC batch request.
+New connections (handshakes), HTTP requests and JSON-RPC calls are counted
+per node; calls per request is the batching win and handshakes per request
+the keep-alive win.
+"""
+
+import json
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class RPCError(Exception):
+    def __init__(self, error):
+        if isinstance(error, dict):
+            self.code = error.get("code")
+            message = error.get("message", str(error))
+        else:
+            self.code = None
+            message = str(error)
+        super().__init__(message)
+
+
+def _counting_pool(pool_class, on_connect):
+    class CountingPool(pool_class):
+        def _new_conn(self):
+            on_connect()
+            return super()._new_conn()
+
+    return CountingPool
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that reports every new connection it opens"""
+
+    def __init__(self, on_connect, **kwargs):
+        self.on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.on_connect),
+            "https": _counting_pool(HTTPSConnectionPool, self.on_connect),
+        }
+
+
+class NodeSession:
+    __slots__ = ("url", "session", "handshakes", "requests", "calls", "metrics")
+
+    def __init__(self, url: str, pool_maxsize: int, metrics=None):
+        self.url = url
+        self.handshakes = 0
+        self.requests = 0
+        self.calls = 0
+        self.metrics = metrics
+        self.session = requests.Session()
+        self.session.headers["Content-Type"] = "application/json"
+        adapter = CountingAdapter(
+            self._connected, pool_connections=1, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _connected(self):
+        self.handshakes += 1
+        if self.metrics:
+            self.metrics.handshakes.inc()
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "handshakes": self.handshakes,
+            "requests": self.requests,
+            "calls": self.calls,
+        }
+
+
+class Transport:
+    def __init__(self, timeout: float = 30, pool_maxsize: int = 4):
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self._nodes = {}
+        self._lock = threading.Lock()
+
+    def node(self, url: str, metrics=None) -> NodeSession:
+        with self._lock:
+            node = self._nodes.get(url)
+            if node is None:
+                node = self._nodes[url] = NodeSession(url, self.pool_maxsize, metrics)
+            return node
+
+    def _post(self, url: str, payload, calls: int):
+        node = self.node(url)
+        node.requests += 1
+        node.calls += calls
+        if node.metrics:
+            node.metrics.requests.inc()
+            node.metrics.calls.inc(calls)
+        response = node.session.post(
+            url, data=json.dumps(payload), timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def call(self, url: str, method: str, params=()):
+        """One JSON-RPC call; raises RPCError on an error response"""
+        reply = self._post(
+            url,
+            {"jsonrpc": "2.0", "id": 1, "method": method, "params": list(params)},
+            1,
+        )
+        if "error" in reply:
+            raise RPCError(reply["error"])
+        return reply.get("result")
+
+    def batch(self, url: str, calls):
+        """Send [(method, params), ...] as one batch request.
+
+        Returns results in call order; a call that failed on the node is
+        returned as an RPCError instance instead of raising, so one bad
+        item does not discard the rest.
+        """
+        if not calls:
+            return []
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": list(params)}
+            for i, (method, params) in enumerate(calls)
+        ]
+        replies = self._post(url, payload, len(calls))
+        if not isinstance(replies, list):
+            raise RPCError(
+                replies.get("error", replies) if isinstance(replies, dict) else replies
+            )
+        by_id = {reply.get("id"): reply for reply in replies}
+        results = []
+        for i in range(len(calls)):
+            reply = by_id.get(i)
+            if reply is None:
+                results.append(RPCError("missing from batch response"))
+            elif "error" in reply:
+                results.append(RPCError(reply["error"]))
+            else:
+                results.append(reply.get("result"))
+        return results
+
+    def stats(self):
+        return [node.stats() for node in self._nodes.values()]
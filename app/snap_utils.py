@@ -1,11 +1,62 @@
-from lighthive.client import Client
+import time
+from collections import OrderedDict
 
 # Utility to get latest post by @peak.snaps in hive-124838
 
-from app.logging_utils import setup_logger
+from app.logging_utils import PER_OP, setup_logger
 
 logger = setup_logger("paynsnapbot")
 
+SNAP_BENEFICIARY = "snapnpay"
+SNAP_BENEFICIARY_WEIGHT = 5000
+
+
+class SnapBeneficiaryCache:
+    """Beneficiaries per (author, permlink), fed from streamed comment_options ops.
+
+    Entries expire after ttl seconds and the oldest are evicted beyond
+    max_entries, so the cache stays small during long runs. `clock` returns
+    the current time in seconds (time.time by default).
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 10000, clock=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock or time.time
+        self._entries = OrderedDict()
+
+    def put(self, author: str, permlink: str, beneficiaries):
+        key = (author, permlink)
+        self._entries.pop(key, None)
+        self._entries[key] = (self.clock() + self.ttl, beneficiaries)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, author: str, permlink: str):
+        """Return cached beneficiaries, or None if unknown or expired"""
+        entry = self._entries.get((author, permlink))
+        if entry is None:
+            return None
+        expires, beneficiaries = entry
+        if expires < self.clock():
+            del self._entries[(author, permlink)]
+            return None
+        return beneficiaries
+
+
+def beneficiaries_from_comment_options(op_data):
+    """Extract the beneficiaries list from a comment_options op body"""
+    for extension in op_data.get("extensions", []) or []:
+        if isinstance(extension, (list, tuple)) and len(extension) == 2:
+            value = extension[1]
+        elif isinstance(extension, dict):
+            value = extension.get("value", {})
+        else:
+            continue
+        if isinstance(value, dict) and "beneficiaries" in value:
+            return value["beneficiaries"]
+    return []
+
 
 def get_latest_peaksnaps_post(client):
     posts = client.get_discussions_by_blog("peak.snaps", limit=10)
@@ -15,31 +66,45 @@ def get_latest_peaksnaps_post(client):
     return None
 
 
-def user_has_valid_snap(client, parent_author, parent_permlink, username):
-    post = client.get_content(parent_author, parent_permlink)
-    logger.info(
-        f"user_has_valid_snap: get_content({parent_author}, {parent_permlink}) returned: {post}"
-    )
-    if not post:
-        logger.info(
-            f"user_has_valid_snap: No post found for author={parent_author}, permlink={parent_permlink}"
+def user_has_valid_snap(client, parent_author, parent_permlink, username, cache=None):
+    beneficiaries = cache.get(parent_author, parent_permlink) if cache else None
+    if beneficiaries is None:
+        post = client.get_content(parent_author, parent_permlink)
+        logger.debug(
+            "user_has_valid_snap: get_content(%s, %s) returned: %s",
+            parent_author,
+            parent_permlink,
+            post,
         )
-        return False
-    beneficiaries = post.get("beneficiaries", [])
-    logger.info(f"user_has_valid_snap: Checking beneficiaries: {beneficiaries}")
-    if not beneficiaries:
-        logger.info(f"user_has_valid_snap: No beneficiaries found in post: {post}")
-    found = False
-    for b in beneficiaries:
-        logger.info(f"user_has_valid_snap: Beneficiary entry: {b}")
-        if b.get("account") == "snapnpay" and b.get("weight") == 5000:
+        if not post:
             logger.info(
-                f"user_has_valid_snap: Valid snap detected for author={parent_author} with snapnpay beneficiary."
+                "user_has_valid_snap: No post found for author=%s, permlink=%s",
+                parent_author,
+                parent_permlink,
             )
-            found = True
-            break
-    if not found:
+            return False
+        beneficiaries = post.get("beneficiaries", [])
+        if cache:
+            cache.put(parent_author, parent_permlink, beneficiaries)
+    found = any(
+        b.get("account") == SNAP_BENEFICIARY
+        and b.get("weight") == SNAP_BENEFICIARY_WEIGHT
+        for b in beneficiaries
+    )
+    if found:
+        logger.info(
+            "user_has_valid_snap: Valid snap detected for author=%s with %s beneficiary.",
+            parent_author,
+            SNAP_BENEFICIARY,
+            extra=PER_OP,
+        )
+    else:
         logger.info(
-            f"user_has_valid_snap: No valid snapnpay beneficiary found. Full post: {post}"
+            "user_has_valid_snap: No valid %s beneficiary for author=%s, permlink=%s. Beneficiaries: %s",
+            SNAP_BENEFICIARY,
+            parent_author,
+            parent_permlink,
+            beneficiaries,
+            extra=PER_OP,
         )
     return found
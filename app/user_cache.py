@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, timezone
+
+
+def to_utc_date(ts: str):
+    """Parse a users.last_purchase value (SQLite 'YYYY-MM-DD HH:MM:SS' or ISO) as a UTC date"""
+    try:
+        if "T" in ts:
+            dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+        else:
+            dt = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S")
+        return dt.replace(tzinfo=timezone.utc).date()
+    except Exception:
+        return None
+
+
+class UserState:
+    __slots__ = ("purchases", "last_purchase_date")
+
+    def __init__(self, purchases, last_purchase_date):
+        self.purchases = purchases
+        self.last_purchase_date = last_purchase_date
+
+
+class UserStateCache:
+    """Write-through cache of per-user purchase counters for daily-limit checks.
+
+    Users are loaded lazily from the users table with their last purchase
+    already parsed to a UTC date. Writes go to SQLite in the caller's
+    transaction and update the cache. The cache is cleared at the UTC day
+    rollover, and db.reset_user invalidates the entry immediately. `clock`
+    returns the current UTC datetime; replays pass one that follows block time.
+    """
+
+    def __init__(self, database, clock=None):
+        self.db = database
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self._users = {}
+        self._day = self.clock().date()
+        self._lock = threading.Lock()
+        database.on_user_reset(self.invalidate)
+
+    def _today(self):
+        today = self.clock().date()
+        if today != self._day:
+            self._users.clear()
+            self._day = today
+        return today
+
+    def _get(self, username: str) -> UserState:
+        state = self._users.get(username)
+        if state is None:
+            row = self.db.conn.execute(
+                "SELECT purchases, last_purchase FROM users WHERE username=?",
+                (username,),
+            ).fetchone()
+            if row:
+                purchases, last_purchase = row
+                state = UserState(
+                    purchases or 0,
+                    to_utc_date(last_purchase) if last_purchase else None,
+                )
+            else:
+                state = UserState(0, None)
+            self._users[username] = state
+        return state
+
+    def purchase_number(self, username: str) -> int:
+        """Number the next purchase would have today (1 after a daily reset)"""
+        with self._lock:
+            today = self._today()
+            state = self._get(username)
+            if state.last_purchase_date is None or state.last_purchase_date < today:
+                return 1
+            return state.purchases + 1
+
+    def record_purchase(self, username: str, purchase_num: int):
+        """Store the purchase count. Does not commit: runs in the payout transaction."""
+        with self._lock:
+            today = self._today()
+            self.db.conn.execute(
+                "INSERT OR REPLACE INTO users (username, purchases, last_purchase) VALUES (?, ?, ?)",
+                (username, purchase_num, self.clock().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+            self._users[username] = UserState(purchase_num, today)
+
+    def invalidate(self, username: str = None):
+        with self._lock:
+            if username is None:
+                self._users.clear()
+            else:
+                self._users.pop(username, None)
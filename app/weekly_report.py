@@ -0,0 +1,252 @@
+"""Weekly PaySnap report built from the daily per-store rollups.
+
+A week's figures are sums over the daily_store_* tables (app/rollups.py),
+which are kept current with every payment_events insert, so building a
+report never scans the event history. Weeks start on Monday (UTC). A report
+publishes to a permlink derived from its week, so re-running it for any
+past week edits the same post.
+
+Cron (Sundays):  python -m app.weekly_report --publish
+Any past week:   python -m app.weekly_report --week 2024-06-03 --publish
+"""
+
+import argparse
+import os
+from datetime import date, datetime, timedelta, timezone
+from app import rollups
+from app.config import config
+
+REASON_LABELS = {key: reason for reason, key in rollups.REASON_KEYS.items()}
+REASON_LABELS["other"] = "Other"
+
+
+def week_start(day) -> date:
+    """Monday of the week containing day (a date or YYYY-MM-DD string)"""
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], "%Y-%m-%d").date()
+    return day - timedelta(days=day.weekday())
+
+
+def last_complete_week(today: date = None) -> date:
+    return week_start(today or datetime.now(timezone.utc).date()) - timedelta(days=7)
+
+
+def _days(week: date):
+    return week.isoformat(), (week + timedelta(days=6)).isoformat()
+
+
+def _week_totals(conn, week: date) -> dict:
+    events, paid, payments, cashback, stores = conn.execute(
+        """
+        SELECT COALESCE(SUM(events), 0), COALESCE(SUM(paid), 0),
+               COALESCE(SUM(payments_total), 0), COALESCE(SUM(cashback_total), 0),
+               COUNT(DISTINCT CASE WHEN paid > 0 THEN store END)
+        FROM daily_store_stats WHERE day BETWEEN ? AND ?
+        """,
+        _days(week),
+    ).fetchone()
+    customers = conn.execute(
+        "SELECT COUNT(DISTINCT username) FROM daily_store_users WHERE day BETWEEN ? AND ?",
+        _days(week),
+    ).fetchone()[0]
+    return {
+        "events": events,
+        "paid": paid,
+        "payments_total": round(payments, 3),
+        "cashback_total": round(cashback, 3),
+        "customers": customers,
+        "active_stores": stores,
+        "success_rate": paid / events if events else 0.0,
+    }
+
+
+def build_report(conn, week) -> dict:
+    """Totals, previous-week totals, per-store rows and failure reasons for a week"""
+    start = week_start(week)
+    first, last = _days(start)
+    stores = [
+        {
+            "store": store,
+            "events": events,
+            "paid": paid,
+            "payments_total": round(payments, 3),
+            "cashback_total": round(cashback, 3),
+            "customers": customers,
+        }
+        for store, events, paid, payments, cashback, customers in conn.execute(
+            """
+            SELECT s.store, SUM(s.events), SUM(s.paid), SUM(s.payments_total),
+                   SUM(s.cashback_total),
+                   (SELECT COUNT(DISTINCT u.username) FROM daily_store_users u
+                    WHERE u.day BETWEEN ?1 AND ?2 AND u.store = s.store)
+            FROM daily_store_stats s WHERE s.day BETWEEN ?1 AND ?2
+            GROUP BY s.store
+            ORDER BY SUM(s.cashback_total) DESC, s.store
+            """,
+            (first, last),
+        )
+    ]
+    failures = conn.execute(
+        """
+        SELECT reason, SUM(count) FROM daily_store_reasons
+        WHERE day BETWEEN ? AND ? AND reason != 'paid'
+        GROUP BY reason ORDER BY SUM(count) DESC, reason
+        """,
+        (first, last),
+    ).fetchall()
+    return {
+        "week": first,
+        "end": last,
+        "totals": _week_totals(conn, start),
+        "previous": _week_totals(conn, start - timedelta(days=7)),
+        "stores": stores,
+        "failures": [{"reason": reason, "count": n} for reason, n in failures],
+    }
+
+
+def _change(current, previous) -> str:
+    if not previous:
+        return "new this week" if current else "no change"
+    return f"{(current - previous) / previous * 100:+.1f}% vs last week"
+
+
+def render_markdown(report: dict) -> str:
+    totals = report["totals"]
+    previous = report["previous"]
+    lines = [
+        f"# 📊 PaySnap Weekly Report - Week of {report['week']}",
+        "",
+        f"Covering {report['week']} to {report['end']} (UTC).",
+        "",
+        "## 🎉 This Week's Highlights",
+        f"- Total Cashback Distributed: {totals['cashback_total']:.3f} HBD "
+        f"({_change(totals['cashback_total'], previous['cashback_total'])})",
+        f"- Happy Customers: {totals['customers']} users "
+        f"({_change(totals['customers'], previous['customers'])})",
+        f"- Active Stores: {totals['active_stores']} participating merchants",
+        f"- Payments Processed: {totals['events']} "
+        f"({totals['success_rate'] * 100:.1f}% earned cashback)",
+        "",
+        "## 🏪 Store Performance",
+    ]
+    if report["stores"]:
+        lines += [
+            "| Store | Transactions | Cashback | Customers | Sales |",
+            "|---|---|---|---|---|",
+        ]
+        lines += [
+            f"| @{s['store']} | {s['paid']}/{s['events']} | {s['cashback_total']:.3f} HBD "
+            f"| {s['customers']} | {s['payments_total']:.3f} HBD |"
+            for s in report["stores"]
+        ]
+    else:
+        lines.append("No PaySnap payments this week.")
+    if report["failures"]:
+        lines += ["", "## 🔍 Payments Without Cashback"]
+        lines += [
+            f"- {REASON_LABELS.get(f['reason'], f['reason'])}: {f['count']}"
+            for f in report["failures"]
+        ]
+    lines += [
+        "",
+        "## 💰 Ecosystem Health",
+        f"- Customer Savings: {totals['cashback_total']:.3f} HBD returned to users",
+        f"- Store Sales: {totals['payments_total']:.3f} HBD paid to participating stores "
+        f"({_change(totals['payments_total'], previous['payments_total'])})",
+        "",
+        "Pay a participating store in HBD, share a snap of your purchase and get cashback!",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def permlink_for(week: str) -> str:
+    return f"paynsnap-weekly-report-{week}"
+
+
+def publish(report: dict, body: str, pool=None):
+    """Post the report, or edit it if this week's post already exists"""
+    from app.node_pool import NodePool
+    from app.posting import comment_operations
+
+    settings = config.get("weekly_report", {})
+    pool = pool or NodePool()
+    username = os.getenv("HIVE_USERNAME")
+    permlink = permlink_for(report["week"])
+    existing = pool.get_content(username, permlink)
+    edit = bool(existing and existing.get("author"))
+    # Beneficiaries can only be set once, so an edit re-sends just the comment
+    beneficiaries = None if edit else settings.get("beneficiaries")
+    operations = comment_operations(
+        username,
+        permlink,
+        "",
+        settings.get("parent_permlink", "hive-124838"),
+        body,
+        title=f"PaySnap Weekly Report - Week of {report['week']}",
+        beneficiaries=beneficiaries,
+        json_metadata={
+            "app": "paynsnapbot",
+            "format": "markdown",
+            "tags": settings.get("tags", ["paynsnap", "hbd", "hive"]),
+        },
+    )
+    pool.broadcast(operations, keys=[os.getenv("HIVE_POSTING_KEY")])
+    return permlink, edit
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build and publish the weekly PaySnap report"
+    )
+    parser.add_argument(
+        "--week", help="Any date in the week to report (default: last complete week)"
+    )
+    parser.add_argument(
+        "--publish", action="store_true", help="Post the report to Hive"
+    )
+    parser.add_argument("--output", help="Write the Markdown to this file")
+    args = parser.parse_args()
+    from app.db import db
+
+    week = week_start(args.week) if args.week else last_complete_week()
+    report = build_report(db.conn, week)
+    body = render_markdown(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body)
+    else:
+        print(body)
+
+    if args.publish:
+        from app.notifier import discord
+
+        permlink, edited = publish(report, body)
+        url = f"https://peakd.com/@{os.getenv('HIVE_USERNAME')}/{permlink}"
+        print(f"{'Updated' if edited else 'Published'} {url}")
+        discord.notify(
+            title="📊 Weekly Report Published",
+            description=f"{'Updated' if edited else 'Posted'} the report for the week of {report['week']}: {url}",
+            color=0x3399FF,
+            fields=[
+                {
+                    "name": "Cashback",
+                    "value": f"{report['totals']['cashback_total']:.3f} HBD",
+                    "inline": True,
+                },
+                {
+                    "name": "Customers",
+                    "value": str(report["totals"]["customers"]),
+                    "inline": True,
+                },
+                {
+                    "name": "Active Stores",
+                    "value": str(report["totals"]["active_stores"]),
+                    "inline": True,
+                },
+            ],
+        )
+        discord.flush()
+
+
+if __name__ == "__main__":
+    main()
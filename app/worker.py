@@ -0,0 +1,63 @@
+"""Standalone block-ingestion worker.
+
+  python -m app.worker
+  python -m app.worker --metrics-port 9108
+
+Runs HiveBot's polling loop, the broadcaster and Discord notifications in
+this process only. The web app (app.main) reads the database and talks to
+the worker through app/control.py, so it can run with any number of uvicorn
+workers. A lock file next to the database keeps a second worker from
+starting against the same database, which would double-pay.
+"""
+
+import argparse
+import fcntl
+import sys
+from app.config import config
+from app.logging_utils import setup_logger
+
+logger = setup_logger("paynsnapbot")
+
+
+def acquire_lock(db_path: str):
+    """Hold an exclusive lock for the life of the process; None if taken"""
+    handle = open(f"{db_path}.worker.lock", "w")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def main():
+    settings = config.get("worker", {}) or {}
+    parser = argparse.ArgumentParser(description="Run the Pay n Snap block worker")
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=settings.get("metrics_port", 9108),
+        help="Port for this worker's Prometheus metrics (0 disables)",
+    )
+    args = parser.parse_args()
+
+    from app import metrics
+    from app.bot import HiveBot
+    from app.db import db
+    from app.notifier import discord
+
+    lock = acquire_lock(db.path)
+    if lock is None:
+        logger.error(f"Another worker is already running against {db.path}")
+        sys.exit(1)
+    # Metrics are up before the bot exists; the starting block is resolved
+    # inside poll_blocks, so slow nodes never hold up startup
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    metrics.track_queues(db, discord)
+    bot = HiveBot()
+    bot.poll_blocks()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Run the hot-path benchmarks.
+
+  python -m benchmarks                          # print results
+  python -m benchmarks --save benchmarks/baseline.json
+  python -m benchmarks --compare benchmarks/baseline.json --threshold 0.2
+
+With --compare the exit status is 1 when any case is slower than the
+baseline by more than the threshold. Baselines are machine-specific, so
+compare only against one recorded on the same host.
+"""
+
+import argparse
+import sys
+from app.replay import offline_environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot's hot paths")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed repeats per case (median is kept)"
+    )
+    parser.add_argument(
+        "--only", nargs="*", help="Run cases whose name contains any of these"
+    )
+    parser.add_argument("--save", help="Write results to this baseline file")
+    parser.add_argument("--compare", help="Compare against this baseline file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed slowdown before flagging (0.2 = 20%%)",
+    )
+    args = parser.parse_args()
+
+    _, scratch = offline_environment("paynsnap-bench-")
+
+    from benchmarks import harness
+    from benchmarks.cases import CASES
+
+    print(f"{'case':<36}{'median':>12}{'per unit':>14}{'units/sec':>14}")
+    results = harness.run_cases(
+        CASES,
+        repeat=args.repeat,
+        only=args.only,
+        progress=lambda key, r: print(
+            f"{key:<36}{r['median_s'] * 1000:>10.2f}ms{r['per_unit_us']:>12.2f}us{r['units_per_sec']:>14,.0f}"
+        ),
+    )
+    if args.save:
+        harness.save(results, args.save)
+        print(f"Saved baseline to {args.save}")
+
+    status = 0
+    if args.compare:
+        rows = harness.compare(results, harness.load(args.compare), args.threshold)
+        print(f"\n{'case':<36}{'baseline':>12}{'current':>12}{'change':>10}")
+        for key, base, current, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(
+                f"{key:<36}{base:>10.2f}us{current:>10.2f}us{(ratio - 1) * 100:>+9.1f}%{flag}"
+            )
+        regressions = [row for row in rows if row[4]]
+        if regressions:
+            print(
+                f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}"
+            )
+            status = 1
+    scratch.cleanup()
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Benchmark cases for the bot's hot paths.
+
+Each case takes a scale and returns (setup, run, units). setup() is untimed
+and runs before every repeat; run() is timed and handles `units` items. The
+bot only ever holds uncommitted state here, which setup() rolls back, so
+every repeat starts from the same empty database.
+"""
+
+import calendar
+import random
+import time
+from app.cashback import CashbackCalculator
+from app.config import config
+from app.replay import offline_bot
+from app.snap_utils import SNAP_BENEFICIARY, SNAP_BENEFICIARY_WEIGHT
+
+START_BLOCK = 90_000_000
+BLOCK_TIME = "2024-06-03T12:00:00"
+BLOCK_TS = float(calendar.timegm(time.strptime(BLOCK_TIME, "%Y-%m-%dT%H:%M:%S")))
+STORES = config.get("stores", []) or ["store1"]
+BENEFICIARIES = [{"account": SNAP_BENEFICIARY, "weight": SNAP_BENEFICIARY_WEIGHT}]
+
+CASES = {}
+
+
+def case(name, scales):
+    def register(func):
+        CASES[name] = (scales, func)
+        return func
+
+    return register
+
+
+class StubPool:
+    """Every post is a valid snap; nothing leaves the process"""
+
+    def get_content(self, author, permlink):
+        return {"author": author, "permlink": permlink, "beneficiaries": BENEFICIARIES}
+
+    def get_dynamic_global_properties(self):
+        return {"head_block_number": START_BLOCK}
+
+    def broadcast(self, operations, keys=None):
+        return {"id": "benchmark"}
+
+    def batch(self, method, params_list):
+        return [getattr(self, method)(*params) for params in params_list]
+
+
+_bot = None
+
+
+def bot():
+    global _bot
+    if _bot is None:
+        _bot = offline_bot(StubPool(), START_BLOCK)
+    return _bot
+
+
+def reset():
+    b = bot()
+    b.rollback_blocks()
+    b.block_time = BLOCK_TS
+    return b
+
+
+def op(trx_id, op_type, data):
+    return {
+        "block": START_BLOCK,
+        "trx_id": trx_id,
+        "timestamp": BLOCK_TIME,
+        "op": [op_type, data],
+    }
+
+
+def store_transfer(i):
+    return op(
+        f"{i:040x}",
+        "transfer",
+        {
+            "from": f"user{i}",
+            "to": STORES[i % len(STORES)],
+            "amount": "1.000 HBD",
+            "memo": f"kcs-hpos-{i}",
+        },
+    )
+
+
+def snap(i):
+    return op(
+        f"{i:040x}s",
+        "comment",
+        {
+            "parent_author": "peak.snaps",
+            "parent_permlink": "snaps-container",
+            "author": f"user{i}",
+            "permlink": f"snap-{i}",
+            "body": "paid with #paynsnap",
+        },
+    )
+
+
+def snap_options(i):
+    return op(
+        f"{i:040x}s",
+        "comment_options",
+        {
+            "author": f"user{i}",
+            "permlink": f"snap-{i}",
+            "extensions": [[0, {"beneficiaries": BENEFICIARIES}]],
+        },
+    )
+
+
+def mixed_ops(n, seed=42):
+    """Roughly mainnet-shaped: mostly votes and custom_json, a few percent
+    store transfers and snaps"""
+    rng = random.Random(seed)
+    ops = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.05:
+            ops.append(store_transfer(i))
+        elif roll < 0.07:
+            transfer = store_transfer(i)
+            transfer["op"][1]["memo"] = "thanks!"
+            ops.append(transfer)
+        elif roll < 0.15:
+            ops.append(
+                op(
+                    f"{i:040x}",
+                    "transfer",
+                    {
+                        "from": f"user{i}",
+                        "to": "exchange",
+                        "amount": "5.000 HIVE",
+                        "memo": "123",
+                    },
+                )
+            )
+        elif roll < 0.19:
+            ops.append(snap(i))
+        elif roll < 0.21:
+            ops.append(snap_options(i))
+        elif roll < 0.60:
+            ops.append(
+                op(
+                    f"{i:040x}",
+                    "vote",
+                    {
+                        "voter": f"user{i}",
+                        "author": "someone",
+                        "permlink": "post",
+                        "weight": 10000,
+                    },
+                )
+            )
+        else:
+            ops.append(
+                op(
+                    f"{i:040x}",
+                    "custom_json",
+                    {
+                        "id": "follow",
+                        "json": "[]",
+                        "required_posting_auths": [f"user{i}"],
+                    },
+                )
+            )
+    return ops
+
+
+@case("valid_memo", [1000, 10000])
+def valid_memo(scale):
+    b = bot()
+    memos = [f"kcs-hpos-{i}" if i % 3 else f"invoice {i}" for i in range(scale)]
+
+    def run():
+        for memo in memos:
+            b.valid_memo(memo)
+
+    return (lambda: None), run, scale
+
+
+@case("process_op_mixed", [100, 1000, 10000])
+def process_op_mixed(scale):
+    ops = mixed_ops(scale)
+    b = bot()
+
+    def run():
+        for o in ops:
+            b.process_op(START_BLOCK, o)
+
+    return reset, run, scale
+
+
+@case("prefilter_ops", [1000, 10000])
+def prefilter_ops(scale):
+    ops = mixed_ops(scale)
+    b = bot()
+    return reset, lambda: b.prefilter_ops(ops), scale
+
+
+@case("snap_matching", [10, 100, 1000])
+def snap_matching(scale):
+    """Snaps arriving for `scale` pending payments"""
+    snaps = [snap(i) for i in range(scale)]
+
+    def setup():
+        b = reset()
+        for i in range(scale):
+            b.process_op(START_BLOCK, store_transfer(i))
+
+    def run():
+        b = bot()
+        for o in snaps:
+            b.process_op(START_BLOCK, o)
+
+    return setup, run, scale
+
+
+@case("check_pending_payments", [10, 100, 1000])
+def check_pending_payments(scale):
+    """`scale` due payments: four in five snapped, the rest timed out"""
+
+    def setup():
+        b = reset()
+        for i in range(scale):
+            b.process_op(START_BLOCK, store_transfer(i))
+            if i % 5:
+                b.process_op(START_BLOCK, snap(i))
+                b.process_op(START_BLOCK, snap_options(i))
+
+    def run():
+        b = bot()
+        b.check_pending_payments(now=BLOCK_TS + b.SNAP_TIMEOUT + 1)
+
+    return setup, run, scale
+
+
+@case("cashback_calculate", [10000])
+def cashback_calculate(scale):
+    calculator = CashbackCalculator()
+    purchases = [(i % 4 + 1, 0.5 + (i % 7) * 0.25) for i in range(scale)]
+
+    def run():
+        for purchase_num, amount in purchases:
+            calculator.calculate(purchase_num, amount)
+
+    return (lambda: None), run, scale
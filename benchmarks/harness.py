@@ -0,0 +1,76 @@
+"""Timing, baseline files and regression comparison for the benchmarks"""
+
+import json
+import platform
+import statistics
+import time
+
+
+def measure(setup, run, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        setup()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_cases(cases, repeat: int = 5, only=None, progress=None) -> dict:
+    """Run every case at every scale; results are keyed 'name[scale]'"""
+    results = {}
+    for name, (scales, factory) in cases.items():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        for scale in scales:
+            setup, run, units = factory(scale)
+            timings = measure(setup, run, repeat)
+            median = statistics.median(timings)
+            key = f"{name}[{scale}]"
+            results[key] = {
+                "median_s": median,
+                "min_s": min(timings),
+                "units": units,
+                "per_unit_us": median / units * 1e6,
+                "units_per_sec": units / median if median else None,
+            }
+            if progress:
+                progress(key, results[key])
+    return results
+
+
+def save(results: dict, path: str):
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "platform": platform.platform(),
+                "results": results,
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """(key, baseline_us, current_us, ratio, regressed) for every shared key.
+
+    Per-unit medians are compared, so a case that got slower by more than
+    `threshold` (0.2 = 20%) counts as a regression.
+    """
+    rows = []
+    for key, current in results.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]["per_unit_us"]
+        ratio = current["per_unit_us"] / base if base else float("inf")
+        rows.append((key, base, current["per_unit_us"], ratio, ratio > 1 + threshold))
+    return rows
@@ -0,0 +1,29 @@
+import atexit
+import os
+import shutil
+import tempfile
+import pytest
+
+# Point the global db at a throwaway file before any test imports app.db, so
+# the suite never opens (or creates) the working copy's paynsnap.db
+_db_dir = tempfile.mkdtemp(prefix="paynsnap-tests-")
+atexit.register(shutil.rmtree, _db_dir, ignore_errors=True)
+os.environ["DB_PATH"] = os.path.join(_db_dir, "paynsnap.db")
+
+from app.db import db  # noqa: E402
+
+
+@pytest.fixture
+def scratch_db(request, tmp_path):
+    """The global db reopened on an empty file for one test.
+
+    Options come from indirect parametrization, e.g. a connection factory:
+    @pytest.mark.parametrize("scratch_db", [{"connection_factory": F}], indirect=True)
+    """
+    options = getattr(request, "param", {})
+    original, factory = db.path, db.connection_factory
+    db.connection_factory = options.get("connection_factory", factory)
+    db.reopen(str(tmp_path / "scratch.db"))
+    yield db
+    db.connection_factory = factory
+    db.reopen(original)
@@ -0,0 +1,24 @@
+from benchmarks import harness
+
+
+def test_compare_flags_only_slowdowns_past_threshold(tmp_path):
+    cases = {
+        "fast": ([10], lambda scale: ((lambda: None), (lambda: None), scale)),
+        "other": ([5], lambda scale: ((lambda: None), (lambda: None), scale)),
+    }
+    results = harness.run_cases(cases, repeat=2, only=["fast"])
+    assert list(results) == ["fast[10]"]
+
+    path = str(tmp_path / "baseline.json")
+    harness.save({"a[1]": {"per_unit_us": 10.0}, "b[1]": {"per_unit_us": 10.0}}, path)
+    baseline = harness.load(path)
+    current = {
+        "a[1]": {"per_unit_us": 11.5},
+        "b[1]": {"per_unit_us": 13.0},
+        "new[1]": {"per_unit_us": 1.0},
+    }
+    rows = {
+        key: regressed
+        for key, _, _, _, regressed in harness.compare(current, baseline, 0.2)
+    }
+    assert rows == {"a[1]": False, "b[1]": True}
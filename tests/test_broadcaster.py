@@ -0,0 +1,218 @@
+import time
+import pytest
+from app.broadcaster import Broadcaster
+from app.db import db
+from app.rpc import RPCError
+
+
+class FakePool:
+    def __init__(self):
+        self.history = []
+        self.posts = {}
+
+    def get_account_history(self, account, start, limit, op_filter=None):
+        return list(enumerate(self.history))
+
+    def get_content(self, author, permlink):
+        return self.posts.get(permlink, {"author": "", "permlink": ""})
+
+
+class FakeBot:
+    """Records broadcasts; each queued error is raised by the next broadcast,
+    after the transfer landed on chain if it is queued as (error, True)"""
+
+    username = "paynsnap"
+
+    def __init__(self):
+        self.pool = FakePool()
+        self.transfers = []
+        self.batches = []
+        self.replies = []
+        self.errors = []
+
+    def _land(self, user, amount, memo):
+        op = {"to": user, "amount": f"{amount:.3f} HBD", "memo": memo}
+        self.pool.history.append({"op": ["transfer", op]})
+
+    def _maybe_fail(self, landed):
+        if self.errors:
+            error, lands = self.errors.pop(0)
+            if lands:
+                landed()
+            raise error
+        landed()
+
+    def send_cashback(self, user, amount, memo):
+        self.transfers.append(user)
+        self._maybe_fail(lambda: self._land(user, amount, memo))
+        return {"id": f"tx-{user}"}
+
+    def send_cashback_batch(self, payouts):
+        self.batches.append([p["user"] for p in payouts])
+
+        def landed():
+            for p in payouts:
+                self._land(p["user"], p["amount"], p["memo"])
+
+        self._maybe_fail(landed)
+        return {"id": "tx-batch"}
+
+    def reply_comment(
+        self,
+        user,
+        memo,
+        amount,
+        parent_author,
+        parent_permlink,
+        store=None,
+        permlink=None,
+    ):
+        self.replies.append(user)
+        self.pool.posts[permlink] = {"author": self.username, "permlink": permlink}
+        return {"id": f"reply-{user}"}
+
+
+@pytest.fixture
+def broadcaster(scratch_db):
+    broadcaster = Broadcaster(FakeBot())
+    broadcaster.batch_size = 1
+    broadcaster.conn = db.connect()
+    return broadcaster
+
+
+def _queue(user, op_id, reply=True):
+    payload = {"user": user, "amount": 0.05, "memo": f"kcs-hpos-{op_id}"}
+    db.queue_outbox("transfer", payload, 1, op_id)
+    if reply:
+        reply_payload = dict(
+            payload,
+            parent_author=user,
+            parent_permlink="snap",
+            permlink=f"paynsnap-1-{op_id}",
+        )
+        db.queue_outbox("reply", reply_payload, 1, op_id)
+    db.conn.commit()
+
+
+def _statuses():
+    return dict(db.conn.execute("SELECT kind || ':' || op_id, status FROM outbox"))
+
+
+def _make_due():
+    db.conn.execute("UPDATE outbox SET next_attempt = 0")
+    db.conn.commit()
+
+
+def test_failed_transfer_backs_off_and_holds_its_reply(broadcaster):
+    _queue("alice", "a1")
+    broadcaster.bot.errors.append((TimeoutError("read timed out"), False))
+    broadcaster.drain()
+    status, attempts, next_attempt = db.conn.execute(
+        "SELECT status, attempts, next_attempt FROM outbox WHERE kind = 'transfer'"
+    ).fetchone()
+    assert (status, attempts) == ("pending", 1)
+    assert next_attempt >= time.time() + broadcaster.settle_delay - 5
+    assert broadcaster.bot.replies == []
+
+    _make_due()
+    broadcaster.drain()
+    broadcaster.drain()
+    assert _statuses() == {"transfer:a1": "sent", "reply:a1": "sent"}
+    assert broadcaster.bot.transfers == ["alice", "alice"]
+    assert broadcaster.bot.replies == ["alice"]
+
+
+def test_retry_of_a_transfer_that_landed_is_not_resent(broadcaster):
+    _queue("alice", "a1", reply=False)
+    broadcaster.bot.errors.append((TimeoutError("read timed out"), True))
+    broadcaster.drain()
+    _make_due()
+    broadcaster.drain()
+    assert _statuses() == {"transfer:a1": "sent"}
+    assert broadcaster.bot.transfers == ["alice"]
+
+
+def test_max_attempts_fails_transfer_and_cancels_reply(broadcaster):
+    broadcaster.max_attempts = 2
+    _queue("alice", "a1")
+    broadcaster.bot.errors += [(TimeoutError("down"), False)] * 2
+    broadcaster.drain()
+    _make_due()
+    broadcaster.drain()
+    _make_due()
+    broadcaster.drain()
+    assert _statuses() == {"transfer:a1": "failed", "reply:a1": "cancelled"}
+    assert broadcaster.bot.replies == []
+
+
+def test_recover_checks_the_chain_for_entries_left_sending(broadcaster):
+    _queue("alice", "a1", reply=False)
+    _queue("bob", "b1", reply=False)
+    db.conn.execute("UPDATE outbox SET status = 'sending', attempts = 1")
+    db.conn.commit()
+    broadcaster.bot._land("alice", 0.05, "kcs-hpos-a1")
+    broadcaster.recover()
+    assert _statuses() == {"transfer:a1": "sent", "transfer:b1": "pending"}
+    _make_due()
+    broadcaster.drain()
+    assert _statuses()["transfer:b1"] == "sent"
+    assert broadcaster.bot.transfers == ["bob"]
+
+
+def test_recovered_entry_waits_out_settle_delay_before_the_chain_check(broadcaster):
+    _queue("alice", "a1", reply=False)
+    db.conn.execute("UPDATE outbox SET status = 'sending', attempts = 1")
+    db.conn.commit()
+    broadcaster.recover()
+    next_attempt = db.conn.execute("SELECT next_attempt FROM outbox").fetchone()[0]
+    assert next_attempt >= time.time() + broadcaster.settle_delay - 5
+    assert broadcaster.drain() == 0
+
+    # The transaction from before the crash lands while the entry waits
+    broadcaster.bot._land("alice", 0.05, "kcs-hpos-a1")
+    _make_due()
+    broadcaster.drain()
+    assert _statuses() == {"transfer:a1": "sent"}
+    assert broadcaster.bot.transfers == []
+
+
+@pytest.fixture
+def batching(broadcaster):
+    broadcaster.batch_size = 3
+    for user in ("alice", "bob", "carol"):
+        _queue(user, user[0], reply=False)
+    return broadcaster
+
+
+def test_rejected_batch_is_split_into_single_transfers(batching):
+    batching.bot.errors.append(
+        (
+            RPCError({"code": -32000, "message": "missing required active authority"}),
+            False,
+        )
+    )
+    batching.drain()
+    assert batching.bot.batches == [["alice", "bob", "carol"]]
+    assert batching.bot.transfers == ["alice", "bob", "carol"]
+    assert set(_statuses().values()) == {"sent"}
+
+
+def test_batch_that_landed_despite_a_timeout_is_not_resent(batching):
+    batching.bot.errors.append((TimeoutError("read timed out"), True))
+    batching.drain()
+    assert set(_statuses().values()) == {"sent"}
+    assert batching.bot.transfers == []
+
+
+def test_batch_lost_to_a_timeout_waits_for_retry(batching):
+    batching.bot.errors.append((TimeoutError("read timed out"), False))
+    batching.drain()
+    rows = db.conn.execute("SELECT status, attempts FROM outbox").fetchall()
+    assert rows == [("pending", 1)] * 3
+    assert batching.bot.transfers == []
+
+    _make_due()
+    batching.drain()
+    assert set(_statuses().values()) == {"sent"}
+    assert batching.bot.transfers == ["alice", "bob", "carol"]
+    assert len(batching.bot.batches) == 1
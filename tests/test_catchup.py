@@ -0,0 +1,92 @@
+import time
+import pytest
+from app.node_pool import NodePool
+from app.replay import offline_bot
+from app.rpc import RPCError
+
+
+def _ops(block_num):
+    return [{"block": block_num, "op": ["producer_reward", {"producer": "w"}]}]
+
+
+class ChainTransport:
+    """Serves get_ops_in_block per node: blocks up to each node's head, with
+    optional errors for individual blocks"""
+
+    def __init__(self, heads, errors=()):
+        self.heads = heads
+        self.errors = set(errors)
+        self.batches = []
+
+    def _ops_in_block(self, url, block_num):
+        if (url, block_num) in self.errors:
+            return RPCError("block not available")
+        return _ops(block_num) if block_num <= self.heads[url] else []
+
+    def batch(self, url, calls):
+        self.batches.append((url, [params[0] for _, params in calls]))
+        return [self._ops_in_block(url, params[0]) for _, params in calls]
+
+    def call(self, url, method, params=()):
+        return self.batch(url, [(method, params)])[0]
+
+
+def _pool(transport):
+    pool = NodePool(nodes=list(transport.heads), base_backoff=1)
+    pool.transport = transport
+    return pool
+
+
+def _bot(transport, start_block):
+    return offline_bot(_pool(transport), start_block)
+
+
+def test_batch_fetch_returns_blocks_in_order(scratch_db):
+    transport = ChainTransport({"http://a.example": 200})
+    bot = _bot(transport, 100)
+    blocks = bot.fetch_blocks_batch(100, 5)
+    assert [ops[0]["block"] for ops in blocks] == [100, 101, 102, 103, 104]
+    assert transport.batches == [("http://a.example", [100, 101, 102, 103, 104])]
+
+
+def test_short_or_empty_batch_response(scratch_db):
+    transport = ChainTransport({"http://a.example": 102, "http://b.example": 99})
+    bot = _bot(transport, 100)
+    a, b = bot.pool.nodes
+    bot.pool.record_success(a, 0.1)
+    bot.pool.record_success(b, 0.2)
+
+    # a has not produced 103-104 yet: the batch comes back short
+    blocks = bot.fetch_blocks_batch(100, 5)
+    assert [ops[0]["block"] for ops in blocks] == [100, 101, 102]
+
+    # Nothing from a past its head: it is sidelined and b is tried next
+    transport.heads["http://b.example"] = 110
+    blocks = bot.fetch_blocks_batch(103, 3)
+    assert [ops[0]["block"] for ops in blocks] == [103, 104, 105]
+    assert a.sidelined_until > 0
+    assert [url for url, _ in transport.batches[-2:]] == [a.url, b.url]
+
+    transport.heads["http://b.example"] = 99
+    with pytest.raises(Exception, match="all nodes"):
+        bot.fetch_blocks_batch(120, 3)
+
+
+def test_checkpoint_only_covers_contiguous_processed_blocks(scratch_db):
+    transport = ChainTransport({"http://a.example": 200})
+    bot = _bot(transport, 100)
+    bot.catching_up, bot.catchup_started, bot.catchup_blocks = True, time.time(), 0
+    bot.catchup_batch_size = 4
+    process_block = bot.process_block
+
+    def failing_at_106(block_num, ops=None):
+        if block_num == 106:
+            raise RuntimeError("op failed")
+        process_block(block_num, ops)
+
+    bot.process_block = failing_at_106
+    with pytest.raises(RuntimeError):
+        bot.process_available_blocks(120)
+    assert bot.last_block == 105
+    assert scratch_db.get_checkpoint() == 105
+    bot.pipeline.shutdown()
@@ -0,0 +1,46 @@
+from app.chain_fixture import ChainFixture, FixtureWriter, snap_refs
+
+
+def _op(block_num, op_type, data):
+    return {
+        "block": block_num,
+        "timestamp": "2024-06-03T12:00:00",
+        "op": [op_type, data],
+    }
+
+
+def test_fixture_round_trip_out_of_order_with_gaps(tmp_path):
+    writer = FixtureWriter(str(tmp_path))
+    writer.add_block(
+        12,
+        [_op(12, "transfer", {"from": "bob", "to": "store1", "amount": "1.000 HBD"})],
+    )
+    writer.add_block(10, [_op(10, "producer_reward", {})])
+    writer.add_content("alice", "snap-1", {"author": "alice", "beneficiaries": []})
+    writer.close()
+
+    with ChainFixture(str(tmp_path)) as fixture:
+        assert (fixture.first_block, fixture.last_block, len(fixture)) == (10, 12, 2)
+        assert 10 in fixture and 11 not in fixture and 13 not in fixture
+        assert fixture.ops(11) is None
+        assert fixture.ops(12)[0]["op"][1]["to"] == "store1"
+        assert [n for n, _ in fixture.blocks()] == [10, 12]
+        assert [n for n, _ in fixture.blocks(11, 12)] == [12]
+        assert fixture.content("alice", "snap-1")["author"] == "alice"
+        assert fixture.content("alice", "missing") is None
+
+
+def test_snap_refs_only_matches_peaksnaps_replies():
+    ops = [
+        _op(
+            1,
+            "comment",
+            {"parent_author": "peak.snaps", "author": "alice", "permlink": "snap"},
+        ),
+        _op(
+            1,
+            "comment",
+            {"parent_author": "bob", "author": "carol", "permlink": "reply"},
+        ),
+    ]
+    assert list(snap_refs(ops)) == [("alice", "snap")]
@@ -0,0 +1,33 @@
+from app import control
+from app.db import Database
+from app.user_cache import UserStateCache
+
+
+def test_worker_runs_queued_reset_and_invalidates_its_cache():
+    database = Database(":memory:")
+    database.conn.execute(
+        "INSERT INTO users (username, purchases, last_purchase) VALUES ('alice', 3, datetime('now'))"
+    )
+    database.conn.commit()
+    cache = UserStateCache(database)
+    assert cache.purchase_number("alice") == 4
+
+    reset = control.queue_command(database.conn, "reset_user", username="alice")
+    unknown = control.queue_command(database.conn, "drop_tables")
+    assert control.get_command(database.conn, reset)["status"] == "pending"
+
+    assert control.run_commands(database.conn, {"reset_user": database.reset_user}) == 2
+    assert control.run_commands(database.conn, {"reset_user": database.reset_user}) == 0
+    done = control.wait_for_command(database.conn, reset, timeout=0)
+    assert (done["status"], done["result"]) == ("done", True)
+    assert control.get_command(database.conn, unknown)["status"] == "failed"
+    assert cache.purchase_number("alice") == 1
+
+
+def test_status_reports_age():
+    database = Database(":memory:")
+    assert control.read_status(database.conn) is None
+    control.write_status(database.conn, {"last_block": 100, "lag": 2})
+    status = control.read_status(database.conn)
+    assert (status["last_block"], status["lag"], status["stale"]) == (100, 2, False)
+    assert control.read_status(database.conn, max_age=-1)["stale"]
@@ -0,0 +1,33 @@
+import pytest
+from app.db import db
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app.dashboard import dashboard_router  # noqa: E402
+
+SCRIPT = '"><script>alert(1)</script>'
+
+
+@pytest.fixture
+def client(scratch_db):
+    app = FastAPI()
+    app.include_router(dashboard_router, prefix="/admin")
+    return TestClient(app)
+
+
+def test_transactions_escape_filters_and_memos(client):
+    db.record_payment_event(
+        1, "aa11", "alice", "store1", 1.0, "<b>memo</b>", None, 0, "No snap detected"
+    )
+    db.conn.commit()
+    page = client.get("/admin/transactions", params={"user": SCRIPT}).text
+    assert "<script>" not in page and "&lt;script&gt;" in page
+    page = client.get("/admin/transactions").text
+    assert "<b>memo</b>" not in page and "&lt;b&gt;memo&lt;/b&gt;" in page
+
+
+def test_stats_escape_store_filter(client):
+    page = client.get("/admin/stats", params={"store": SCRIPT}).text
+    assert "<script>" not in page and "&lt;script&gt;" in page
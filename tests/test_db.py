@@ -1,6 +1,54 @@
-from app.db import db
+import sqlite3
+import threading
+import pytest
+from app.db import MIGRATIONS, Database, ProcessedOpsCache, write_with_retry
 
 
-def test_ban_user():
-    db.ban_user("testuser")
-    assert db.is_banned("testuser")
+def test_ban_user(tmp_path):
+    database = Database(str(tmp_path / "bans.db"))
+    database.ban_user("testuser")
+    assert database.is_banned("testuser")
+
+
+def test_processed_ops_cache():
+    database = Database(":memory:")
+    database.conn.execute(
+        "INSERT INTO processed_ops (block_num, op_id) VALUES (5, 'a')"
+    )
+    database.conn.commit()
+    cache = ProcessedOpsCache(database)
+    assert cache.contains(5, "a")
+    assert not cache.contains(5, "b")
+    assert not cache.contains(6, "b")
+    cache.add(6, "b")
+    assert cache.contains(6, "b")
+
+
+def test_migrations_add_indexes(tmp_path):
+    database = Database(str(tmp_path / "migrations.db"))
+    indexes = {
+        row[1]
+        for row in database.conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+    assert "idx_payment_events_paid_timestamp" in indexes
+    assert "idx_payment_events_username" in indexes
+    assert database.conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert database.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_write_with_retry_waits_for_the_write_lock(tmp_path):
+    path = str(tmp_path / "locked.db")
+    holder = sqlite3.connect(path, check_same_thread=False)
+    holder.execute("CREATE TABLE t (x INTEGER)")
+    holder.commit()
+    holder.execute("INSERT INTO t VALUES (1)")  # keeps the write lock open
+    writer = sqlite3.connect(path, timeout=0.1)
+    threading.Timer(0.3, holder.commit).start()
+    write_with_retry(writer, [("INSERT INTO t VALUES (?)", (2,))])
+    assert writer.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 2
+    holder.execute("INSERT INTO t VALUES (3)")
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        write_with_retry(writer, [("INSERT INTO t VALUES (?)", (4,))], timeout=0)
+    holder.rollback()
@@ -0,0 +1,32 @@
+from app import export
+from app.db import Database
+
+
+def test_keyset_pages_cover_all_rows_once():
+    database = Database(":memory:")
+    for i in range(7):
+        database.record_payment_event(
+            i, f"export-{i}", "exportuser", "store1", 1.0, "m", None, i % 2, "r"
+        )
+    database.record_payment_event(
+        8, "other", "someoneelse", "store1", 1.0, "m", None, 1, "r"
+    )
+    database.conn.commit()
+    filters = export.build_filters(user="exportuser")
+    ids = [
+        row["id"]
+        for row in export.iter_rows(filters, page_size=3, connect=lambda: database.conn)
+    ]
+    assert ids == list(range(1, 8))
+
+    newest = export.newest_page(database.conn, filters, limit=3)
+    older = export.newest_page(
+        database.conn, filters, before_id=newest[-1]["id"], limit=3
+    )
+    assert [r["id"] for r in newest + older] == [7, 6, 5, 4, 3, 2]
+
+    rows = export.iter_rows(
+        export.build_filters(user="exportuser", paid=1), connect=lambda: database.conn
+    )
+    lines = list(export.stream_ndjson(rows))
+    assert len(lines) == 3 and all('"paid": 1' in line for line in lines)
@@ -0,0 +1,122 @@
+from app.db import db
+from app.replay import offline_bot
+from app.snap_utils import SNAP_BENEFICIARY, SNAP_BENEFICIARY_WEIGHT
+
+STORE = "jersonsweetplace"
+BENEFICIARIES = [{"account": SNAP_BENEFICIARY, "weight": SNAP_BENEFICIARY_WEIGHT}]
+
+
+class HistoryPool:
+    """Account histories with hived's paging rules"""
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.calls = []
+
+    def get_account_history(self, account, start, limit, op_filter=None):
+        self.calls.append((account, start, limit))
+        history = self.histories.get(account, [])
+        if start == -1:
+            start = len(history) - 1
+        elif limit > start + 1:
+            raise Exception("start must be >= limit - 1")
+        return [(i, history[i]) for i in range(max(0, start - limit + 1), start + 1)]
+
+    def get_content(self, author, permlink):
+        return {"author": author, "permlink": permlink, "beneficiaries": BENEFICIARIES}
+
+    def broadcast(self, operations, keys=None):
+        raise AssertionError("history sync never broadcasts")
+
+
+def _entry(block, timestamp, trx_id, op_type, data):
+    return {
+        "block": block,
+        "trx_id": trx_id,
+        "timestamp": timestamp,
+        "op": [op_type, data],
+    }
+
+
+def _histories(snap_block, snap_time):
+    transfer = _entry(
+        100,
+        "2024-06-03T12:00:00",
+        "aa11",
+        "transfer",
+        {"from": "alice", "to": STORE, "amount": "10.000 HBD", "memo": "kcs-hpos-1"},
+    )
+    snap = [
+        _entry(
+            snap_block,
+            snap_time,
+            "bb22",
+            "comment",
+            {
+                "parent_author": "peak.snaps",
+                "parent_permlink": "c",
+                "author": "alice",
+                "permlink": "snap1",
+            },
+        ),
+        _entry(
+            snap_block,
+            snap_time,
+            "bb22",
+            "comment_options",
+            {
+                "author": "alice",
+                "permlink": "snap1",
+                "extensions": [[0, {"beneficiaries": BENEFICIARIES}]],
+            },
+        ),
+    ]
+    return {STORE: [transfer], "alice": snap}
+
+
+def test_pages_back_without_overshooting_start(scratch_db):
+    pool = HistoryPool(
+        {
+            "bob": [
+                _entry(n, "2024-06-03T12:00:00", f"t{n}", "transfer", {})
+                for n in range(1, 6)
+            ]
+        }
+    )
+    bot = offline_bot(pool, 1)
+    bot.history_sync.page_size = 2
+    entries = bot.history_sync.account_ops("bob", 0, 1, 5)
+    assert [entry["block"] for entry in entries] == [1, 2, 3, 4, 5]
+    assert pool.calls == [("bob", -1, 2), ("bob", 2, 2), ("bob", 0, 1)]
+
+    pool.calls = []
+    bot.history_sync.page_size = 10
+    bot.history_sync.account_ops("bob", 0, 1, 5)
+    assert pool.calls == [("bob", -1, 10)]
+
+
+def test_late_snap_times_out_as_in_a_block_scan(scratch_db):
+    bot = offline_bot(HistoryPool(_histories(1300, "2024-06-03T13:00:00")), 100)
+    bot.history_sync.run(100, 1300)
+    reasons = [row[0] for row in db.conn.execute("SELECT reason FROM payment_events")]
+    assert reasons == ["Payment timed out waiting for snap"]
+    assert db.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0] == 0
+
+
+def test_snap_in_time_is_paid(scratch_db):
+    bot = offline_bot(HistoryPool(_histories(120, "2024-06-03T12:01:00")), 100)
+    bot.history_sync.run(100, 1300)
+    reasons = [row[0] for row in db.conn.execute("SELECT reason FROM payment_events")]
+    assert len(reasons) == 1 and reasons[0].startswith("Snap detected, paid")
+    assert bot.last_block == 1300
+
+
+def test_failed_sync_falls_back_to_block_streaming(scratch_db):
+    class BrokenPool(HistoryPool):
+        def get_account_history(self, *args):
+            raise Exception("node down")
+
+    bot = offline_bot(BrokenPool({}), 100)
+    assert bot.sync_from_history(5000) is False
+    assert bot.history_sync_retry_at > 0
+    assert bot.last_block == 99
@@ -0,0 +1,57 @@
+import logging
+import queue
+from app import logging_utils
+from app.logging_utils import DeferredQueueHandler, RateLimitFilter, setup_logger
+
+
+def _record(lineno, rate_limit="op", level=logging.INFO):
+    record = logging.LogRecord(
+        "paynsnapbot", level, "bot.py", lineno, "msg %s", (1,), None
+    )
+    record.rate_limit = rate_limit
+    return record
+
+
+def test_setup_logger_is_idempotent():
+    first = setup_logger("paynsnapbot.test")
+    second = setup_logger("paynsnapbot.test")
+    assert first is second
+    assert len(first.handlers) == 1 and not first.propagate
+
+
+def test_rate_limit_is_per_call_site_and_counts_suppressed(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(logging_utils.time, "monotonic", lambda: clock[0])
+    rate_filter = RateLimitFilter({"op": 2})
+    assert [rate_filter.filter(_record(10)) for _ in range(4)] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert rate_filter.filter(_record(11))  # another call site has its own budget
+    assert rate_filter.filter(_record(10, level=logging.WARNING))
+    assert rate_filter.filter(_record(10, rate_limit=None))
+    assert rate_filter.suppressed == 2
+
+    clock[0] += 1
+    record = _record(10)
+    assert rate_filter.filter(record) and record.suppressed == 2
+
+
+def test_formatting_is_deferred_to_the_listener():
+    class Expensive:
+        renders = 0
+
+        def __str__(self):
+            Expensive.renders += 1
+            return "expensive"
+
+    records = queue.SimpleQueue()
+    logger = logging.getLogger("paynsnapbot.deferred")
+    logger.addHandler(DeferredQueueHandler(records))
+    logger.propagate = False
+    logger.warning("ops: %s", Expensive())
+    record = records.get_nowait()
+    assert Expensive.renders == 0
+    assert '"message": "ops: expensive"' in logging_utils.JsonFormatter().format(record)
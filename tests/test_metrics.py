@@ -0,0 +1,65 @@
+import math
+import sqlite3
+from prometheus_client import REGISTRY
+from app import metrics
+from app.node_pool import NodePool
+from app.rollups import REASON_KEYS
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_node_calls_are_recorded_per_node():
+    url = "https://metrics-test.example"
+    pool = NodePool(nodes=[url])
+    node = pool.nodes[0]
+    pool.record_success(node, 0.2, 100)
+    pool.record_failure(node, "boom")
+    assert _value("paynsnap_node_rpc_seconds_count", node=url) == 1
+    assert _value("paynsnap_node_rpc_errors_total", node=url) == 1
+
+
+def test_metered_connection_counts_statements():
+    before = _value("paynsnap_sqlite_statements_total")
+    conn = sqlite3.connect(":memory:", factory=metrics.MeteredConnection)
+    conn.execute("CREATE TABLE t (x)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(1,), (2,)])
+    assert _value("paynsnap_sqlite_statements_total") == before + 2
+
+
+def test_outcomes_and_gauges_are_prebound():
+    assert set(REASON_KEYS.values()) | {"paid", "other"} == set(metrics.OUTCOMES)
+
+    class Bot:
+        pending_payments = [1, 2, 3]
+        head_block = 120
+        last_block = 100
+
+    metrics.track_bot(Bot())
+    assert _value("paynsnap_pending_payments") == 3
+    assert _value("paynsnap_head_lag_blocks") == 20
+    assert b"paynsnap_blocks_processed_total" in metrics.render()
+
+
+def test_web_registry_reports_worker_status(tmp_path):
+    from app import control
+    from app.db import Database
+
+    database = Database(str(tmp_path / "metrics.db"))
+    metrics.track_worker_status(database, max_age=30)
+
+    def web(name):
+        return metrics.WEB_REGISTRY.get_sample_value(name)
+
+    assert web("paynsnap_worker_up") == 0
+    assert math.isnan(web("paynsnap_worker_head_lag_blocks"))
+    assert b"paynsnap_blocks_processed_total" not in metrics.render(
+        metrics.WEB_REGISTRY
+    )
+
+    control.write_status(database.conn, {"lag": 4, "pending_payments": 2})
+    assert web("paynsnap_worker_up") == 1
+    assert web("paynsnap_worker_head_lag_blocks") == 4
+    assert web("paynsnap_worker_pending_payments") == 2
+    assert web("paynsnap_outbox_depth") == 0
@@ -0,0 +1,231 @@
+import json
+import urllib.error
+import urllib.request
+import pytest
+from app.chain_fixture import ChainFixture, FixtureWriter
+from app.mock_node import MockHiveNode
+
+
+@pytest.fixture
+def fixture(tmp_path):
+    writer = FixtureWriter(str(tmp_path))
+    for block_num in range(100, 105):
+        writer.add_block(
+            block_num,
+            [
+                {
+                    "block": block_num,
+                    "timestamp": f"2024-06-03T12:00:{block_num - 100:02d}",
+                    "op": ["producer_reward", {}],
+                }
+            ],
+        )
+    writer.add_content(
+        "alice",
+        "snap",
+        {"author": "alice", "beneficiaries": [{"account": "snapnpay", "weight": 5000}]},
+    )
+    writer.close()
+    with ChainFixture(str(tmp_path)) as fixture:
+        yield fixture
+
+
+def _post(url, payload):
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.loads(response.read())
+
+
+def test_serves_fixture_over_http_including_batches(fixture):
+    node = MockHiveNode(fixture)
+    url = node.start()
+    try:
+        props = _post(
+            url,
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "condenser_api.get_dynamic_global_properties",
+                "params": [],
+            },
+        )
+        assert props["result"]["head_block_number"] == 104
+        batch = _post(
+            url,
+            [
+                {
+                    "jsonrpc": "2.0",
+                    "id": i,
+                    "method": "condenser_api.get_ops_in_block",
+                    "params": [100 + i, False],
+                }
+                for i in range(2)
+            ],
+        )
+        assert [r["result"][0]["block"] for r in batch] == [100, 101]
+        content = _post(
+            url,
+            {
+                "jsonrpc": "2.0",
+                "id": 2,
+                "method": "call",
+                "params": ["condenser_api", "get_content", ["alice", "snap"]],
+            },
+        )
+        assert content["result"]["beneficiaries"][0]["account"] == "snapnpay"
+    finally:
+        node.stop()
+
+
+def test_head_advances_and_future_blocks_are_empty(fixture, monkeypatch):
+    node = MockHiveNode(fixture, block_interval=3.0)
+    assert node.head_block() == 100
+    assert (
+        node.handle(
+            {
+                "id": 1,
+                "method": "condenser_api.get_ops_in_block",
+                "params": [101, False],
+            }
+        )["result"]
+        == []
+    )
+    monkeypatch.setattr(node, "_started", node._started - 7)
+    assert node.head_block() == 102
+
+
+def test_broadcast_is_recorded_and_visible(fixture):
+    node = MockHiveNode(fixture)
+    tx = {
+        "operations": [
+            [
+                "comment",
+                {
+                    "parent_author": "alice",
+                    "parent_permlink": "snap",
+                    "author": "bot",
+                    "permlink": "paynsnap-1",
+                    "body": "hi",
+                },
+            ],
+            [
+                "transfer",
+                {
+                    "from": "bot",
+                    "to": "alice",
+                    "amount": "0.050 HBD",
+                    "memo": "cashback",
+                },
+            ],
+        ]
+    }
+    result = node.handle(
+        {
+            "id": 1,
+            "method": "condenser_api.broadcast_transaction_synchronous",
+            "params": [tx],
+        }
+    )["result"]
+    assert result["block_num"] == 105
+    assert (
+        node.handle(
+            {
+                "id": 2,
+                "method": "condenser_api.get_content",
+                "params": ["bot", "paynsnap-1"],
+            }
+        )["result"]["author"]
+        == "bot"
+    )
+    assert (
+        node.handle(
+            {"id": 3, "method": "condenser_api.get_content", "params": ["bot", "nope"]}
+        )["result"]["author"]
+        == ""
+    )
+    history = node.handle(
+        {
+            "id": 4,
+            "method": "condenser_api.get_account_history",
+            "params": ["bot", -1, 100, 6],
+        }
+    )["result"]
+    assert [entry[1]["op"][0] for entry in history] == ["comment", "transfer"]
+    alice = node.rpc_get_account_history("alice", -1, 100, 4)
+    assert [entry[1]["op"][0] for entry in alice] == ["transfer"]
+
+
+def test_failure_injection(fixture):
+    node = MockHiveNode(fixture, failure_rate=1.0, failure_mode="rpc")
+    status, response = node.handle_http(
+        json.dumps(
+            {
+                "id": 1,
+                "method": "condenser_api.get_ops_in_block",
+                "params": [100, False],
+            }
+        ).encode()
+    )
+    assert status == 200 and response["error"]["code"] == -32003
+
+    node = MockHiveNode(fixture, failure_rate=1.0)
+    url = node.start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            _post(
+                url,
+                {
+                    "id": 1,
+                    "method": "condenser_api.get_dynamic_global_properties",
+                    "params": [],
+                },
+            )
+        assert error.value.code == 503
+        assert node.failures == 1
+    finally:
+        node.stop()
+
+    assert "error" in MockHiveNode(fixture).handle(
+        {"id": 1, "method": "condenser_api.nope", "params": []}
+    )
+
+
+def test_account_history_serves_fixture_ops_by_page(tmp_path):
+    from types import SimpleNamespace
+    from app.history_sync import TRANSFER_OP_FILTER, HistorySync
+
+    writer = FixtureWriter(str(tmp_path))
+    for block_num in range(100, 110):
+        transfer = {"from": f"user{block_num}", "to": "store", "amount": "1.000 HBD"}
+        vote = {"voter": "store", "author": "alice", "permlink": "snap", "weight": 1}
+        writer.add_block(
+            block_num,
+            [
+                {"block": block_num, "timestamp": "", "op": ["transfer", transfer]},
+                {"block": block_num, "timestamp": "", "op": ["vote", vote]},
+            ],
+        )
+    writer.close()
+    with ChainFixture(str(tmp_path)) as fixture:
+        node = MockHiveNode(fixture, block_interval=3.0, head_block=107)
+        page = node.rpc_get_account_history("store", 9, 3, TRANSFER_OP_FILTER)
+        assert [(index, entry["block"]) for index, entry in page] == [
+            (4, 102),
+            (6, 103),
+            (8, 104),
+        ]
+        with pytest.raises(Exception, match="limit"):
+            node.rpc_get_account_history("store", 1, 3)
+
+        sync = HistorySync(
+            SimpleNamespace(
+                pool=SimpleNamespace(get_account_history=node.rpc_get_account_history)
+            )
+        )
+        sync.page_size = 2
+        entries = sync.account_ops("store", TRANSFER_OP_FILTER, 101, 110)
+        assert [entry["block"] for entry in entries] == list(range(101, 108))
@@ -0,0 +1,36 @@
+from app.node_pool import NodePool
+
+
+def test_failed_node_is_sidelined():
+    pool = NodePool(nodes=["https://a.example", "https://b.example"])
+    a, b = pool.nodes
+    pool.record_failure(a, "timeout")
+    assert pool.ranked() == [b]
+
+
+def test_ranks_by_latency_and_freshness():
+    pool = NodePool(nodes=["https://a.example", "https://b.example"])
+    a, b = pool.nodes
+    pool.record_success(a, 0.2, head_block=100)
+    pool.record_success(b, 0.1, head_block=100)
+    assert pool.ranked()[0] is b
+    pool.record_success(a, 0.2, head_block=110)
+    assert pool.ranked()[0] is a
+
+
+def test_idle_node_is_not_ranked_stale_by_an_old_head():
+    pool = NodePool(nodes=["https://fast.example", "https://slow.example"])
+    fast, slow = pool.nodes
+    pool.record_success(fast, 0.2, head_block=1000)
+    # fast has not been called for 10 minutes while slow kept serving reads
+    fast.head_seen_at -= 600
+    pool.record_success(slow, 3.0, head_block=1200)
+    assert pool.ranked()[0] is fast
+
+
+def test_node_behind_at_the_same_time_is_penalised():
+    pool = NodePool(nodes=["https://fast.example", "https://slow.example"])
+    fast, slow = pool.nodes
+    pool.record_success(fast, 0.2, head_block=1000)
+    pool.record_success(slow, 3.0, head_block=1200)
+    assert pool.ranked()[0] is slow
@@ -0,0 +1,42 @@
+import json
+import time
+from app.notifier import DiscordDispatcher
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.headers = {}
+        self.text = ""
+        self._body = body or {}
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    def __init__(self):
+        self.messages = []
+        self.responses = [FakeResponse(429, {"retry_after": 0.01})]
+
+    def post(self, url, data, headers, timeout):
+        if self.responses:
+            return self.responses.pop(0)
+        self.messages.append(json.loads(data)["embeds"])
+        return FakeResponse(204)
+
+
+def test_embeds_are_coalesced_and_retried_after_rate_limit():
+    dispatcher = DiscordDispatcher("https://discord.example/webhook")
+    dispatcher.session = FakeSession()
+    for i in range(25):
+        dispatcher.notify(f"event {i}", "details")
+    deadline = time.time() + 2
+    while dispatcher.sent < 25 and time.time() < deadline:
+        time.sleep(0.01)
+    titles = [e["title"] for m in dispatcher.session.messages for e in m]
+    assert titles == [f"event {i}" for i in range(25)]
+    assert all(
+        len(m) <= DiscordDispatcher.MAX_EMBEDS for m in dispatcher.session.messages
+    )
+    assert dispatcher.stats()["rate_limited"] == 1
@@ -0,0 +1,53 @@
+from app.db import db
+from app.pending import PendingPayment, PendingPayments
+from app.replay import offline_bot
+
+
+def _payment(sender, deadline):
+    return PendingPayment(sender, "store", 1.0, "kcs-hpos-1", 1, "trx", 0, deadline)
+
+
+def test_due_only_returns_new_snapped_and_expired():
+    queue = PendingPayments()
+    alice = _payment("alice", 120)
+    bob = _payment("bob", 130)
+    queue.add(alice)
+    queue.add(bob)
+    assert queue.due(now=0) == [alice, bob]
+    assert queue.due(now=1) == []
+
+    assert queue.attach_snap("bob", "snap-1") == [bob]
+    assert queue.due(now=2) == [bob]
+    queue.remove(bob)
+
+    assert queue.due(now=125) == [alice]
+    queue.remove(alice)
+    assert len(queue) == 0
+    assert queue.due(now=200) == []
+
+
+def test_restart_restores_pending_payments(scratch_db):
+    db.add_pending_payment(
+        10, "op-a", "alice", "store", 1.0, "kcs-hpos-1", 1000.0, 4600.0
+    )
+    db.add_pending_payment(
+        11, "op-b", "bob", "store", 2.0, "kcs-hpos-2", 1003.0, 4603.0
+    )
+    db.attach_pending_snap("alice", "alice", "snap-1")
+    db.conn.commit()
+
+    bot = offline_bot(None, 12)
+    restored = {
+        payment.sender: payment for payment in bot.pending_payments.due(now=1004.0)
+    }
+    assert set(restored) == {"alice", "bob"}
+    alice, bob = restored["alice"], restored["bob"]
+    assert (alice.to, alice.amount, alice.block_num, alice.op_id) == (
+        "store",
+        1.0,
+        10,
+        "op-a",
+    )
+    assert (alice.timestamp, alice.deadline) == (1000.0, 4600.0)
+    assert (alice.snap_author, alice.snap_permlink) == ("alice", "snap-1")
+    assert (bob.deadline, bob.snap_author) == (4603.0, None)
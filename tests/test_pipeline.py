@@ -0,0 +1,28 @@
+import time
+from app.pipeline import BlockPipeline
+
+
+def test_blocks_come_back_in_order():
+    def fetch_range(start, count):
+        # Later blocks finish first
+        time.sleep(0.01 * (10 - start))
+        return [[f"op-{start + i}"] for i in range(count)]
+
+    pipeline = BlockPipeline(fetch_range, window=4)
+    seen = []
+    pipeline.fill(1, 8)
+    while len(pipeline):
+        start, blocks = pipeline.take()
+        seen.extend(range(start, start + len(blocks)))
+        pipeline.fill(seen[-1] + 1, 8)
+    assert seen == list(range(1, 9))
+    pipeline.shutdown()
+
+
+def test_short_read_resets_window():
+    pipeline = BlockPipeline(lambda start, count: [["op"]], window=3)
+    pipeline.fill(1, 20, batch_size=5)
+    start, blocks = pipeline.take()
+    assert (start, len(blocks)) == (1, 1)
+    assert len(pipeline) == 0
+    pipeline.shutdown()
@@ -0,0 +1,113 @@
+import pytest
+from app import replay
+from app.chain_fixture import ChainFixture, FixtureWriter
+from app.db import db
+
+
+def _op(block_num, seconds, trx_id, op_type, data):
+    minutes, seconds = divmod(seconds, 60)
+    return {
+        "block": block_num,
+        "trx_id": trx_id,
+        "timestamp": f"2024-06-03T12:{minutes:02d}:{seconds:02d}",
+        "op": [op_type, data],
+    }
+
+
+@pytest.mark.parametrize(
+    "scratch_db", [{"connection_factory": replay.TimedConnection}], indirect=True
+)
+def test_replay_pays_snapped_payment_and_times_out_the_other(tmp_path, scratch_db):
+    store = "jersonsweetplace"
+    writer = FixtureWriter(str(tmp_path / "fixture"))
+    writer.add_block(
+        100,
+        [
+            _op(
+                100,
+                0,
+                "aa11",
+                "transfer",
+                {
+                    "from": "alice",
+                    "to": store,
+                    "amount": "10.000 HBD",
+                    "memo": "kcs-hpos-1",
+                },
+            )
+        ],
+    )
+    writer.add_block(
+        101,
+        [
+            _op(
+                101,
+                3,
+                "bb22",
+                "comment",
+                {
+                    "parent_author": "peak.snaps",
+                    "parent_permlink": "c",
+                    "author": "alice",
+                    "permlink": "snap1",
+                },
+            ),
+            _op(
+                101,
+                3,
+                "bb22",
+                "comment_options",
+                {
+                    "author": "alice",
+                    "permlink": "snap1",
+                    "extensions": [
+                        [
+                            0,
+                            {
+                                "beneficiaries": [
+                                    {"account": "snapnpay", "weight": 5000}
+                                ]
+                            },
+                        ]
+                    ],
+                },
+            ),
+            _op(
+                101,
+                3,
+                "cc33",
+                "transfer",
+                {
+                    "from": "bob",
+                    "to": store,
+                    "amount": "5.000 HBD",
+                    "memo": "kcs-hpos-2",
+                },
+            ),
+        ],
+    )
+    writer.add_block(160, [_op(160, 180, "dd44", "producer_reward", {})])
+    writer.close()
+
+    with ChainFixture(str(tmp_path / "fixture")) as fixture:
+        report = replay.replay(fixture)
+
+    assert (report["blocks"], report["ops"], report["last_block"]) == (3, 5, 160)
+    assert report["pending_peak"] == 1 and report["pending_remaining"] == 0
+    assert report["outbox"] == {"reply": 1, "transfer": 1}
+    assert report["payment_events"]["Payment timed out waiting for snap"] == 1
+    assert report["stages"]["block"]["count"] == 3
+    assert report["db_statements"] > 0
+    payload = db.conn.execute(
+        "SELECT payload FROM outbox WHERE kind = 'reply'"
+    ).fetchone()[0]
+    assert '"permlink": "paynsnap-100-aa11"' in payload
+    assert "Replayed blocks 100-160" in replay.format_report(report)
+
+
+def test_percentiles():
+    stats = replay.percentiles([0.001 * n for n in range(1, 101)])
+    assert (
+        stats["count"] == 100 and stats["p50_ms"] == 51.0 and stats["max_ms"] == 100.0
+    )
+    assert replay.percentiles([]) == {"count": 0}
@@ -0,0 +1,70 @@
+from app import rollups
+from app.db import Database
+
+
+def test_events_roll_up_by_day_and_store():
+    database = Database(":memory:")
+    database.record_payment_event(
+        1,
+        "a",
+        "alice",
+        "store1",
+        1.0,
+        "m1",
+        "p",
+        1,
+        "Snap detected, paid 0.05 HBD",
+        cashback=0.05,
+    )
+    database.record_payment_event(
+        2,
+        "b",
+        "alice",
+        "store1",
+        2.0,
+        "m2",
+        None,
+        0,
+        "Payment timed out waiting for snap",
+    )
+    database.record_payment_event(
+        3, "c", "bob", "store1", 1.0, "m3", None, 0, "User exceeded daily limit"
+    )
+    database.conn.commit()
+
+    (day,) = rollups.daily_stats(database.conn)
+    assert (day["events"], day["paid"], day["unique_users"]) == (3, 1, 2)
+    assert round(day["cashback_total"], 3) == 0.05
+    reasons = {r["reason"]: r["count"] for r in rollups.reason_stats(database.conn)}
+    assert reasons == {"paid": 1, "timeout": 1, "daily_limit": 1}
+
+    assert rollups.backfill(database.conn) == 3
+    assert rollups.daily_stats(database.conn) == [day]
+
+
+def test_backfill_folds_one_terminal_row_per_payment():
+    database = Database(":memory:")
+    # Legacy rows: a "No snap detected" row per block while each payment waited
+    for block in range(3):
+        for op_id, user in (("a", "alice"), ("b", "bob"), ("c", "carol")):
+            database.record_payment_event(
+                1, op_id, user, None, 1.0, "m", None, 0, "No snap detected"
+            )
+    database.record_payment_event(
+        1, "a", "alice", None, 1.0, "m", "p", 1, "Snap detected, paid 0.05 HBD"
+    )
+    database.record_payment_event(
+        1, "b", "bob", None, 1.0, "m", None, 0, "Payment timed out waiting for snap"
+    )
+    database.conn.commit()
+
+    assert rollups.backfill(database.conn) == 2
+    (day,) = rollups.daily_stats(database.conn)
+    assert (day["store"], day["events"], day["paid"], day["unique_users"]) == (
+        "unknown",
+        2,
+        1,
+        2,
+    )
+    reasons = {r["reason"]: r["count"] for r in rollups.reason_stats(database.conn)}
+    assert reasons == {"paid": 1, "timeout": 1}
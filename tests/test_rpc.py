@@ -0,0 +1,58 @@
+import pytest
+from app.chain_fixture import ChainFixture, FixtureWriter
+from app.mock_node import MockHiveNode
+from app.node_pool import NodePool
+from app.rpc import RPCError
+
+
+@pytest.fixture
+def node(tmp_path):
+    writer = FixtureWriter(str(tmp_path))
+    for block_num in range(100, 103):
+        writer.add_block(
+            block_num,
+            [
+                {
+                    "block": block_num,
+                    "timestamp": "2024-06-03T12:00:00",
+                    "op": ["producer_reward", {}],
+                }
+            ],
+        )
+    writer.add_content(
+        "alice",
+        "snap",
+        {"author": "alice", "beneficiaries": [{"account": "snapnpay", "weight": 5000}]},
+    )
+    writer.close()
+    with ChainFixture(str(tmp_path)) as fixture:
+        node = MockHiveNode(fixture)
+        node.start()
+        yield node
+        node.stop()
+
+
+def test_reads_reuse_one_connection(node):
+    pool = NodePool(nodes=[node.url])
+    for _ in range(5):
+        assert pool.get_dynamic_global_properties()["head_block_number"] == 102
+    status = pool.status()[0]
+    assert status["handshakes"] == 1
+    assert status["http_requests"] == 5
+
+
+def test_batch_returns_failed_items_in_place(node):
+    pool = NodePool(nodes=[node.url])
+    results = pool.batch("get_content", [["alice", "snap"], ["bob", "missing"]])
+    assert results[0]["beneficiaries"][0]["account"] == "snapnpay"
+    assert results[1]["author"] == ""
+
+    calls = [
+        ("condenser_api.get_ops_in_block", [100, False]),
+        ("condenser_api.no_such_method", []),
+    ]
+    ops, error = pool.transport.batch(node.url, calls)
+    assert ops[0]["block"] == 100
+    assert isinstance(error, RPCError) and error.code == -32601
+    status = pool.status()[0]
+    assert (status["http_requests"], status["rpc_calls"]) == (2, 4)
@@ -0,0 +1,72 @@
+from app.snap_utils import (
+    SNAP_BENEFICIARY,
+    SNAP_BENEFICIARY_WEIGHT,
+    SnapBeneficiaryCache,
+    beneficiaries_from_comment_options,
+    user_has_valid_snap,
+)
+
+BENEFICIARIES = [{"account": SNAP_BENEFICIARY, "weight": SNAP_BENEFICIARY_WEIGHT}]
+
+
+class ContentClient:
+    def __init__(self, posts):
+        self.posts = posts
+        self.calls = []
+
+    def get_content(self, author, permlink):
+        self.calls.append((author, permlink))
+        return self.posts.get((author, permlink))
+
+
+def test_beneficiaries_from_comment_options_both_encodings():
+    legacy = {"extensions": [[0, {"beneficiaries": BENEFICIARIES}]]}
+    appbase = {
+        "extensions": [
+            {
+                "type": "comment_payout_beneficiaries",
+                "value": {"beneficiaries": BENEFICIARIES},
+            }
+        ]
+    }
+    assert beneficiaries_from_comment_options(legacy) == BENEFICIARIES
+    assert beneficiaries_from_comment_options(appbase) == BENEFICIARIES
+    assert beneficiaries_from_comment_options({"extensions": []}) == []
+
+
+def test_cache_hit_from_comment_options_skips_get_content():
+    cache = SnapBeneficiaryCache()
+    op = {
+        "author": "alice",
+        "permlink": "snap",
+        "extensions": [[0, {"beneficiaries": BENEFICIARIES}]],
+    }
+    cache.put(op["author"], op["permlink"], beneficiaries_from_comment_options(op))
+    client = ContentClient({})
+    assert user_has_valid_snap(client, "alice", "snap", "alice", cache)
+    assert client.calls == []
+
+
+def test_cache_miss_falls_back_to_get_content_and_fills_the_cache():
+    cache = SnapBeneficiaryCache()
+    client = ContentClient({("bob", "snap"): {"author": "bob", "beneficiaries": []}})
+    assert not user_has_valid_snap(client, "bob", "snap", "bob", cache)
+    assert not user_has_valid_snap(client, "bob", "snap", "bob", cache)
+    assert client.calls == [("bob", "snap")]
+    assert cache.get("bob", "snap") == []
+
+
+def test_entries_expire_after_ttl_and_oldest_are_evicted():
+    now = [1000.0]
+    cache = SnapBeneficiaryCache(ttl=60, max_entries=2, clock=lambda: now[0])
+    cache.put("alice", "snap", BENEFICIARIES)
+    now[0] += 59
+    assert cache.get("alice", "snap") == BENEFICIARIES
+    now[0] += 2
+    assert cache.get("alice", "snap") is None
+
+    cache.put("a", "1", [])
+    cache.put("b", "2", [])
+    cache.put("c", "3", [])
+    assert cache.get("a", "1") is None
+    assert cache.get("c", "3") == []
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import pytest
+from app import control
+from app.node_pool import NodePool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Seconds allowed to import the web app in a fresh interpreter. Most of it
+# is FastAPI itself; the app's own modules should add little on top.
+STARTUP_BUDGET = 1.5
+DEFERRED_MODULES = ["lighthive", "jinja2", "requests"]
+
+
+def test_web_app_import_is_within_budget(tmp_path):
+    pytest.importorskip("fastapi")
+    path = str(tmp_path / "startup.db")
+    script = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import app.main\n"
+        "elapsed = time.perf_counter() - started\n"
+        f"print(json.dumps([elapsed, [m for m in {DEFERRED_MODULES!r} if m in sys.modules]]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        env=dict(os.environ, DB_PATH=path),
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    elapsed, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == []
+    assert not os.path.exists(path)
+    assert elapsed < STARTUP_BUDGET, f"importing app.main took {elapsed:.2f}s"
+
+
+def test_bot_starts_without_waiting_on_nodes(scratch_db):
+    from app.bot import HiveBot
+
+    class UnreachableBot(HiveBot):
+        LAST_BLOCK_FILE = os.path.join(
+            os.path.dirname(scratch_db.path), "last_block.txt"
+        )
+
+    started = time.perf_counter()
+    bot = UnreachableBot()
+    bot.pool = NodePool(nodes=["http://127.0.0.1:9"])
+    assert time.perf_counter() - started < STARTUP_BUDGET
+    assert bot.last_block is None
+    assert bot.status()["lag"] is None
+
+
+def test_readiness_follows_worker_lag(scratch_db):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    from app.main import READY_MAX_LAG, app
+
+    client = TestClient(app)
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/readyz").status_code == 503
+
+    control.write_status(scratch_db.conn, {"last_block": 100, "lag": READY_MAX_LAG + 1})
+    assert client.get("/readyz").status_code == 503
+    control.write_status(scratch_db.conn, {"last_block": 120, "lag": 1})
+    response = client.get("/readyz")
+    assert response.status_code == 200 and response.json()["ready"]
@@ -0,0 +1,13 @@
+from app.db import Database
+from app.user_cache import UserStateCache
+
+
+def test_counts_purchases_and_invalidates_on_reset():
+    database = Database(":memory:")
+    cache = UserStateCache(database)
+    assert cache.purchase_number("alice") == 1
+    cache.record_purchase("alice", 1)
+    database.conn.commit()
+    assert cache.purchase_number("alice") == 2
+    database.reset_user("alice")
+    assert cache.purchase_number("alice") == 1
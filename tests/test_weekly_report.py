@@ -0,0 +1,135 @@
+from datetime import date
+from app import rollups, weekly_report
+from app.db import Database
+
+
+def _event(database, day, username, store, amount, paid, reason, cashback=None):
+    database.record_payment_event(
+        1,
+        f"{username}-{amount}",
+        username,
+        store,
+        amount,
+        "m",
+        None,
+        paid,
+        reason,
+        cashback=cashback,
+    )
+    database.conn.execute(
+        "UPDATE payment_events SET timestamp = ? WHERE id = (SELECT MAX(id) FROM payment_events)",
+        (f"{day} 12:00:00",),
+    )
+
+
+def test_weeks_start_on_monday():
+    assert weekly_report.week_start("2024-06-09") == date(2024, 6, 3)
+    assert weekly_report.week_start(date(2024, 6, 3)) == date(2024, 6, 3)
+    assert weekly_report.last_complete_week(date(2024, 6, 12)) == date(2024, 6, 3)
+
+
+def test_report_sums_the_daily_rollups():
+    database = Database(":memory:")
+    _event(
+        database,
+        "2024-05-28",
+        "carol",
+        "store1",
+        1.0,
+        1,
+        "Snap detected, paid 0.05 HBD",
+        0.05,
+    )
+    _event(
+        database,
+        "2024-06-03",
+        "alice",
+        "store1",
+        2.0,
+        1,
+        "Snap detected, paid 0.10 HBD",
+        0.1,
+    )
+    # A legacy payment: one non-terminal row per block, then its outcome
+    for _ in range(5):
+        _event(database, "2024-06-04", "alice", "store2", 1.0, 0, "No snap detected")
+    _event(
+        database,
+        "2024-06-04",
+        "alice",
+        "store2",
+        1.0,
+        0,
+        "Payment timed out waiting for snap",
+    )
+    _event(
+        database,
+        "2024-06-09",
+        "bob",
+        "store1",
+        3.0,
+        1,
+        "Snap detected, paid 0.15 HBD",
+        0.15,
+    )
+    database.conn.commit()
+    # Rollups are keyed by insert time; rebuild them for the back-dated rows
+    rollups.backfill(database.conn)
+
+    report = weekly_report.build_report(database.conn, "2024-06-05")
+    totals = report["totals"]
+    assert report["week"] == "2024-06-03" and report["end"] == "2024-06-09"
+    assert (
+        totals["events"],
+        totals["paid"],
+        totals["customers"],
+        totals["active_stores"],
+    ) == (3, 2, 2, 1)
+    assert round(totals["success_rate"], 3) == 0.667
+    assert totals["cashback_total"] == 0.25
+    assert report["previous"]["cashback_total"] == 0.05
+    assert report["failures"] == [{"reason": "timeout", "count": 1}]
+    assert [(s["store"], s["events"], s["customers"]) for s in report["stores"]] == [
+        ("store1", 2, 2),
+        ("store2", 1, 1),
+    ]
+
+    body = weekly_report.render_markdown(report)
+    assert "Week of 2024-06-03" in body
+    assert "0.250 HBD (+400.0% vs last week)" in body
+    assert "Payment timed out waiting for snap: 1" in body
+
+
+def test_publish_edits_existing_post_without_beneficiaries(monkeypatch):
+    class Pool:
+        def __init__(self, existing):
+            self.existing = existing
+            self.operations = None
+
+        def get_content(self, author, permlink):
+            return {"author": author} if self.existing else {"author": ""}
+
+        def broadcast(self, operations, keys):
+            self.operations = operations
+
+    monkeypatch.setenv("HIVE_USERNAME", "paynsnapbot")
+    monkeypatch.setitem(
+        weekly_report.config.data,
+        "weekly_report",
+        {"beneficiaries": [{"account": "store1", "weight": 1000}]},
+    )
+    report = {"week": "2024-06-03"}
+
+    pool = Pool(existing=False)
+    assert weekly_report.publish(report, "body", pool) == (
+        "paynsnap-weekly-report-2024-06-03",
+        False,
+    )
+    assert len(pool.operations) == 2
+
+    pool = Pool(existing=True)
+    assert weekly_report.publish(report, "body", pool) == (
+        "paynsnap-weekly-report-2024-06-03",
+        True,
+    )
+    assert len(pool.operations) == 1